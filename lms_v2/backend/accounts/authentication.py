@@ -0,0 +1,61 @@
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser
+from .tokens import acurrent_token_version, current_token_version
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the claims added by
+    RoleRefreshToken instead of loading the User row. Tokens are rejected
+    once the user's token_version moves on (role, password or status
+    change) or the user is deleted or deactivated. Tokens without the
+    claims fall back to the regular database lookup.
+    """
+
+    def get_user(self, validated_token):
+        if "ver" not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if validated_token["ver"] != current_token_version(user_id):
+            raise AuthenticationFailed("Token is no longer valid", code="token_not_valid")
+        return self.claims_user(validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; the token check doesn't block the event loop."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if "ver" not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if validated_token["ver"] != await acurrent_token_version(user_id):
+            raise AuthenticationFailed("Token is no longer valid", code="token_not_valid")
+        return self.claims_user(validated_token)
+
+    def claims_user(self, validated_token):
+        user = ClaimsUser(
+            pk=validated_token[api_settings.USER_ID_CLAIM],
+            email=validated_token["email"],
+            user_name=validated_token["user_name"],
+            is_staff=validated_token["is_staff"],
+            is_superuser=validated_token["is_superuser"],
+            is_active=True,
+            token_version=validated_token["ver"],
+        )
+        user._state.adding = False
+        user._state.db = "default"
+        user.roles = validated_token["roles"]
+        return user
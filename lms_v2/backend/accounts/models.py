@@ -8,11 +8,51 @@ class User(AbstractUser):
 
     user_name = models.CharField(max_length=150)
     email = models.EmailField(unique=True)
+    # Copied into access tokens; bumping it revokes every token issued before.
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["user_name"]
 
+    # Fields whose values end up in token claims (or guard them); changing
+    # any of them bumps token_version on save.
+    TOKEN_CLAIM_FIELDS = ("email", "user_name", "is_superuser", "is_active", "password")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._claims = instance._claim_values()
+        return instance
+
+    def _claim_values(self):
+        return tuple(self.__dict__.get(field) for field in self.TOKEN_CLAIM_FIELDS)
+
+    def save(self, *args, **kwargs):
+        claims = getattr(self, "_claims", None)
+        if claims is not None and None not in claims and claims != self._claim_values():
+            self.token_version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "token_version"}
+        super().save(*args, **kwargs)
+        self._claims = self._claim_values()
+
     def __str__(self):
         return self.email
+
+
+class ClaimsUser(User):
+    """
+    A user rebuilt from access-token claims without a database query.
+
+    It can be used wherever a User instance is expected (FK assignment,
+    filters, equality), but only the claimed fields are set, so it refuses
+    to be saved.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise TypeError("ClaimsUser is built from token claims and cannot be saved")
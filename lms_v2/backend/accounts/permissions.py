@@ -0,0 +1,26 @@
+from rest_framework.permissions import BasePermission
+
+
+def user_roles(user):
+    """
+    Group names of `user`: taken from the token claims when the request was
+    authenticated with ClaimsJWTAuthentication, otherwise loaded once and
+    memoized on the user object.
+    """
+    roles = getattr(user, "roles", None)
+    if roles is None:
+        roles = user.roles = list(user.groups.values_list("name", flat=True))
+    return roles
+
+
+class HasRole(BasePermission):
+    """Allows users holding `role`, read as user_roles() does."""
+    role = None
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and self.role in user_roles(request.user)
+
+
+class IsCreatorRole(HasRole):
+    role = "CREATOR"
+
@@ -1,10 +1,32 @@
-from django.db.models.signals import post_migrate
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
 
+from .models import User
+from .tokens import bump_token_version, forget_token_version
+
 
 @receiver(post_migrate)
 def create_user_roles(sender, **kwargs):
     Group.objects.get_or_create(name="STUDENT")
     Group.objects.get_or_create(name="CREATOR")
     Group.objects.get_or_create(name="ADMIN")
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def revoke_tokens_on_role_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        bump_token_version(instance.pk)
+        instance.token_version += 1
+    elif action == "pre_clear":
+        bump_token_version(*instance.user_set.values_list("pk", flat=True))
+    elif pk_set:
+        bump_token_version(*pk_set)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_token_version(sender, instance, **kwargs):
+    forget_token_version(instance.pk)
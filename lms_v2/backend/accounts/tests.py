@@ -1,3 +1,81 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import User
+from .tokens import current_token_version
+
+
+class ClaimsTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="creator@example.com", password="secret-pw-123", user_name="creator"
+        )
+        self.user.groups.add(Group.objects.get_or_create(name="CREATOR")[0])
+
+    def login(self):
+        response = self.client.post(
+            "/api/accounts/login/",
+            {"email": "creator@example.com", "password": "secret-pw-123"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        return response.json()
+
+    def test_login_returns_role(self):
+        self.assertEqual(self.login()["role"], "CREATOR")
+
+    def test_creator_endpoint_needs_no_user_or_group_query(self):
+        self.login()
+        self.client.get("/api/courses/my-courses/")  # warms the token version cache
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/courses/my-courses/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_change_revokes_token(self):
+        self.login()
+        self.user.groups.clear()
+        self.assertEqual(self.client.get("/api/courses/my-courses/").status_code, 401)
+
+        self.login()
+        self.assertEqual(self.client.get("/api/courses/my-courses/").status_code, 403)
+
+    def test_creator_views_need_the_creator_role(self):
+        student = User.objects.create_user(email="student@example.com", password="pw", user_name="student")
+        student.groups.add(Group.objects.get(name="STUDENT"))
+        for user, status in ((student, 403), (self.user, 200)):
+            # Without token claims the roles come from the user's groups.
+            self.client.force_authenticate(user)
+            self.assertEqual(self.client.get("/api/courses/my-courses/").status_code, status)
+        self.client.force_authenticate(student)
+        response = self.client.post("/api/courses/create/", {"title": "T", "description": "D"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_password_change_and_deactivation_revoke_token(self):
+        self.login()
+        self.user.refresh_from_db()
+        self.user.set_password("another-pw-456")
+        self.user.save()
+        self.assertEqual(self.client.get("/api/courses/my-enrollments/").status_code, 401)
+
+        self.user.set_password("secret-pw-123")
+        self.user.save()
+        self.login()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        self.assertEqual(self.client.get("/api/courses/my-enrollments/").status_code, 401)
+
+    def test_versions_live_in_the_configured_cache(self):
+        shared = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "shared"}
+        with override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}, "shared": shared},
+            TOKEN_VERSION_CACHE="shared",
+        ):
+            current_token_version(self.user.pk)
+            self.assertEqual(caches["shared"].get(f"token-version:{self.user.pk}"), self.user.token_version)
+            self.user.groups.clear()
+            self.assertIsNone(caches["shared"].get(f"token-version:{self.user.pk}"))
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+
+def _cache():
+    return caches[settings.TOKEN_VERSION_CACHE]
+
+
+def _version_key(user_id):
+    return f"token-version:{user_id}"
+
+
+def current_token_version(user_id):
+    """
+    The token_version a valid token for this user must carry, or -1 when the
+    user no longer exists or is inactive. Cached so authenticated requests
+    normally need no user query; see TOKEN_VERSION_CACHE for how soon other
+    processes notice a revocation.
+    """
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = User.objects.filter(pk=user_id, is_active=True).values_list(
+            "token_version", flat=True
+        ).first()
+        version = -1 if version is None else version
+        cache.set(_version_key(user_id), version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+async def acurrent_token_version(user_id):
+    """current_token_version() for async views."""
+    cache = _cache()
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        version = await User.objects.filter(pk=user_id, is_active=True).values_list(
+            "token_version", flat=True
+        ).afirst()
+        version = -1 if version is None else version
+        await cache.aset(_version_key(user_id), version, settings.TOKEN_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def forget_token_version(*user_ids):
+    _cache().delete_many([_version_key(pk) for pk in user_ids])
+
+
+def bump_token_version(*user_ids):
+    User.objects.filter(pk__in=user_ids).update(token_version=F("token_version") + 1)
+    forget_token_version(*user_ids)
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the user's identity and roles,
+    so requests can be authorized from the token alone.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        roles = list(user.groups.order_by("pk").values_list("name", flat=True))
+        token["roles"] = roles
+        token["role"] = roles[0] if roles else None
+        token["email"] = user.email
+        token["user_name"] = user.user_name
+        token["is_staff"] = user.is_staff
+        token["is_superuser"] = user.is_superuser
+        token["ver"] = user.token_version
+        return token
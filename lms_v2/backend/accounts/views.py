@@ -3,9 +3,9 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 
 from .serializers import RegisterSerializer
+from .tokens import RoleRefreshToken
 
 
 class UserView(APIView):
@@ -24,6 +24,8 @@ class UserView(APIView):
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    # A stale or revoked token in the header must not block logging in again.
+    authentication_classes = []
 
     def post(self, request):
         email = request.data.get("email")
@@ -37,13 +39,12 @@ class LoginView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        refresh = RefreshToken.for_user(user)
-        group = user.groups.first()
+        refresh = RoleRefreshToken.for_user(user)
 
         return Response({
             "access": str(refresh.access_token),
             "refresh": str(refresh),
             "email": user.email,
             "user_name": user.user_name,
-            "role": group.name if group else None
+            "role": refresh["role"]
         })
@@ -9,8 +9,24 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+
+class AsyncRoutesRequest(ASGIRequest):
+    # Routes the read-heavy course endpoints to their native async views;
+    # under WSGI they would each need an event loop of their own.
+    urlconf = 'backend.asgi_urls'
+
+
+class AsyncRoutesHandler(ASGIHandler):
+    request_class = AsyncRoutesRequest
+
+
+django.setup(set_prefix=False)
+# The async views are opt-in until benchmark_concurrency shows them ahead
+# of the sync views under the same server.
+application = AsyncRoutesHandler() if settings.ASYNC_COURSE_VIEWS else ASGIHandler()
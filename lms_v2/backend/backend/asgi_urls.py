@@ -0,0 +1,12 @@
+"""
+URL configuration used under ASGI when ASYNC_COURSE_VIEWS is on (see
+backend/asgi.py): the same routes as backend.urls, with the read-heavy course
+endpoints served by native async views instead of sync DRF views.
+"""
+from django.urls import include, path
+
+from courses.urls import async_urlpatterns
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [path('api/courses/', include(async_urlpatterns))] + sync_urlpatterns
@@ -45,9 +45,11 @@ INSTALLED_APPS = [
     'corsheaders',
     'notification',
     'courses',
+    'monitoring',
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -97,6 +99,91 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Local memory is per process; point COURSE_OUTLINE_CACHE at a shared backend
+# (Redis, Memcached) when running several workers so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+COURSE_OUTLINE_CACHE = 'default'
+COURSE_OUTLINE_TIMEOUT = 60 * 60
+# Cached outlines and catalog ETags carry Course.enrollment_count, so the
+# course's version is bumped once this many enrollments have been counted
+# since the last bump: the count served lags by fewer than this many. On
+# courses with enrollment_shards the row only changes when the shards are
+# folded, which bumps it, so they lag by the fold interval instead.
+COURSE_ENROLLMENT_COUNT_EPOCH = 10
+
+
+# Serve the read-heavy course endpoints with the native async views in
+# courses.async_views when running under ASGI. Off by default: measured with
+# benchmark_concurrency, they have not beaten the sync views yet.
+ASYNC_COURSE_VIEWS = False
+
+
+# Notification actions (notification.actions) are compiled once per process
+# and reloaded when a version stamp in this cache changes; like
+# COURSE_OUTLINE_CACHE it must be shared for an edit to reach every worker
+# at once. Each process also reloads once its copy is this many seconds old,
+# which bounds the delay when the cache is per process.
+NOTIFICATION_ACTIONS_CACHE = 'default'
+NOTIFICATION_ACTIONS_MAX_AGE = 60
+
+
+# Player heartbeats (courses.heartbeats) are buffered per process and
+# upserted in batches. Seconds between flushes; 0 disables the flush thread.
+HEARTBEAT_FLUSH_INTERVAL = 5.0
+# Distinct (enrollment, chapter) positions held before a request has to
+# flush inline; bounds the buffer's memory.
+HEARTBEAT_MAX_BUFFERED = 50000
+HEARTBEAT_BATCH_SIZE = 1000
+
+# Course-title autocomplete (courses.autocomplete) is served from a per-process
+# index kept current by signals; it's also rebuilt in the background once
+# this many seconds old, to pick up changes made by other processes.
+AUTOCOMPLETE_MAX_AGE = 300
+AUTOCOMPLETE_TOP_K = 10
+
+# Deleting or moving chapters clears their bits from the course's progress
+# bitmaps in these worker threads after commit; 0 clears inline after commit.
+PROGRESS_WORKERS = 1
+
+# Course thumbnails are resized to these widths (WebP and JPEG) by a pool of
+# worker threads after upload; 0 workers renders inline after commit.
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+THUMBNAIL_CARD_WIDTH = 320
+THUMBNAIL_WORKERS = 2
+# Thumbnails are stored by content hash and shared between courses; one no
+# course uses is deleted unless it was saved or reused this recently (an
+# upload of the same image may be about to use it). `manage.py
+# clean_thumbnails` sweeps up the rest.
+THUMBNAIL_RELEASE_GRACE = 600
+
+
+# Request metrics (monitoring app), scraped from /metrics/
+# Fraction of requests measured; lower it to cut overhead on busy servers.
+METRICS_SAMPLE_RATE = 1.0
+# Emit one JSON log line per sampled request on the "monitoring" logger.
+METRICS_LOG_REQUESTS = False
+# A request repeating the same SQL this many times is flagged as a likely N+1.
+METRICS_DUPLICATE_QUERY_THRESHOLD = 5
+# When set, /metrics/ requires "Authorization: Bearer <token>".
+METRICS_TOKEN = None
+
+
+# Email
+# Requests only queue mail in the notification outbox; run
+# `manage.py send_outbox --loop` to deliver it.
+
+DEFAULT_FROM_EMAIL = 'noreply@nextgenlms.com'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -128,7 +215,7 @@ USE_I18N = True
 USE_TZ = True
 
 AUTHENTICATION_BACKENDS = [
-    'accounts.backends.EmailBackend',
+    'accounts.backend.EmailBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
@@ -140,12 +227,22 @@ STATIC_URL = 'static/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Media is served by courses.media.MediaView after an access check. Set
+# MEDIA_ACCEL to "x-accel-redirect" (nginx, with an internal location at
+# MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or "x-sendfile" (Apache, lighttpd)
+# to let the front proxy send the bytes.
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+MEDIA_PRIVATE_MAX_AGE = 60 * 60
+# Lifetime of the signed course-asset URLs handed out by CourseAssetURLView.
+MEDIA_SIGNED_URL_MAX_AGE = 60 * 60
 
 AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
 }
 
@@ -169,6 +266,14 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# ClaimsJWTAuthentication caches each user's token_version here, and role
+# and password changes clear the entry. Revocation is immediate everywhere
+# only when this cache is shared between workers (Redis, Memcached); with a
+# per-process cache other workers keep accepting revoked tokens for up to
+# TOKEN_VERSION_CACHE_TIMEOUT seconds.
+TOKEN_VERSION_CACHE = 'default'
+TOKEN_VERSION_CACHE_TIMEOUT = 60
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -0,0 +1,20 @@
+"""
+Settings for running the API benchmarks locally on SQLite.
+
+    python manage.py benchmark_api --settings=backend.settings_bench
+"""
+
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'bench.sqlite3',
+    }
+}
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='lms-bench-media-')
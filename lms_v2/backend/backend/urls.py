@@ -14,10 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from courses.media import MediaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,8 +28,6 @@ urlpatterns = [
     path('api/courses/', include('courses.urls')),
     path('', include("rest_framework.urls")),
     path("api/notification/", include("notification.urls")),
+    path("metrics/", include("monitoring.urls")),
+    re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<name>.+)$", MediaView.as_view()),
 ]
-
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
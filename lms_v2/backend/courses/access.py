@@ -0,0 +1,114 @@
+from .models import Course, Section, Chapter, Enrollment
+
+
+class CourseAccess:
+    """
+    Per-request access policy for courses and their content.
+
+    Facts needed to authorize a request (the course row, its owner, the
+    user's enrollments) are loaded at most once and memoized, so permission
+    classes, views and serializers can all ask the same questions without
+    repeating queries. The user's enrolled course IDs are loaded with a
+    single query the first time they are needed.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._enrolled_ids = None
+        self._courses = {}
+        self._sections = {}
+
+    @classmethod
+    def for_request(cls, request):
+        access = getattr(request, "_course_access", None)
+        if access is None or access.user is not request.user:
+            access = cls(request.user)
+            request._course_access = access
+        return access
+
+    @property
+    def enrolled_course_ids(self):
+        if self._enrolled_ids is None:
+            if self.user.is_authenticated:
+                self._enrolled_ids = set(
+                    Enrollment.objects.filter(user=self.user).values_list("course_id", flat=True)
+                )
+            else:
+                self._enrolled_ids = set()
+        return self._enrolled_ids
+
+    async def aload(self):
+        """
+        Load the user's enrollments without blocking, so the checks below
+        can be made from async code without a query.
+        """
+        if self._enrolled_ids is None:
+            if self.user.is_authenticated:
+                self._enrolled_ids = {
+                    course_id
+                    async for course_id in Enrollment.objects.filter(user=self.user).values_list(
+                        "course_id", flat=True
+                    )
+                }
+            else:
+                self._enrolled_ids = set()
+        return self._enrolled_ids
+
+    def course(self, course_id):
+        """The Course with this ID, or None."""
+        try:
+            course_id = int(course_id)
+        except (TypeError, ValueError):
+            return None
+        if course_id not in self._courses:
+            self._courses[course_id] = Course.objects.filter(pk=course_id).first()
+        return self._courses[course_id]
+
+    def section(self, section_id):
+        """The Section with this ID (with its course), or None."""
+        try:
+            section_id = int(section_id)
+        except (TypeError, ValueError):
+            return None
+        if section_id not in self._sections:
+            section = Section.objects.select_related("course").filter(pk=section_id).first()
+            self._sections[section_id] = section
+            if section is not None:
+                self._courses[section.course_id] = section.course
+        return self._sections[section_id]
+
+    def course_of(self, obj):
+        """The course a Course, Section or Chapter belongs to."""
+        if isinstance(obj, Course):
+            return obj
+        if isinstance(obj, Chapter):
+            section = obj.section if Chapter.section.is_cached(obj) else self.section(obj.section_id)
+            return section and self.course_of(section)
+        if Section.course.is_cached(obj):
+            return obj.course
+        return self.course(obj.course_id)
+
+    def is_owner(self, course):
+        return self.user.is_authenticated and course.creator_id == self.user.pk
+
+    def is_enrolled(self, course_id):
+        return course_id in self.enrolled_course_ids
+
+    def can_manage(self, obj):
+        """May the user edit this course, or a section/chapter of it?"""
+        course = self.course_of(obj)
+        return course is not None and (self.is_owner(course) or self.user.is_superuser)
+
+    def can_enroll(self, course):
+        return self.user.is_authenticated and not self.is_owner(course) and not self.is_enrolled(course.pk)
+
+    def can_view_content(self, course):
+        return self.can_view(course.pk, course.creator_id)
+
+    def can_view(self, course_id, creator_id):
+        user = self.user
+        if not user.is_authenticated:
+            return False
+        if user.is_superuser or creator_id == user.pk:
+            return True
+        return self.is_enrolled(course_id)
@@ -0,0 +1,123 @@
+import asyncio
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from accounts.authentication import ClaimsJWTAuthentication
+from .access import CourseAccess
+from .conditional import acatalog_validators, acourse_validators
+from .models import Enrollment
+from .outlines import aget_outline, render_outline
+from .pagination import CatalogCursorPagination
+from .serializers import CourseSummarySerializer, MyEnrollmentSerializer
+from .views import catalog_queryset
+
+# Native async versions of the read-heavy course endpoints, routed instead of
+# the DRF views under ASGI when ASYNC_COURSE_VIEWS is on (see backend/asgi.py).
+# DRF views are sync only, so ASGI runs each of them in a thread. Responses are the
+# same JSON the DRF views send, errors included.
+
+
+class AsyncAPIView(View):
+    """
+    The parts of APIView the read endpoints need, without leaving the event
+    loop: JWT authentication, DRF-style error responses and JSON rendering.
+    Handlers get a rest_framework Request so paginators and serializers
+    work unchanged.
+    """
+
+    authentication = ClaimsJWTAuthentication()
+    renderer = JSONRenderer()
+    requires_authentication = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request)
+        try:
+            user_auth = await self.authentication.aauthenticate(request)
+            request.user, request.auth = user_auth or (AnonymousUser(), None)
+            if self.requires_authentication and not request.user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            return await super().dispatch(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return self.handle_exception(request, exc)
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authentication.authenticate_header(request)
+            exc.status_code = 401
+        response = exception_handler(exc, {"view": self, "request": request})
+        headers = {name: value for name, value in response.items() if name != "Content-Type"}
+        return self.render(response.data, status=response.status_code, headers=headers)
+
+    def render(self, data, status=200, headers=None):
+        return HttpResponse(
+            self.renderer.render(data), content_type="application/json", status=status, headers=headers
+        )
+
+
+class AsyncCourseCatalogView(AsyncAPIView):
+    """Async twin of views.CourseCatalogView."""
+
+    async def get(self, request):
+        validators = await acatalog_validators()
+        not_modified = validators.not_modified(request)
+        if not_modified:
+            return not_modified
+
+        paginator = CatalogCursorPagination()
+        page = await paginator.apaginate_queryset(catalog_queryset(request.query_params), request, self)
+        data = CourseSummarySerializer(page, many=True, context={"request": request}).data
+        return validators.apply(self.render(paginator.get_paginated_response(data).data))
+
+
+class AsyncCourseDetailView(AsyncAPIView):
+    """Async twin of views.CourseDetailView."""
+
+    async def get(self, request, pk):
+        # The enrollments are only needed to redact the outline, so they're
+        # loaded alongside it.
+        outline, _ = await asyncio.gather(aget_outline(pk), CourseAccess.for_request(request).aload())
+        if outline is None:
+            raise Http404
+        validators = await acourse_validators(request, pk, outline["creator_id"])
+        return validators.not_modified(request) or validators.apply(
+            self.render(render_outline(outline, request))
+        )
+
+
+class AsyncCoursePlayerView(AsyncAPIView):
+    """Async twin of views.CoursePlayerView."""
+
+    requires_authentication = True
+
+    async def get(self, request, pk):
+        # The cached outline carries the owner, so no course row is read;
+        # the enrollment check runs concurrently with loading it.
+        access = CourseAccess.for_request(request)
+        outline, _ = await asyncio.gather(aget_outline(pk), access.aload())
+        if outline is None:
+            raise Http404("No Course matches the given query.")
+        if not access.can_view(pk, outline["creator_id"]):
+            raise exceptions.PermissionDenied("You are not enrolled in course")
+        validators = await acourse_validators(request, pk, outline["creator_id"])
+        return validators.not_modified(request) or validators.apply(
+            self.render(render_outline(outline, request))
+        )
+
+
+class AsyncMyEnrollmentsView(AsyncAPIView):
+    """Async twin of views.MyEnrollmentsView."""
+
+    requires_authentication = True
+
+    async def get(self, request):
+        enrollments = [
+            enrollment
+            async for enrollment in Enrollment.objects.filter(user=request.user).select_related("course")
+        ]
+        return self.render(MyEnrollmentSerializer(enrollments, many=True, context={"request": request}).data)
@@ -0,0 +1,293 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Course
+
+# Sorts after every character, so "abc" + _END bounds all tokens starting with "abc".
+_END = chr(0x10FFFF)
+# Multi-word lookups remembered between changes.
+MAX_PHRASES = 1000
+
+
+def tokens(text):
+    return list(dict.fromkeys(re.findall(r"\w+", text.lower())))
+
+
+def _prefixes(words):
+    return {word[:n] for word in words for n in range(1, len(word) + 1)}
+
+
+class AutocompleteIndex:
+    """
+    In-process prefix index over published course titles and creator names.
+
+    The distinct tokens are kept in one sorted list, so the tokens starting
+    with a prefix form a contiguous slice - the subtree of that prefix in a
+    trie, without an object per character. The best `k` courses for each
+    prefix looked up so far are memoised and patched in place as courses
+    change; only removing a course from a full list drops it, to be
+    recomputed on the next lookup. Multi-word lookups intersect the matches
+    of each word and are remembered until the next change.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+        self.built_at = None
+        self._lock = threading.RLock()
+        self._entries = {}  # course id -> (rank, title, creator, words)
+        self._postings = {}  # token -> ids of the courses containing it
+        self._tokens = []  # sorted keys of _postings
+        self._top = {}  # prefix -> up to k course ids, best first
+        self._phrases = {}  # multi-word query -> the same, dropped on any change
+        self._journal = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def active(self):
+        """Whether the index is built or being built, i.e. worth keeping current."""
+        return self.built_at is not None or self._journal is not None
+
+    def begin_load(self):
+        # Title, creator and removal changes made while the rows are read are
+        # replayed on top of them; their enrollment counts are already in the
+        # rows, or would be counted twice.
+        with self._lock:
+            self._journal = []
+
+    def load(self, rows):
+        """Replace the contents with (id, title, creator, enrollments) rows."""
+        # Built aside so lookups keep using the current contents meanwhile.
+        fresh = AutocompleteIndex(self.k)
+        for pk, title, creator, enrollments in rows:
+            fresh._insert(pk, title, creator, enrollments)
+        fresh._tokens = sorted(fresh._postings)
+        with self._lock:
+            journal, self._journal = self._journal or [], None
+            self._entries, self._postings, self._tokens = fresh._entries, fresh._postings, fresh._tokens
+            self._top, self._phrases = {}, {}
+            for method, args in journal:
+                if method == "_add":
+                    args = args[:3] + (None,)  # Keep the count read from the row.
+                getattr(self, method)(*args)
+            self.built_at = time.monotonic()
+
+    def add(self, pk, title, creator, enrollments=None):
+        """Index a course or update it; `enrollments` defaults to its current count."""
+        with self._lock:
+            self._record("_add", pk, title, creator, enrollments)
+            self._add(pk, title, creator, enrollments)
+
+    def add_enrollments(self, pk, delta):
+        with self._lock:
+            self._add_enrollments(pk, delta)
+
+    def remove(self, pk):
+        with self._lock:
+            self._record("_discard", pk)
+            self._discard(pk)
+
+    def suggest(self, query, limit=None):
+        """The best matches for `query`, every term matched as a word prefix."""
+        words = tokens(query)
+        limit = min(limit or self.k, self.k)
+        if not words:
+            return []
+        with self._lock:
+            if len(words) == 1:
+                ids = self._best(words[0])[:limit]
+            else:
+                ids = self._phrase(tuple(words))[:limit]
+            return [self._suggestion(pk) for pk in ids]
+
+    def _record(self, method, *args):
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def _add(self, pk, title, creator, enrollments):
+        self._phrases.clear()
+        old = self._entries.get(pk)
+        if enrollments is None:
+            enrollments = old[0][0] if old else 0
+        if old and (old[1], old[2]) == (title, creator) and enrollments >= old[0][0]:
+            # Climbing the ranking can't push a course out of any top list.
+            self._entries[pk] = ((enrollments, pk),) + old[1:]
+        else:
+            self._discard(pk)
+            self._insert(pk, title, creator, enrollments, sort=True)
+        for prefix in _prefixes(self._entries[pk][3]):
+            self._place(prefix, pk)
+
+    def _add_enrollments(self, pk, delta):
+        entry = self._entries.get(pk)
+        if entry:
+            self._add(pk, entry[1], entry[2], max(0, entry[0][0] + delta))
+
+    def _insert(self, pk, title, creator, enrollments, sort=False):
+        words = frozenset(tokens(title) + tokens(creator))
+        self._entries[pk] = ((enrollments, pk), title, creator, words)
+        for word in words:
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                if sort:
+                    bisect.insort(self._tokens, word)
+            ids.add(pk)
+
+    def _discard(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        self._phrases.clear()
+        for word in entry[3]:
+            ids = self._postings[word]
+            ids.discard(pk)
+            if not ids:
+                del self._postings[word]
+                del self._tokens[bisect.bisect_left(self._tokens, word)]
+        for prefix in _prefixes(entry[3]):
+            top = self._top.get(prefix)
+            if top and pk in top:
+                if len(top) < self.k:
+                    top.remove(pk)  # The list held every match, so it stays exact.
+                else:
+                    del self._top[prefix]
+
+    def _place(self, prefix, pk):
+        top = self._top.get(prefix)
+        if top is None:
+            return
+        if pk in top:
+            top.remove(pk)
+        top.append(pk)
+        top.sort(key=lambda i: self._entries[i][0], reverse=True)
+        del top[self.k:]
+
+    def _matching(self, prefix):
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + _END, start)
+        return set().union(*(self._postings[word] for word in self._tokens[start:end]))
+
+    def _best(self, prefix):
+        top = self._top.get(prefix)
+        if top is None:
+            entries = self._entries
+            top = self._top[prefix] = heapq.nlargest(
+                self.k, self._matching(prefix), key=lambda pk: entries[pk][0]
+            )
+        return top
+
+    def _phrase(self, words):
+        top = self._phrases.get(words)
+        if top is None:
+            matches = sorted((self._matching(word) for word in words), key=len)
+            entries = self._entries
+            top = heapq.nlargest(self.k, matches[0].intersection(*matches[1:]), key=lambda pk: entries[pk][0])
+            if len(self._phrases) >= MAX_PHRASES:
+                self._phrases.clear()
+            self._phrases[words] = top
+        return top
+
+    def _suggestion(self, pk):
+        (enrollments, _), title, creator, _ = self._entries[pk]
+        return {"id": pk, "title": title, "creator": creator, "enrollments": enrollments}
+
+
+index = AutocompleteIndex(k=settings.AUTOCOMPLETE_TOP_K)
+_build_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def index_rows():
+    return (
+        Course.objects.filter(is_published=True)
+        .values_list("pk", "title", "creator__user_name", "enrollment_count")
+    )
+
+
+def _load():
+    index.begin_load()
+    index.load(index_rows().iterator(chunk_size=2000))
+
+
+def rebuild():
+    with _build_lock:
+        _load()
+
+
+def get_index():
+    """
+    The process-wide index. Built on first use; once older than
+    AUTOCOMPLETE_MAX_AGE it's rebuilt in a background thread while the old
+    one keeps serving, which picks up changes made by other processes.
+    """
+    if index.built_at is None:
+        with _build_lock:
+            if index.built_at is None:
+                _load()
+    elif (
+        settings.AUTOCOMPLETE_MAX_AGE
+        and time.monotonic() - index.built_at > settings.AUTOCOMPLETE_MAX_AGE
+        and not _refreshing.is_set()
+    ):
+        _refreshing.set()
+        threading.Thread(target=_refresh, name="autocomplete-refresh", daemon=True).start()
+    return index
+
+
+def _refresh():
+    try:
+        rebuild()
+    finally:
+        _refreshing.clear()
+        connection.close()
+
+
+def course_changed(course_id):
+    """Re-read a course into the index after the current transaction commits."""
+
+    def update():
+        if not index.active:
+            return
+        row = (
+            Course.objects.filter(pk=course_id, is_published=True)
+            .values_list("pk", "title", "creator__user_name")
+            .first()
+        )
+        if row is None:
+            index.remove(course_id)
+        else:
+            index.add(*row)
+
+    transaction.on_commit(update)
+
+
+def creator_changed(user_id):
+    """Re-read a creator's courses, which carry their name, after the transaction commits."""
+
+    def update():
+        if not index.active:
+            return
+        rows = (
+            Course.objects.filter(creator_id=user_id, is_published=True)
+            .values_list("pk", "title", "creator__user_name")
+        )
+        for row in rows:
+            index.add(*row)
+
+    transaction.on_commit(update)
+
+
+def course_deleted(course_id):
+    transaction.on_commit(lambda: index.remove(course_id))
+
+
+def enrollments_changed(course_id, delta):
+    transaction.on_commit(lambda: index.add_enrollments(course_id, delta))
@@ -0,0 +1,182 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from io import BytesIO
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency samples (seconds) -> summary in milliseconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "min_ms": round(min(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p90_ms": round(percentile(ms, 90), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def measure(call, iterations, warmup=3):
+    """
+    Run `call(i)` `iterations` times and return latency and query stats.
+    `call` must return an HTTP response; non-2xx responses are counted so a
+    broken scenario is visible in the results instead of looking fast.
+    """
+    for i in range(warmup):
+        call(-1 - i)
+
+    samples, queries, errors = [], [], 0
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = call(i)
+            samples.append(time.perf_counter() - started)
+        queries.append(len(ctx.captured_queries))
+        if response.status_code >= 300:
+            errors += 1
+
+    result = summarize(samples)
+    result["queries_per_request"] = round(statistics.fmean(queries), 2)
+    result["max_queries"] = max(queries)
+    result["errors"] = errors
+    return result
+
+
+def measure_serialization(serialize, iterations):
+    """Time `serialize()` alone, with the data already loaded."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        serialize()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def throughput(samples, errors, elapsed):
+    result = summarize(samples)
+    result["requests_per_second"] = round(len(samples) / elapsed, 1)
+    result["errors"] = errors
+    return result
+
+
+def wsgi_environ(url, headers):
+    path, _, query = url.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": BytesIO(),
+        "wsgi.errors": BytesIO(),
+    }
+    environ.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+    return environ
+
+
+def load_wsgi(application, request, total, concurrency, threads):
+    """
+    Keep `concurrency` requests in flight against a WSGI application served
+    by `threads` worker threads (like gunicorn's gthread worker) until
+    `total` have completed. `request(i)` returns (url, headers). Latency
+    includes the time a request waits for a free thread.
+    """
+
+    def call(i, submitted):
+        status = []
+        body = application(wsgi_environ(*request(i)), lambda s, h, exc_info=None: status.append(s))
+        try:
+            for _ in body:
+                pass
+        finally:
+            body.close()
+        return time.perf_counter() - submitted, int(status[0].split()[0]) >= 300
+
+    samples, errors, sent = [], 0, 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        pending = set()
+        while len(samples) < total:
+            while sent < total and len(pending) < concurrency:
+                pending.add(pool.submit(call, sent, time.perf_counter()))
+                sent += 1
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                latency, failed = future.result()
+                samples.append(latency)
+                errors += failed
+    return throughput(samples, errors, time.perf_counter() - started)
+
+
+def load_asgi(application, request, total, concurrency):
+    """
+    Keep `concurrency` requests in flight against an ASGI application on
+    one event loop (like a single uvicorn worker) until `total` complete.
+    """
+
+    async def call(i):
+        url, headers = request(i)
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"localhost")]
+            + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # The client never disconnects; Django cancels this when done.
+            await asyncio.Event().wait()
+
+        status = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        await application(scope, receive, send)
+        return status[0] >= 300
+
+    async def client(counter, samples, failures):
+        for i in counter:
+            started = time.perf_counter()
+            failed = await call(i)
+            samples.append(time.perf_counter() - started)
+            failures.append(failed)
+
+    async def run():
+        counter, samples, failures = iter(range(total)), [], []
+        await asyncio.gather(*(client(counter, samples, failures) for _ in range(concurrency)))
+        return samples, sum(failures)
+
+    started = time.perf_counter()
+    samples, errors = asyncio.run(run())
+    return throughput(samples, errors, time.perf_counter() - started)
@@ -0,0 +1,70 @@
+import asyncio
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .access import CourseAccess
+from .outlines import aaccess_version, acatalog_version, access_version, aget_version, catalog_version, get_version
+
+
+class Validators:
+    """
+    ETag/Last-Modified pair for a response, built from content versions
+    alone so a 304 can be answered before any serializer runs.
+    """
+
+    def __init__(self, tag, *versions):
+        self.etag = f'"{tag}"'
+        self.last_modified = max(versions) // 1_000_000_000
+
+    def not_modified(self, request):
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        return response and self.apply(response)
+
+    def apply(self, response):
+        response["ETag"] = self.etag
+        response["Last-Modified"] = http_date(self.last_modified)
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+
+def course_validators(request, course_id, creator_id):
+    access = CourseAccess.for_request(request)
+    version = get_version(course_id)
+    if not access.user.is_authenticated:
+        return Validators(f"course-{course_id}-{version}-public", version)
+    scope = "full" if access.can_view(course_id, creator_id) else "public"
+    return Validators(
+        f"course-{course_id}-{version}-{scope}", version, access_version(access.user.pk)
+    )
+
+
+async def acourse_validators(request, course_id, creator_id):
+    """course_validators() for async views; the reads it needs run concurrently."""
+    access = CourseAccess.for_request(request)
+    if not access.user.is_authenticated:
+        version = await aget_version(course_id)
+        return Validators(f"course-{course_id}-{version}-public", version)
+    version, user_version, _ = await asyncio.gather(
+        aget_version(course_id), aaccess_version(access.user.pk), access.aload()
+    )
+    scope = "full" if access.can_view(course_id, creator_id) else "public"
+    return Validators(f"course-{course_id}-{version}-{scope}", version, user_version)
+
+
+def catalog_validators(request, per_user=True):
+    version = catalog_version()
+    user = request.user
+    if not (per_user and user.is_authenticated):
+        return Validators(f"catalog-{version}", version)
+    user_version = access_version(user.pk)
+    return Validators(f"catalog-{version}-u{user.pk}-{user_version}", version, user_version)
+
+
+async def acatalog_validators():
+    """catalog_validators(per_user=False) for async views."""
+    version = await acatalog_version()
+    return Validators(f"catalog-{version}", version)
@@ -0,0 +1,100 @@
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Course, CourseCounterShard
+from .outlines import bump_version, outline_cache
+
+# Course.enrollment_count is moved by F() updates in the transaction that
+# enrolls or unenrolls. Every enrollment of a course locks the same row, so
+# a course with enrollment_shards set counts on one of that many
+# CourseCounterShard rows at random instead; fold_enrollment_shards() (run
+# by `reconcile_course_counters --fold`) moves them into the course row,
+# which lags by what hasn't been folded yet.
+#
+# Outlines and catalog ETags show enrollment_count, so both paths bump the
+# course's version: every COURSE_ENROLLMENT_COUNT_EPOCH counted enrollments
+# on the row, and on every fold that moves a sharded count.
+
+
+def _shards_key(course_id):
+    return f"course-enrollment-shards:{course_id}"
+
+
+def enrollment_shards(course_id):
+    """Course.enrollment_shards, cached so enrolling doesn't read the course row."""
+    cache = outline_cache()
+    shards = cache.get(_shards_key(course_id))
+    if shards is None:
+        shards = Course.objects.filter(pk=course_id).values_list("enrollment_shards", flat=True).first() or 0
+        cache.set(_shards_key(course_id), shards, timeout=settings.COURSE_OUTLINE_TIMEOUT)
+    return shards
+
+
+def _epoch_key(course_id):
+    return f"course-enrollment-epoch:{course_id}"
+
+
+def forget_enrollment_shards(course_id):
+    outline_cache().delete(_shards_key(course_id))
+
+
+def add_enrollments(course_id, delta):
+    """Count `delta` learners joining (or leaving, when negative) a course."""
+    if not delta:
+        return
+    shards = enrollment_shards(course_id)
+    if not shards:
+        Course.objects.filter(pk=course_id).update(enrollment_count=F("enrollment_count") + delta)
+        _advance_epoch(course_id, abs(delta))
+        return
+    shard = random.randrange(shards)
+    row = CourseCounterShard.objects.filter(course_id=course_id, shard=shard)
+    if not row.update(enrollments=F("enrollments") + delta):
+        # First use of this shard; a concurrent first use may win the insert.
+        CourseCounterShard.objects.bulk_create(
+            [CourseCounterShard(course_id=course_id, shard=shard)], ignore_conflicts=True
+        )
+        row.update(enrollments=F("enrollments") + delta)
+
+
+def _advance_epoch(course_id, changes):
+    cache = outline_cache()
+    key = _epoch_key(course_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        counted = cache.incr(key, changes)
+        if counted < settings.COURSE_ENROLLMENT_COUNT_EPOCH:
+            return
+        # Taking off what was read keeps concurrent increments.
+        cache.decr(key, counted)
+    except ValueError:
+        pass  # Evicted meanwhile; bumping early is harmless.
+    bump_version(course_id)
+
+
+def fold_enrollment_shards(course_ids=None):
+    """
+    Move the enrollments counted on shards into Course.enrollment_count.
+    Returns the ids of the courses whose count changed.
+    """
+    shards = CourseCounterShard.objects.exclude(enrollments=0)
+    if course_ids is not None:
+        shards = shards.filter(course_id__in=course_ids)
+    totals = defaultdict(int)
+    with transaction.atomic():
+        for pk, course_id, enrollments in shards.select_for_update().values_list("pk", "course_id", "enrollments"):
+            # What was read is subtracted rather than the shard zeroed, so
+            # nothing is lost where rows can't be locked.
+            CourseCounterShard.objects.filter(pk=pk).update(enrollments=F("enrollments") - enrollments)
+            totals[course_id] += enrollments
+        for course_id, total in totals.items():
+            if total:
+                Course.objects.filter(pk=course_id).update(enrollment_count=F("enrollment_count") + total)
+    folded = [course_id for course_id, total in totals.items() if total]
+    if folded:
+        bump_version(*folded)
+    return folded
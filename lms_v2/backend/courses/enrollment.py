@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from accounts.models import User
+from . import autocomplete
+from .counters import add_enrollments
+from .models import Course, Enrollment
+from .outlines import access_version, bump_access_version, outline_cache
+
+
+def enroll(user, course_id):
+    """
+    Enroll `user` in a course with a single INSERT ... SELECT that ignores the
+    (user, course) unique conflict, so concurrent requests can't race and a
+    repeated click is harmless. The SELECT only yields a row when the course
+    exists and isn't the user's own.
+
+    Returns the new Enrollment, or None when nothing was inserted (already
+    enrolled, own course or no such course).
+    """
+    ops = connection.ops
+    quote = ops.quote_name
+    enrollment = Enrollment(user=user, course_id=course_id, enrolled_on=timezone.now())
+    fields = [field for field in Enrollment._meta.concrete_fields if not field.primary_key]
+    course_table = quote(Course._meta.db_table)
+    course_pk = f"{course_table}.{quote(Course._meta.pk.column)}"
+
+    # Every column is written explicitly (defaults included); the course id
+    # comes from the SELECT.
+    columns, params = [], []
+    for field in fields:
+        if field.name == "course":
+            columns.append(course_pk)
+        else:
+            columns.append("%s")
+            params.append(field.get_db_prep_save(getattr(enrollment, field.attname), connection))
+
+    sql = (
+        f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote(Enrollment._meta.db_table)} "
+        f"({', '.join(quote(field.column) for field in fields)}) "
+        f"SELECT {', '.join(columns)} FROM {course_table} "
+        f"WHERE {course_pk} = %s AND {course_table}.{quote('creator_id')} <> %s"
+    )
+    suffix = ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    if suffix:
+        sql += f" {suffix}"
+    returning = connection.features.can_return_columns_from_insert
+    if returning:
+        sql += " " + ops.return_insert_columns([Enrollment._meta.pk])[0]
+
+    params += [course_id, user.pk]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if returning:
+            row = cursor.fetchone()
+            pk = row and row[0]
+        else:
+            pk = cursor.rowcount == 1 and ops.last_insert_id(cursor, Enrollment._meta.db_table, "id")
+        if pk:
+            add_enrollments(course_id, 1)
+    if not pk:
+        return None
+
+    # Raw SQL sends no post_save, so invalidate the user's cached access here.
+    bump_access_version(user.pk)
+    autocomplete.enrollments_changed(course_id, 1)
+    enrollment.pk = pk
+    enrollment._state.adding = False
+    enrollment._state.db = connection.alias
+    return enrollment
+
+
+def enroll_cohort(course, keys, field="pk", batch_size=1000):
+    """
+    Enroll many users, identified by `field` ("pk" or "email"), in `course`.
+
+    Each batch costs one query to resolve the users that exist, are active
+    and aren't enrolled yet, and one multi-row INSERT that still ignores
+    conflicts with concurrent enrollments. The course creator is skipped.
+    Returns (enrolled, skipped), counting the rows actually inserted.
+    """
+    enrolled = skipped = 0
+    keys = list(dict.fromkeys(keys))
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        user_ids = list(
+            User.objects.filter(**{f"{field}__in": batch}, is_active=True)
+            .exclude(pk=course.creator_id)
+            .exclude(enrollments__course=course)
+            .values_list("pk", flat=True)
+        )
+        with transaction.atomic():
+            inserted = insert_ignoring_conflicts([Enrollment(user_id=pk, course=course) for pk in user_ids])
+            add_enrollments(course.pk, inserted)
+        if inserted:
+            bump_access_version(*user_ids)
+            autocomplete.enrollments_changed(course.pk, inserted)
+        enrolled += inserted
+        skipped += len(batch) - inserted
+    return enrolled, skipped
+
+
+def insert_ignoring_conflicts(enrollments):
+    """
+    Write `enrollments` with multi-row INSERTs that skip (user, course)
+    pairs already taken. Unlike bulk_create(ignore_conflicts=True) this
+    tells how many rows were really inserted.
+    """
+    if not enrollments:
+        return 0
+    ops = connection.ops
+    quote = ops.quote_name
+    fields = [field for field in Enrollment._meta.concrete_fields if not field.primary_key]
+    rows = [
+        [field.get_db_prep_save(field.pre_save(enrollment, True), connection) for field in fields]
+        for enrollment in enrollments
+    ]
+    statement = (
+        f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote(Enrollment._meta.db_table)} "
+        f"({', '.join(quote(field.column) for field in fields)}) "
+    )
+    suffix = ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)
+    size = max(1, ops.bulk_batch_size(fields, enrollments))
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            sql = statement + ops.bulk_insert_sql(fields, [["%s"] * len(fields)] * len(chunk))
+            if suffix:
+                sql += f" {suffix}"
+            cursor.execute(sql, [value for row in chunk for value in row])
+            inserted += cursor.rowcount
+    return inserted
+
+
+def cached_enrollment_id(user_id, course_id):
+    """
+    The user's enrollment id in a course, or None. Cached under the user's
+    access version, so enrolling or leaving invalidates it without a query.
+    """
+    cache = outline_cache()
+    key = f"enrollment-id:{user_id}:{course_id}:{access_version(user_id)}"
+    enrollment_id = cache.get(key)
+    if enrollment_id is None:
+        enrollment_id = Enrollment.objects.filter(user_id=user_id, course_id=course_id).values_list(
+            "pk", flat=True
+        ).first() or 0
+        cache.set(key, enrollment_id, timeout=settings.COURSE_OUTLINE_TIMEOUT)
+    return enrollment_id or None
@@ -0,0 +1,170 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from monitoring.metrics import registry
+from .models import Chapter, Enrollment, PlaybackPosition
+
+logger = logging.getLogger("courses.heartbeats")
+
+
+class HeartbeatBuffer:
+    """
+    Write-behind buffer for player heartbeats.
+
+    Heartbeats are coalesced per (enrollment, chapter), keeping only the
+    latest position, and written with one upsert per batch by a background
+    thread every `flush_interval` seconds. At most `max_entries` distinct
+    keys are held: when a heartbeat for a new key would exceed that, the
+    caller flushes the buffer itself before adding it, so memory stays
+    bounded and the backpressure lands on the busiest workers.
+    """
+
+    def __init__(self, flush_interval=5.0, max_entries=50000, batch_size=1000):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        # {enrollment_id: {chapter_id: (seconds, received at)}}, so the
+        # positions of one enrollment are found without a scan.
+        self._pending = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, enrollment_id, chapter_id, seconds):
+        with self._lock:
+            full = (
+                chapter_id not in self._pending.get(enrollment_id, ())
+                and self._size >= self.max_entries
+            )
+        if full:
+            registry.inc("heartbeat_overflow_flushes_total", "Flushes forced by a full heartbeat buffer", {})
+            try:
+                self.flush()
+            except Exception:
+                # Logged in flush(), which keeps the positions; the
+                # heartbeat is still accepted.
+                pass
+        with self._lock:
+            chapters = self._pending.setdefault(enrollment_id, {})
+            self._size += chapter_id not in chapters
+            chapters[chapter_id] = (seconds, timezone.now())
+        registry.inc("heartbeats_total", "Player heartbeats accepted", {})
+        if self._thread is None and self.flush_interval:
+            self.start()
+
+    def latest(self, enrollment_id):
+        """Buffered positions of one enrollment: {chapter_id: seconds}."""
+        with self._lock:
+            chapters = dict(self._pending.get(enrollment_id, ()))
+        return {chapter_id: value[0] for chapter_id, value in chapters.items()}
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of rows upserted."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._size = self._pending, {}, 0
+            if not pending:
+                return 0
+            started = time.perf_counter()
+            rows = [
+                PlaybackPosition(enrollment_id=e_id, chapter_id=c_id, seconds=seconds, updated_at=at)
+                for e_id, chapters in pending.items()
+                for c_id, (seconds, at) in chapters.items()
+            ]
+            try:
+                written = self._write(rows)
+            except Exception:
+                logger.exception("Heartbeat flush failed; keeping %d positions for the next one", len(rows))
+                self._requeue(pending)
+                raise
+            registry.observe(
+                "heartbeat_flush_seconds", "Time spent writing a heartbeat batch", {},
+                time.perf_counter() - started,
+            )
+            registry.inc("heartbeat_rows_flushed_total", "Playback positions upserted", {}, written)
+            return written
+
+    def _write(self, rows):
+        written = 0
+        for start in range(0, len(rows), self.batch_size):
+            # Drop positions whose chapter or enrollment was deleted since
+            # the heartbeat; one FK violation would fail the whole batch.
+            batch = _existing(rows[start:start + self.batch_size])
+            _upsert(batch)
+            written += len(batch)
+        return written
+
+    def _requeue(self, pending):
+        # Positions received since the flush started are newer and win.
+        with self._lock:
+            for enrollment_id, chapters in pending.items():
+                current = self._pending.setdefault(enrollment_id, {})
+                for chapter_id, value in chapters.items():
+                    if chapter_id not in current:
+                        current[chapter_id] = value
+                        self._size += 1
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="heartbeat-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stop.clear()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # Logged in flush(); the positions are retried next time.
+            finally:
+                close_old_connections()
+
+
+def _upsert(rows):
+    unique_fields = None
+    if connection.features.supports_update_conflicts_with_target:
+        unique_fields = ["enrollment", "chapter"]
+    PlaybackPosition.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=["seconds", "updated_at"],
+    )
+
+
+def _existing(rows):
+    enrollments = set(
+        Enrollment.objects.filter(pk__in={r.enrollment_id for r in rows}).values_list("pk", flat=True)
+    )
+    chapters = set(
+        Chapter.objects.filter(pk__in={r.chapter_id for r in rows}).values_list("pk", flat=True)
+    )
+    return [r for r in rows if r.enrollment_id in enrollments and r.chapter_id in chapters]
+
+
+heartbeats = HeartbeatBuffer(
+    flush_interval=settings.HEARTBEAT_FLUSH_INTERVAL,
+    max_entries=settings.HEARTBEAT_MAX_BUFFERED,
+    batch_size=settings.HEARTBEAT_BATCH_SIZE,
+)
+atexit.register(heartbeats.stop)
@@ -0,0 +1,85 @@
+import csv
+
+from django.db import transaction
+from django.db.models import F, Max
+from rest_framework.exceptions import ValidationError
+
+from .models import Course, Section, Chapter, claim_chapter_positions
+from .ordering import ORDER_GAP, lock_parent
+from .outlines import bump_version
+from .search import schedule_reindex
+
+CSV_COLUMNS = ("section", "title", "video_url", "video_duration")
+
+
+def parse_outline_csv(lines):
+    """
+    Turn CSV rows of ``section,title,video_url,video_duration`` into the
+    outline structure accepted by CourseOutlineSerializer. Sections keep
+    the order in which they first appear. Raises ValidationError when the
+    header lacks one of those columns.
+    """
+    reader = csv.DictReader(lines)
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValidationError({"file": [f"Missing CSV columns: {', '.join(missing)}."]})
+    sections = {}
+    for row in reader:
+        section = sections.setdefault(row["section"], {"title": row["section"], "chapters": []})
+        section["chapters"].append({
+            "title": row["title"],
+            "video_url": row["video_url"],
+            "video_duration": row["video_duration"],
+        })
+    return {"sections": list(sections.values())}
+
+
+@transaction.atomic
+def import_outline(course, sections, replace=False, batch_size=1000):
+    """
+    Write a validated outline for `course` with one INSERT per batch of
+    sections and chapters. Order keys, positions and total hours are
+    computed in memory, so the per-row work done by Section.save and
+    Chapter.save is skipped.
+    """
+    lock_parent(Course, course.pk)
+    if replace:
+        course.sections.all().delete()
+        start = 0
+    else:
+        start = course.sections.aggregate(Max("order"))["order__max"] or 0
+
+    Section.objects.bulk_create(
+        [
+            Section(course=course, title=section["title"], order=start + i * ORDER_GAP)
+            for i, section in enumerate(sections, start=1)
+        ],
+        batch_size=batch_size,
+    )
+    # Not every backend returns primary keys from bulk_create, so read
+    # them back by their (course, order) key.
+    section_ids = dict(
+        Section.objects.filter(course=course, order__gt=start).values_list("order", "id")
+    )
+
+    chapters = [
+        Chapter(section_id=section_ids[start + i * ORDER_GAP], order=j * ORDER_GAP, **chapter)
+        for i, section in enumerate(sections, start=1)
+        for j, chapter in enumerate(section["chapters"], start=1)
+    ]
+    first = claim_chapter_positions(course.pk, len(chapters)) if chapters else 0
+    for position, chapter in enumerate(chapters, start=first):
+        chapter.position = position
+    Chapter.objects.bulk_create(chapters, batch_size=batch_size)
+
+    hours = sum(chapter.video_duration for chapter in chapters)
+    # Replaced sections were uncounted as they were deleted.
+    Course.objects.filter(pk=course.pk).update(
+        total_hours=hours if replace else F("total_hours") + hours,
+        section_count=F("section_count") + len(sections),
+    )
+    # bulk_create sends no signals, so invalidate the cached outline and
+    # search document here.
+    bump_version(course.pk)
+    schedule_reindex(course.pk)
+    return {"sections": len(sections), "chapters": len(chapters), "hours": hours}
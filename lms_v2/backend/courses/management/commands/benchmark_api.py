@@ -0,0 +1,183 @@
+import itertools
+import json
+import platform
+import subprocess
+import time
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from accounts.models import User
+from accounts.tokens import RoleRefreshToken
+from courses import autocomplete
+from courses.benchmarks import measure, measure_serialization
+from courses.management.commands.populate_courses import TOPICS
+from courses.models import Course, Enrollment
+from courses.serializers import CourseSerializer, MyEnrollmentSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the hot course/account API endpoints against a freshly seeded '
+        'throwaway database and write the results as JSON. Intended to be run '
+        'with --settings=backend.settings_bench so it needs nothing but SQLite.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--sections-per-course', type=int, default=8)
+        parser.add_argument('--chapters-per-section', type=int, default=10)
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--enrollments', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests per endpoint')
+        parser.add_argument('--login-requests', type=int, default=10, help='Password hashing makes login slow')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='bench_output.json')
+        parser.add_argument('--only', help='Comma-separated scenarios to run, e.g. search,course_detail')
+
+    def handle(self, *args, **options):
+        # Seed into a separate test database so the configured one is never touched.
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        for name, result in report['results'].items():
+            self.stdout.write(
+                f"{name:<18} p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                f"queries {result['queries_per_request']:>6}  errors {result['errors']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run(self, options):
+        started = time.perf_counter()
+        call_command(
+            'populate_courses',
+            courses=options['courses'],
+            sections_per_course=options['sections_per_course'],
+            chapters_per_section=options['chapters_per_section'],
+            students=options['students'],
+            enrollments=options['enrollments'],
+            seed=options['seed'],
+            stdout=StringIO(),
+        )
+        seed_seconds = time.perf_counter() - started
+
+        n = options['requests']
+        enrollment = Enrollment.objects.select_related('user', 'course').order_by('pk').first()
+        student, course = enrollment.user, enrollment.course
+        User.objects.create_user(email='bench-login@example.com', password='bench-password', user_name='bench')
+        newcomers = [
+            User.objects.create(email=f'bench-enroll{i}@example.com', user_name=f'bench{i}')
+            for i in range(n + 3)
+        ]
+        course_ids = list(Course.objects.values_list('pk', flat=True)[:n + 3])
+
+        # Server errors are counted in the results rather than aborting the run.
+        anonymous = APIClient(raise_request_exception=False)
+        authed = APIClient(raise_request_exception=False)
+        authed.credentials(HTTP_AUTHORIZATION=f'Bearer {RoleRefreshToken.for_user(student).access_token}')
+
+        def enroll(i):
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(newcomers[i])
+            return client.post('/api/courses/enroll/', {'course': course_ids[i % len(course_ids)]}, format='json')
+
+        queries = [f'{topic} {level}' for topic in TOPICS for level in ('beginner', 'advanced', 'hands')]
+
+        prefixes = [topic.lower()[:length] for topic in TOPICS for length in (1, 3)] + ['data sc', 'hands py']
+
+        def autocomplete_scenario():
+            started = time.perf_counter()
+            autocomplete.rebuild()
+            build_seconds = time.perf_counter() - started
+            result = measure(
+                lambda i: anonymous.get('/api/courses/autocomplete/', {'q': prefixes[i % len(prefixes)]}), n
+            )
+            # Server time of a lookup alone, without the HTTP stack.
+            queries = itertools.cycle(prefixes)
+            result['lookup'] = measure_serialization(lambda: autocomplete.index.suggest(next(queries)), n)
+            result['build_seconds'] = round(build_seconds, 3)
+            result['indexed_courses'] = len(autocomplete.index)
+            return result
+
+        scenarios = {
+            'course_list': lambda: measure(lambda i: anonymous.get('/api/courses/'), max(1, n // 10)),
+            'search': lambda: measure(
+                lambda i: anonymous.get('/api/courses/search/', {'q': queries[i % len(queries)]}), n
+            ),
+            'autocomplete': autocomplete_scenario,
+            'course_detail': lambda: measure(lambda i: anonymous.get(f'/api/courses/{course.pk}/'), n),
+            'course_player': lambda: measure(lambda i: authed.get(f'/api/courses/{course.pk}/player/'), n),
+            'my_enrollments': lambda: measure(lambda i: authed.get('/api/courses/my-enrollments/'), n),
+            'enroll': lambda: measure(enroll, n),
+            'login': lambda: measure(
+                lambda i: anonymous.post(
+                    '/api/accounts/login/',
+                    {'email': 'bench-login@example.com', 'password': 'bench-password'},
+                    format='json',
+                ),
+                options['login_requests'],
+                warmup=1,
+            ),
+        }
+        selected = options['only'].split(',') if options['only'] else list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        results = {name: scenarios[name]() for name in selected}
+
+        request = Request(APIRequestFactory().get('/'))
+        request.user = student
+        context = {'request': request}
+        # Serialization alone, with the data already loaded.
+        if 'course_list' in results:
+            catalog = list(Course.objects.with_tree())
+            results['course_list']['serialization'] = measure_serialization(
+                lambda: CourseSerializer(catalog, many=True, context=context).data, max(1, n // 10)
+            )
+        if 'course_detail' in results:
+            tree = Course.objects.with_tree().get(pk=course.pk)
+            results['course_detail']['serialization'] = measure_serialization(
+                lambda: CourseSerializer(tree, context=context).data, n
+            )
+        if 'my_enrollments' in results:
+            mine = list(Enrollment.objects.filter(user=student).select_related('course'))
+            results['my_enrollments']['serialization'] = measure_serialization(
+                lambda: MyEnrollmentSerializer(mine, many=True, context=context).data, n
+            )
+
+        return {
+            'meta': {
+                'commit': self.git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed_seconds': round(seed_seconds, 2),
+                'dataset': {
+                    key: options[key]
+                    for key in ('courses', 'sections_per_course', 'chapters_per_section', 'students', 'enrollments', 'seed')
+                },
+            },
+            'results': results,
+        }
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,133 @@
+import json
+import time
+from io import StringIO
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from accounts.tokens import RoleRefreshToken
+from courses.benchmarks import load_asgi, load_wsgi
+from courses.models import Course, Enrollment
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of the read-heavy course endpoints served by the '
+        'sync DRF views under WSGI (a pool of worker threads), the same views under '
+        'ASGI, and the native async views under ASGI (one event loop), at a fixed '
+        'number of requests in flight. '
+        'The applications are driven in-process, so no server is measured. Run with '
+        '--settings=backend.settings_bench. SQLite answers from memory; use '
+        '--db-latency-ms to model the round trip to a database server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=200)
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--enrollments', type=int, default=3000)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and server')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0, help='Added to every query')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='bench_concurrency.json')
+        parser.add_argument('--only', help='Comma-separated endpoints, e.g. course_detail,catalog')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        for name, result in report['results'].items():
+            for server in ('wsgi', 'asgi', 'asgi_async'):
+                stats = result[server]
+                self.stdout.write(
+                    f"{name:<16} {server:<10}  {stats['requests_per_second']:>8.1f} req/s  "
+                    f"p50 {stats['p50_ms']:>8.2f}ms  p99 {stats['p99_ms']:>8.2f}ms  errors {stats['errors']}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run(self, options):
+        call_command(
+            'populate_courses',
+            courses=options['courses'],
+            students=options['students'],
+            enrollments=options['enrollments'],
+            seed=options['seed'],
+            stdout=StringIO(),
+        )
+        from backend.asgi import AsyncRoutesHandler
+
+        if options['db_latency_ms']:
+            delay = options['db_latency_ms'] / 1000
+
+            def network(execute, sql, params, many, context):
+                time.sleep(delay)
+                return execute(sql, params, many, context)
+
+            # Every thread opens its own connection; each one gets the delay.
+            # Connections open mid-request, inside execute_wrapper() blocks
+            # that pop the last wrapper on exit, so this goes first.
+            connection_created.connect(
+                lambda sender, connection, **kwargs: connection.execute_wrappers.insert(0, network), weak=False
+            )
+
+        wsgi_application = get_wsgi_application()
+        enrollment = Enrollment.objects.select_related('user').order_by('pk').first()
+        token = {'Authorization': f'Bearer {RoleRefreshToken.for_user(enrollment.user).access_token}'}
+        course_ids = list(Course.objects.values_list('pk', flat=True)[:50])
+
+        endpoints = {
+            'catalog': lambda i: ('/api/courses/catalog/', {}),
+            'course_detail': lambda i: (f'/api/courses/{course_ids[i % len(course_ids)]}/', {}),
+            'course_player': lambda i: (f'/api/courses/{enrollment.course_id}/player/', token),
+            'my_enrollments': lambda i: ('/api/courses/my-enrollments/', token),
+        }
+        selected = options['only'].split(',') if options['only'] else list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        total, concurrency = options['requests'], options['concurrency']
+        results = {}
+        for name in selected:
+            request = endpoints[name]
+            # Warm the outline cache so both servers see the same state.
+            load_wsgi(wsgi_application, request, min(total, 100), 1, 1)
+            wsgi = load_wsgi(wsgi_application, request, total, concurrency, options['threads'])
+            # The same sync views under ASGI, then the async ones (opt-in via
+            # ASYNC_COURSE_VIEWS), so the server and the views compare apart.
+            asgi = load_asgi(ASGIHandler(), request, total, concurrency)
+            asgi_async = load_asgi(AsyncRoutesHandler(), request, total, concurrency)
+            results[name] = {
+                'wsgi': wsgi,
+                'asgi': asgi,
+                'asgi_async': asgi_async,
+                'asgi_speedup': round(asgi['requests_per_second'] / wsgi['requests_per_second'], 2),
+                'async_views_speedup': round(
+                    asgi_async['requests_per_second'] / asgi['requests_per_second'], 2
+                ),
+            }
+
+        return {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'database': connection.vendor,
+                'concurrency': concurrency,
+                'wsgi_threads': options['threads'],
+                'requests': total,
+                'db_latency_ms': options['db_latency_ms'],
+            },
+            'results': results,
+        }
@@ -0,0 +1,165 @@
+import json
+import random
+import threading
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from courses.benchmarks import measure
+from courses.heartbeats import HeartbeatBuffer, heartbeats
+from courses.models import Chapter, Enrollment, PlaybackPosition
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark player heartbeat ingestion: one write per heartbeat versus the '
+        'coalescing write-behind buffer, against a throwaway database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--learners', type=int, default=2000, help='Concurrently watching enrollments')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration of the buffered run')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--flush-interval', type=float, default=1.0)
+        parser.add_argument('--max-buffered', type=int, default=50000)
+        parser.add_argument('--direct', type=int, default=2000, help='Heartbeats written one at a time for comparison')
+        parser.add_argument('--requests', type=int, default=200, help='Heartbeats sent through the HTTP endpoint')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='bench_heartbeats.json')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        direct, buffered = report['direct'], report['buffered']
+        self.stdout.write(f"direct    {direct['heartbeats_per_second']:>10,.0f} heartbeats/s")
+        self.stdout.write(
+            f"buffered  {buffered['heartbeats_per_second']:>10,.0f} heartbeats/s  "
+            f"{buffered['rows_per_second']:,.0f} rows/s written  "
+            f"peak buffer {buffered['peak_buffered']}  flushes {buffered['flushes']}"
+        )
+        self.stdout.write(
+            f"endpoint  p50 {report['endpoint']['p50_ms']:.2f}ms  "
+            f"queries {report['endpoint']['queries_per_request']}"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run(self, options):
+        courses = max(1, options['learners'] // 200)
+        call_command(
+            'populate_courses', courses=courses, sections_per_course=4, chapters_per_section=5,
+            students=options['learners'], enrollments=options['learners'], seed=options['seed'],
+            stdout=StringIO(),
+        )
+        rng = random.Random(options['seed'])
+        chapters = {}
+        for chapter_id, course_id in Chapter.objects.values_list('pk', 'section__course_id'):
+            chapters.setdefault(course_id, []).append(chapter_id)
+        learners = [
+            (enrollment_id, rng.choice(chapters[course_id]))
+            for enrollment_id, course_id in Enrollment.objects.values_list('pk', 'course_id')
+        ]
+
+        return {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'database': connection.vendor,
+                'options': {k: v for k, v in options.items() if k not in ('stdout', 'stderr', 'output')},
+            },
+            'direct': self.run_direct(learners, options['direct']),
+            'buffered': self.run_buffered(learners, options),
+            'endpoint': self.run_endpoint(options['requests']),
+        }
+
+    def run_direct(self, learners, count):
+        # What the endpoint would do without the buffer: one upsert per heartbeat.
+        started = time.perf_counter()
+        for i in range(count):
+            enrollment_id, chapter_id = learners[i % len(learners)]
+            PlaybackPosition.objects.update_or_create(
+                enrollment_id=enrollment_id, chapter_id=chapter_id,
+                defaults={'seconds': float(i), 'updated_at': timezone.now()},
+            )
+        elapsed = time.perf_counter() - started
+        return {'heartbeats': count, 'seconds': round(elapsed, 3), 'heartbeats_per_second': round(count / elapsed)}
+
+    def run_buffered(self, learners, options):
+        PlaybackPosition.objects.all().delete()
+        buffer = HeartbeatBuffer(flush_interval=0, max_entries=options['max_buffered'])
+        flushed = {'rows': 0, 'flushes': 0, 'seconds': 0.0}
+        peak = 0
+        done = threading.Event()
+
+        def flusher():
+            nonlocal peak
+            while not done.wait(options['flush_interval']):
+                peak = max(peak, len(buffer))
+                started = time.perf_counter()
+                flushed['rows'] += buffer.flush()
+                flushed['seconds'] += time.perf_counter() - started
+                flushed['flushes'] += 1
+
+        counts = [0] * options['threads']
+
+        def player(n):
+            rng = random.Random(n)
+            deadline = time.perf_counter() + options['seconds']
+            sent = 0
+            while time.perf_counter() < deadline:
+                for _ in range(100):
+                    enrollment_id, chapter_id = learners[rng.randrange(len(learners))]
+                    buffer.add(enrollment_id, chapter_id, float(sent))
+                    sent += 1
+            counts[n] = sent
+
+        flush_thread = threading.Thread(target=flusher)
+        flush_thread.start()
+        players = [threading.Thread(target=player, args=(n,)) for n in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in players:
+            thread.start()
+        for thread in players:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        flush_thread.join()
+        peak = max(peak, len(buffer))
+        flushed['rows'] += buffer.flush()
+
+        total = sum(counts)
+        return {
+            'heartbeats': total,
+            'seconds': round(elapsed, 3),
+            'heartbeats_per_second': round(total / elapsed),
+            'rows_written': flushed['rows'],
+            'rows_per_second': round(flushed['rows'] / elapsed),
+            'coalescing_ratio': round(total / max(1, flushed['rows']), 1),
+            'flushes': flushed['flushes'],
+            'flush_seconds': round(flushed['seconds'], 3),
+            'peak_buffered': peak,
+            'stored_positions': PlaybackPosition.objects.count(),
+        }
+
+    def run_endpoint(self, count):
+        enrollment = Enrollment.objects.select_related('user').order_by('pk').first()
+        chapter_id = Chapter.objects.filter(section__course_id=enrollment.course_id).values_list('pk', flat=True)[0]
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(enrollment.user)
+        url = f'/api/courses/{enrollment.course_id}/heartbeat/'
+        result = measure(lambda i: client.post(url, {'chapter': chapter_id, 'seconds': i + 10}, format='json'), count)
+        # Flush before the throwaway database goes away.
+        heartbeats.stop()
+        return result
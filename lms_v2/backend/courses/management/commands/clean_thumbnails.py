@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.thumbnails import backfill, rehash_thumbnails, sweep_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Move thumbnails saved before content addressing to hashed names, render '
+        'missing variants and delete thumbnail files no course uses'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=max(1, settings.THUMBNAIL_WORKERS))
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        moved = rehash_thumbnails()
+        rendered, _, failures = backfill(workers=options['workers'])
+        deleted = sweep_thumbnails()
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} courses to hashed thumbnails, rendered {rendered} thumbnails and '
+            f'deleted {deleted} unused files in {time.perf_counter() - started:.1f}s'
+        ))
+        if failures:
+            self.stderr.write(self.style.ERROR(f'{failures} thumbnails could not be rendered; see the log'))
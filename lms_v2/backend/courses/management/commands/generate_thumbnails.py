@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.thumbnails import backfill
+
+
+class Command(BaseCommand):
+    help = 'Render the resized thumbnail variants of courses that are missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=max(1, settings.THUMBNAIL_WORKERS))
+        parser.add_argument('--batch-size', type=int, default=1000, help='Courses updated per query')
+        parser.add_argument('--force', action='store_true', help='Re-render up-to-date variants too')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rendered, updated, failures = backfill(
+            force=options['force'], workers=options['workers'], batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} thumbnails for {updated} courses in {time.perf_counter() - started:.1f}s'
+        ))
+        if failures:
+            self.stderr.write(self.style.ERROR(f'{failures} thumbnails could not be rendered; see the log'))
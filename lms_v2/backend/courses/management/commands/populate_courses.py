@@ -1,16 +1,209 @@
 from django.core.management.base import BaseCommand
 from django.core.files.base import ContentFile
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db.models import Max
 from accounts.models import User
-from courses.models import Course, Section, Chapter
+from courses.models import Course, Section, Chapter, Enrollment
+from courses.ordering import ORDER_GAP
+from courses.search import index_courses
+from courses.storage import thumbnail_storage
+from courses.thumbnails import render_variants
 import io
+import random
+import time
+from collections import Counter
 from PIL import Image
 from django.db import transaction
 
 
+TOPICS = [
+    'Python', 'Django', 'React', 'SQL', 'Data Science', 'Machine Learning', 'Docker',
+    'Kubernetes', 'TypeScript', 'Go', 'Rust', 'Statistics', 'UX Design', 'Networking',
+]
+LEVELS = ['Beginner', 'Intermediate', 'Advanced', 'Complete', 'Practical', 'Hands-on']
+
+
+def create_thumbnail():
+    img = Image.new('RGB', (300, 200), color=(73, 109, 137))
+    img_io = io.BytesIO()
+    img.save(img_io, format='PNG')
+    img_io.seek(0)
+    return ContentFile(img_io.read(), name='thumbnail.png')
+
+
+class BatchWriter:
+    """
+    Buffers model instances and writes them with bulk_create every `size`
+    rows. Parent writers are flushed first so foreign keys always resolve.
+    """
+
+    def __init__(self, model, size, parents=()):
+        self.model = model
+        self.size = size
+        self.parents = parents
+        self.pending = []
+        self.written = 0
+
+    def add(self, obj):
+        self.pending.append(obj)
+        if len(self.pending) >= self.size:
+            self.flush()
+
+    def flush(self):
+        for parent in self.parents:
+            parent.flush()
+        if self.pending:
+            self.model.objects.bulk_create(self.pending, batch_size=self.size)
+            self.written += len(self.pending)
+            self.pending = []
+
+
+def next_id(model):
+    return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+
 class Command(BaseCommand):
-    help = 'Populate database with 3 sample courses with sections and chapters'
+    help = (
+        'Populate database with 3 sample courses with sections and chapters, '
+        'or generate a load-test dataset when --courses is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, help='Generate this many courses instead of the samples')
+        parser.add_argument('--sections-per-course', type=int, default=8)
+        parser.add_argument('--chapters-per-section', type=int, default=10)
+        parser.add_argument('--creators', type=int, help='Defaults to one creator per 100 courses')
+        parser.add_argument('--students', type=int, default=0)
+        parser.add_argument('--enrollments', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['courses']:
+            self.generate(options)
+        else:
+            self.populate_samples()
+
+    def generate(self, options):
+        """
+        Stream a synthetic dataset into the database in bulk_create batches.
 
-    def handle(self, *args, **kwargs):
+        Primary keys are assigned up front (continuing after the current
+        maximum) so children can reference parents without reading IDs back,
+        and at most one batch per table is held in memory at a time.
+        """
+        rng = random.Random(options['seed'])
+        size = options['batch_size']
+        n_courses = options['courses']
+        n_students = options['students']
+        n_creators = options['creators'] or max(1, n_courses // 100)
+        n_enrollments = min(options['enrollments'], n_students * n_courses)
+        started = time.perf_counter()
+
+        password = make_password('password123')
+        thumbnail = thumbnail_storage().save('course_thumbnails/thumbnail.png', create_thumbnail())
+        # Every generated course shares the image, so its variants are rendered once.
+        variants = render_variants(thumbnail)
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name in ('CREATOR', 'STUDENT')}
+
+        with transaction.atomic():
+            first_user = next_id(User)
+            creator_ids = self.generate_users(first_user, n_creators, 'creator', groups['CREATOR'], password, size)
+            student_ids = self.generate_users(first_user + n_creators, n_students, 'student', groups['STUDENT'], password, size)
+            self.stdout.write(f'Users: {n_creators} creators, {n_students} students')
+
+            course_ids = self.generate_courses(rng, n_courses, creator_ids, thumbnail, variants, options, size)
+            self.stdout.write(f'Courses: {n_courses}')
+
+            # bulk_create sends no signals; index the new courses directly.
+            for start in range(0, n_courses, 500):
+                index_courses(course_ids[start:start + 500])
+
+            written = self.generate_enrollments(rng, n_enrollments, student_ids, course_ids, size)
+            self.stdout.write(f'Enrollments: {written}')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Generated dataset in {elapsed:.1f}s (seed {options["seed"]})'))
+
+    def generate_users(self, first_id, count, prefix, group, password, size):
+        users = BatchWriter(User, size)
+        memberships = BatchWriter(User.groups.through, size, parents=[users])
+        for pk in range(first_id, first_id + count):
+            users.add(User(pk=pk, email=f'{prefix}{pk}@example.com', user_name=f'{prefix}{pk}', password=password))
+            memberships.add(User.groups.through(user_id=pk, group_id=group.pk))
+        memberships.flush()
+        return range(first_id, first_id + count)
+
+    def generate_courses(self, rng, count, creator_ids, thumbnail, variants, options, size):
+        courses = BatchWriter(Course, size)
+        sections = BatchWriter(Section, size, parents=[courses])
+        chapters = BatchWriter(Chapter, size, parents=[sections])
+        first_course, section_id = next_id(Course), next_id(Section)
+        n_chapters = options['sections_per_course'] * options['chapters_per_section']
+
+        for course_id in range(first_course, first_course + count):
+            topic = rng.choice(TOPICS)
+            outline = []
+            for s in range(1, options['sections_per_course'] + 1):
+                durations = [
+                    round(rng.uniform(0.05, 0.5), 2) for _ in range(options['chapters_per_section'])
+                ]
+                outline.append((section_id, s, durations))
+                section_id += 1
+
+            courses.add(Course(
+                pk=course_id,
+                creator_id=rng.choice(creator_ids),
+                title=f'{rng.choice(LEVELS)} {topic} #{course_id}',
+                description=f'A generated course about {topic}.',
+                requirements=f'Curiosity about {topic}.',
+                thumbnail=thumbnail,
+                thumbnail_variants=variants,
+                total_hours=round(sum(sum(d) for _, _, d in outline), 2),
+                chapter_count=n_chapters,
+                chapter_slots=n_chapters,
+                section_count=options['sections_per_course'],
+                is_published=rng.random() < 0.8,
+            ))
+            for pk, order, durations in outline:
+                sections.add(Section(
+                    pk=pk, course_id=course_id, title=f'{topic} part {order}', order=order * ORDER_GAP
+                ))
+            position = 0
+            for pk, order, durations in outline:
+                for c, duration in enumerate(durations, start=1):
+                    chapters.add(Chapter(
+                        section_id=pk,
+                        position=position,
+                        title=f'Lesson {order}.{c}',
+                        video_url=f'https://example.com/videos/{course_id}/{order}/{c}',
+                        video_duration=duration,
+                        order=c * ORDER_GAP,
+                    ))
+                    position += 1
+        chapters.flush()
+        return range(first_course, first_course + count)
+
+    def generate_enrollments(self, rng, count, student_ids, course_ids, size):
+        enrollments = BatchWriter(Enrollment, size)
+        if not count:
+            return 0
+        per_course = Counter()
+        per_student, extra = divmod(count, len(student_ids))
+        for i, user_id in enumerate(student_ids):
+            k = per_student + (1 if i < extra else 0)
+            # random.sample keeps (user, course) unique without a global seen-set.
+            for offset in rng.sample(range(len(course_ids)), k):
+                enrollments.add(Enrollment(user_id=user_id, course_id=course_ids[offset]))
+                per_course[course_ids[offset]] += 1
+        enrollments.flush()
+        Course.objects.bulk_update(
+            [Course(pk=pk, enrollment_count=n) for pk, n in per_course.items()], ['enrollment_count'], batch_size=size
+        )
+        return enrollments.written
+
+    def populate_samples(self):
         # Clear existing courses to avoid duplicates
         Course.objects.all().delete()
         self.stdout.write(self.style.WARNING('Cleared existing courses'))
@@ -30,14 +223,6 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.WARNING(f'User already exists: {creator.email}'))
 
-        # Create a simple thumbnail image
-        def create_thumbnail():
-            img = Image.new('RGB', (300, 200), color=(73, 109, 137))
-            img_io = io.BytesIO()
-            img.save(img_io, format='PNG')
-            img_io.seek(0)
-            return ContentFile(img_io.read(), name='thumbnail.png')
-
         # Course 1: Python Programming for Beginners
         course1, created = Course.objects.get_or_create(
             title='Python Programming for Beginners',
@@ -0,0 +1,110 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from courses.counters import fold_enrollment_shards
+from courses.models import Course, CourseCounterShard, Chapter, Enrollment, Section
+from courses.outlines import bump_version
+from courses.progress import clear_released_positions
+
+COUNTERS = {
+    'enrollment_count': (Enrollment, 'course_id'),
+    'section_count': (Section, 'course_id'),
+    'chapter_count': (Chapter, 'section__course_id'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Recompute the enrollment, section and chapter counts of every course and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+        parser.add_argument(
+            '--fold', action='store_true',
+            help='Only move enrollments counted on shards into the course counts',
+        )
+        parser.add_argument(
+            '--progress', action='store_true',
+            help='Also clear progress bits of chapters that left each course',
+        )
+
+    def handle(self, *args, **options):
+        if options['fold']:
+            folded = fold_enrollment_shards()
+            self.stdout.write(self.style.SUCCESS(f'Folded enrollment shards of {len(folded)} courses'))
+            return
+
+        batch_size = options['batch_size']
+        checked = repaired = 0
+        batch = []
+
+        courses = Course.objects.order_by('pk').values_list('pk', flat=True)
+        for pk in courses.iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) == batch_size:
+                repaired += self.reconcile(batch, options['dry_run'])
+                checked += len(batch)
+                batch = []
+        if batch:
+            repaired += self.reconcile(batch, options['dry_run'])
+            checked += len(batch)
+
+        verb = 'would repair' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} courses, {verb} {repaired}'))
+
+        if options['progress'] and not options['dry_run']:
+            rewritten = sum(
+                clear_released_positions(pk, batch_size)
+                for pk in courses.iterator(chunk_size=batch_size)
+            )
+            self.stdout.write(self.style.SUCCESS(f'Cleared released chapters from {rewritten} enrollments'))
+
+    @transaction.atomic
+    def reconcile(self, batch, dry_run):
+        # With the course and shard rows locked, enrollments and content
+        # changing meanwhile wait to count themselves until after the write.
+        stored = {
+            row['pk']: row
+            for row in Course.objects.select_for_update().filter(pk__in=batch)
+            .values('pk', *COUNTERS)
+        }
+        pending = dict(
+            CourseCounterShard.objects.select_for_update().filter(course_id__in=batch)
+            .order_by()
+            .values_list('course_id')
+            .annotate(total=Sum('enrollments'))
+        )
+        actual = {
+            name: dict(
+                model.objects.filter(**{f'{column}__in': batch})
+                .order_by()
+                .values_list(column)
+                .annotate(total=Count('pk'))
+            )
+            for name, (model, column) in COUNTERS.items()
+        }
+
+        stale, folded = [], []
+        for pk, row in stored.items():
+            counts = {name: actual[name].get(pk, 0) for name in COUNTERS}
+            drift = {
+                name: count for name, count in counts.items()
+                if count != row[name] + (pending.get(pk, 0) if name == 'enrollment_count' else 0)
+            }
+            if drift:
+                stale.append(Course(pk=pk, **counts))
+                changes = ', '.join(f'{name} -> {count}' for name, count in drift.items())
+                self.stdout.write(f'  course {pk}: {changes}')
+            elif pending.get(pk):
+                folded.append(Course(pk=pk, **counts))
+
+        if not dry_run:
+            # The recount includes what the shards were holding.
+            CourseCounterShard.objects.filter(course_id__in=batch).exclude(enrollments=0).update(enrollments=0)
+            if stale or folded:
+                Course.objects.bulk_update(stale + folded, list(COUNTERS))
+            # Both change what outlines and catalog pages show.
+            for course in stale + folded:
+                bump_version(course.pk)
+        return len(stale)
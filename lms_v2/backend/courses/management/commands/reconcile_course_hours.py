@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from courses.models import Course, Chapter
+from courses.outlines import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Recompute Course.total_hours from chapter durations and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = repaired = 0
+        batch = []
+
+        courses = Course.objects.order_by('pk').values_list('pk', 'total_hours')
+        for row in courses.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                repaired += self.reconcile(batch, options['dry_run'])
+                checked += len(batch)
+                batch = []
+        if batch:
+            repaired += self.reconcile(batch, options['dry_run'])
+            checked += len(batch)
+
+        verb = 'would repair' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} courses, {verb} {repaired}'))
+
+    def reconcile(self, batch, dry_run):
+        totals = dict(
+            Chapter.objects.filter(section__course_id__in=[pk for pk, _ in batch])
+            .order_by()
+            .values_list('section__course_id')
+            .annotate(total=Sum('video_duration'))
+        )
+        stale = [
+            Course(pk=pk, total_hours=totals.get(pk, 0.0))
+            for pk, stored in batch
+            if abs(totals.get(pk, 0.0) - stored) > 1e-6
+        ]
+        for course in stale:
+            self.stdout.write(f'  course {course.pk}: total_hours -> {course.total_hours}')
+        if stale and not dry_run:
+            Course.objects.bulk_update(stale, ['total_hours'])
+            for course in stale:
+                bump_version(course.pk)
+        return len(stale)
@@ -0,0 +1,224 @@
+import mimetypes
+import os
+import posixpath
+import re
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.signing import Signer
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import permissions
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .access import CourseAccess
+
+# Files under these prefixes are public and never change under a name
+# (thumbnails are content addressed, variants are named after them).
+PUBLIC_PREFIXES = ("course_thumbnails/",)
+# course_assets/<course id>/... is served to whoever may watch the course.
+COURSE_ASSET = re.compile(r"^course_assets/(\d+)/")
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_signer = Signer(salt="courses.media")
+
+
+class RangeFile:
+    """
+    `length` bytes of an open file from its current position. Keeps fileno()
+    so servers that sendfile() a wsgi.file_wrapper (gunicorn sends the
+    Content-Length from the current offset) stay zero-copy for ranges too.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single-range Range header, inclusive; None to ignore
+    it and send the whole file; False when it can't be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last `end` bytes.
+        length = int(end)
+        return (max(0, size - length), size - 1) if length and size else False
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return False
+    return start, (min(int(end), size - 1) if end else size - 1)
+
+
+def is_canonical(name):
+    return posixpath.normpath(name) == name and not name.startswith(("/", "../"))
+
+
+def sign_media_url(name):
+    """
+    A URL for the media file `name` that works without credentials until it
+    expires (MEDIA_SIGNED_URL_MAX_AGE), for <video> and <img> tags, which
+    can't send the Bearer token. Returns (url, expires).
+    """
+    expires = int(time.time()) + settings.MEDIA_SIGNED_URL_MAX_AGE
+    query = urlencode({"expires": expires, "signature": _signer.signature(f"{name}:{expires}")})
+    return f"{settings.MEDIA_URL}{quote(name)}?{query}", expires
+
+
+def signed_seconds_left(request, name):
+    """Seconds until the request's signed URL for `name` expires; 0 if it has none or it's invalid."""
+    expires = request.query_params.get("expires", "")
+    signature = request.query_params.get("signature", "")
+    if not expires.isdigit() or not signature:
+        return 0
+    if not constant_time_compare(signature, _signer.signature(f"{name}:{expires}")):
+        return 0
+    return max(0, int(expires) - int(time.time()))
+
+
+def check_access(request, name):
+    """Raise unless the request may read the media file `name`; returns its Cache-Control."""
+    if name.startswith(PUBLIC_PREFIXES):
+        return f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable"
+    match = COURSE_ASSET.match(name)
+    if match is None:
+        raise Http404
+    left = signed_seconds_left(request, name)
+    if left:
+        return f"private, max-age={min(left, settings.MEDIA_PRIVATE_MAX_AGE)}"
+    # The same entitlement as CoursePlayerView: creator, superuser or enrolled.
+    access = CourseAccess.for_request(request)
+    course = access.course(match.group(1))
+    if course is None:
+        raise Http404
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    if not access.can_view_content(course):
+        raise PermissionDenied("You are not enrolled in course")
+    return f"private, max-age={settings.MEDIA_PRIVATE_MAX_AGE}"
+
+
+class MediaView(APIView):
+    """
+    Serves files under MEDIA_ROOT with Range, conditional GET and cache
+    headers, or hands them to the front proxy (MEDIA_ACCEL) once access is
+    checked. Public files and signed URLs need no credentials.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def perform_authentication(self, request):
+        # Authenticate only when check_access() asks for the user, so an
+        # expired token doesn't turn a public thumbnail into a 401.
+        pass
+
+    def get(self, request, name):
+        # Access is decided by the path, so it must be the canonical one.
+        if not is_canonical(name):
+            raise Http404
+        cache_control = check_access(request, name)
+        try:
+            path = default_storage.path(name)
+            stat = os.stat(path)
+        except (SuspiciousFileOperation, FileNotFoundError, NotADirectoryError):
+            raise Http404
+        if not os.path.isfile(path):
+            raise Http404
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = self.file_response(request, name, path, stat.st_size, content_type, etag, stat.st_mtime)
+        response["Cache-Control"] = cache_control
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    def file_response(self, request, name, path, size, content_type, etag, mtime):
+        if settings.MEDIA_ACCEL == "x-accel-redirect":
+            # nginx serves the file (and any Range) from an internal location.
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+            return response
+        if settings.MEDIA_ACCEL == "x-sendfile":
+            response = HttpResponse(content_type=content_type)
+            response["X-Sendfile"] = path
+            return response
+
+        byte_range = None
+        header = request.headers.get("Range")
+        if header and self.range_applies(request, etag, mtime):
+            byte_range = parse_range(header, size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        file = open(path, "rb")
+        if byte_range is None:
+            return FileResponse(file, content_type=content_type)
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeFile(file, end - start + 1), status=206, content_type=content_type)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return response
+
+    def range_applies(self, request, etag, mtime):
+        # If-Range: only send the range if the file is still the one the
+        # client has part of; otherwise the whole file.
+        validator = request.headers.get("If-Range")
+        if not validator:
+            return True
+        if validator.startswith('"'):
+            return validator == etag
+        return parse_http_date_safe(validator) == int(mtime)
+
+
+class CourseAssetURLView(APIView):
+    """A signed URL for a file under course_assets/<pk>/, for those who may watch the course."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        path = request.query_params.get("path", "")
+        name = f"course_assets/{pk}/{path}"
+        if not path or not is_canonical(name):
+            raise ValidationError({"path": ["Not a file of this course."]})
+        access = CourseAccess.for_request(request)
+        course = access.course(pk)
+        if course is None:
+            raise Http404
+        if not access.can_view_content(course):
+            raise PermissionDenied("You are not enrolled in course")
+        url, expires = sign_media_url(name)
+        return Response({"url": request.build_absolute_uri(url), "expires": expires})
@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+def assign_positions(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Chapter = apps.get_model('courses', 'Chapter')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+
+    for course in Course.objects.only('pk').iterator():
+        chapters = list(
+            Chapter.objects.filter(section__course=course)
+            .order_by('section__order', 'order', 'pk')
+            .only('pk')
+        )
+        for position, chapter in enumerate(chapters):
+            chapter.position = position
+        Chapter.objects.bulk_update(chapters, ['position'], batch_size=1000)
+        Course.objects.filter(pk=course.pk).update(chapter_count=len(chapters), chapter_slots=len(chapters))
+
+        # Enrollments already marked completed have finished every chapter.
+        if chapters:
+            bits = (1 << len(chapters)) - 1
+            Enrollment.objects.filter(course=course, status='completed').update(
+                progress=bits.to_bytes((len(chapters) + 7) // 8, 'little'),
+                completed_count=len(chapters),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='chapter_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='chapter_slots',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chapter',
+            name='position',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='progress',
+            field=models.BinaryField(default=b'', editable=False),
+        ),
+        migrations.RunPython(assign_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_chapter_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaybackPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seconds', models.FloatField()),
+                ('updated_at', models.DateTimeField()),
+                ('chapter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.chapter')),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='playback_positions', to='courses.enrollment')),
+            ],
+            options={
+                'unique_together': {('enrollment', 'chapter')},
+            },
+        ),
+    ]
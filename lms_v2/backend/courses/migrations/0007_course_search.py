@@ -0,0 +1,117 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    # External-content FTS5 index over the document table, synced by triggers.
+    """
+    CREATE VIRTUAL TABLE courses_coursesearchdocument_fts USING fts5(
+        title, body,
+        content='courses_coursesearchdocument', content_rowid='course_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER courses_coursesearchdocument_ai AFTER INSERT ON courses_coursesearchdocument BEGIN
+        INSERT INTO courses_coursesearchdocument_fts(rowid, title, body)
+        VALUES (new.course_id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_coursesearchdocument_ad AFTER DELETE ON courses_coursesearchdocument BEGIN
+        INSERT INTO courses_coursesearchdocument_fts(courses_coursesearchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.course_id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_coursesearchdocument_au AFTER UPDATE ON courses_coursesearchdocument BEGIN
+        INSERT INTO courses_coursesearchdocument_fts(courses_coursesearchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.course_id, old.title, old.body);
+        INSERT INTO courses_coursesearchdocument_fts(rowid, title, body)
+        VALUES (new.course_id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS courses_coursesearchdocument_au",
+    "DROP TRIGGER IF EXISTS courses_coursesearchdocument_ad",
+    "DROP TRIGGER IF EXISTS courses_coursesearchdocument_ai",
+    "DROP TABLE IF EXISTS courses_coursesearchdocument_fts",
+]
+
+MYSQL_FORWARD = [
+    "CREATE FULLTEXT INDEX course_search_title_ft ON courses_coursesearchdocument (title)",
+    "CREATE FULLTEXT INDEX course_search_text_ft ON courses_coursesearchdocument (title, body)",
+]
+
+MYSQL_REVERSE = [
+    "DROP INDEX course_search_text_ft ON courses_coursesearchdocument",
+    "DROP INDEX course_search_title_ft ON courses_coursesearchdocument",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor_statements = statements.get(schema_editor.connection.vendor, [])
+        for sql in vendor_statements:
+            schema_editor.execute(sql)
+    return run
+
+
+def build_documents(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Section = apps.get_model('courses', 'Section')
+    Chapter = apps.get_model('courses', 'Chapter')
+    CourseSearchDocument = apps.get_model('courses', 'CourseSearchDocument')
+
+    courses = Course.objects.order_by('pk').values_list('pk', 'title', 'description', 'requirements', 'is_published')
+    batch = []
+    for pk, title, description, requirements, is_published in courses.iterator(chunk_size=500):
+        batch.append((pk, title, [description, requirements], is_published))
+        if len(batch) == 500:
+            _write_documents(batch, Section, Chapter, CourseSearchDocument)
+            batch = []
+    if batch:
+        _write_documents(batch, Section, Chapter, CourseSearchDocument)
+
+
+def _write_documents(batch, Section, Chapter, CourseSearchDocument):
+    ids = [pk for pk, *_ in batch]
+    parts = {pk: texts for pk, _, texts, _ in batch}
+    for course_id, title in Section.objects.filter(course_id__in=ids).order_by('order').values_list('course_id', 'title'):
+        parts[course_id].append(title)
+    chapters = Chapter.objects.filter(section__course_id__in=ids).order_by('section__order', 'order')
+    for course_id, title in chapters.values_list('section__course_id', 'title'):
+        parts[course_id].append(title)
+    CourseSearchDocument.objects.bulk_create([
+        CourseSearchDocument(
+            course_id=pk, title=title, body='\n'.join(t for t in parts[pk] if t), is_published=is_published,
+        )
+        for pk, title, _, is_published in batch
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_playback_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSearchDocument',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='courses.course')),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('is_published', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'mysql': MYSQL_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'mysql': MYSQL_REVERSE}),
+        ),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
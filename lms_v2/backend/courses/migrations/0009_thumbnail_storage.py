@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:55
+
+import courses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_course_thumbnail_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=courses.storage.thumbnail_storage, upload_to='course_thumbnails/'),
+        ),
+    ]
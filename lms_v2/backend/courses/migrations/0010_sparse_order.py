@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:40
+
+from django.db import migrations
+from django.db.models import F, Max
+
+ORDER_GAP = 1024
+
+
+def spread_orders(apps, schema_editor):
+    # Dense orders 1, 2, 3 ... become ORDER_GAP, 2 * ORDER_GAP, ...
+    for model_name, parent in (('Section', 'course_id'), ('Chapter', 'section_id')):
+        model = apps.get_model('courses', model_name)
+        top = model.objects.aggregate(top=Max('order'))['top'] or 0
+        if top < ORDER_GAP:
+            # Every new key is above every old one, so no two rows collide
+            # on the way.
+            model.objects.update(order=F('order') * ORDER_GAP)
+            continue
+        for parent_id in model.objects.values_list(parent, flat=True).distinct().iterator():
+            siblings = model.objects.filter(**{parent: parent_id})
+            rows = list(siblings.order_by('order', 'pk').only('pk'))
+            siblings.update(order=F('order') + max(top, ORDER_GAP * len(rows)) + 1)
+            for i, row in enumerate(rows, start=1):
+                row.order = ORDER_GAP * i
+            model.objects.bulk_update(rows, ['order'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_thumbnail_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_orders, migrations.RunPython.noop),
+    ]
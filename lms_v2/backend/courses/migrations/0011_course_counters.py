@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+
+    def count(model_name, column):
+        rows = (
+            apps.get_model('courses', model_name).objects.filter(**{column: OuterRef('pk')})
+            .order_by().values(column).annotate(n=Count('pk')).values('n')
+        )
+        return Coalesce(Subquery(rows), 0)
+
+    Course.objects.update(
+        enrollment_count=count('Enrollment', 'course'),
+        section_count=count('Section', 'course'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_sparse_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='section_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CourseCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('enrollments', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'shard')},
+            },
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
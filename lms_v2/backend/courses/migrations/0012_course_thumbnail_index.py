@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:07
+
+import courses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_course_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='thumbnail',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=courses.storage.thumbnail_storage, upload_to='course_thumbnails/'),
+        ),
+    ]
@@ -1,10 +1,21 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
-from django.db.models import F, Max
+from django.db.models import F
+
+from .ordering import lock_parent, place
+from .storage import thumbnail_storage
 # Create your models here.
 
 User = settings.AUTH_USER_MODEL
 
+
+class CourseQuerySet(models.QuerySet):
+    def with_tree(self):
+        # Load creator, sections and chapters in a fixed number of queries
+        # (1 + sections + chapters) however many courses are returned.
+        return self.select_related("creator").prefetch_related("sections__chapters")
+
+
 class Course(models.Model):
     creator = models.ForeignKey(
         User,
@@ -13,39 +24,128 @@ class Course(models.Model):
     )
     title = models.CharField(max_length=255)
     description = models.TextField()
-    thumbnail = models.ImageField(upload_to="course_thumbnails/", blank=True, null=True)
+    # Stored by content hash: identical images share one file. Indexed
+    # because releasing a file looks up whether any course still uses it.
+    thumbnail = models.ImageField(
+        upload_to="course_thumbnails/", storage=thumbnail_storage, blank=True, null=True, db_index=True
+    )
+    # Resized copies of the thumbnail, rendered off the request path by
+    # courses.thumbnails; "source" is the thumbnail they were made from.
+    thumbnail_variants = models.JSONField(default=dict, blank=True, editable=False)
     requirements = models.TextField(blank=True)
     total_hours = models.FloatField(default=0.0)
+    # Live chapters, and chapter positions handed out so far. Positions are
+    # never reused, so progress bitmaps stay valid when chapters go away.
+    chapter_count = models.PositiveIntegerField(default=0)
+    chapter_slots = models.PositiveIntegerField(default=0)
+    # Kept by F() updates as rows come and go (see courses.counters);
+    # reconcile_course_counters repairs any drift.
+    enrollment_count = models.PositiveIntegerField(default=0)
+    section_count = models.PositiveIntegerField(default=0)
+    # Count enrollments on this many CourseCounterShard rows instead of this
+    # one, for courses many learners join at once. 0 = off.
+    enrollment_shards = models.PositiveSmallIntegerField(default=0)
     is_published = models.BooleanField(default=False) 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CourseQuerySet.as_manager()
+
     class Meta:
         permissions = [
             ("create_course", "Can create course"),
             ("edit_own_course", "Can edit own course"),
         ]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="course_created_idx"),
+            models.Index(fields=["is_published", "-created_at", "-id"], name="course_published_idx"),
+            models.Index(fields=["creator", "-created_at", "-id"], name="course_creator_idx"),
+            models.Index(fields=["total_hours"], name="course_hours_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save handler release a replaced thumbnail.
+        instance._stored_thumbnail = instance.__dict__.get("thumbnail")
+        instance._stored_shards = instance.__dict__.get("enrollment_shards")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The counters and total_hours move by F() updates from other
+        # requests; saving a copy read earlier must not write them back.
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return str(self.title)
 
 
+COUNTER_FIELDS = ("chapter_count", "chapter_slots", "enrollment_count", "section_count", "total_hours")
+
+
 
 class Section(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="sections")
     title = models.CharField(max_length=255)
+    # Sparse sort key, see courses.ordering. Left empty, the section goes last.
     order = models.PositiveIntegerField()
 
     class Meta:
         ordering = ["order"]
         unique_together = ("course", "order")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored = tuple(instance.__dict__.get(f) for f in ("course_id", "order"))
+        return instance
+
     def save(self, *args, **kwargs):
-        if not self.pk:
-            Section.objects.filter(
-                course = self.course,
-                order__gte = self.order
-            ).update(order = F('order') + 1)
-        super().save(*args, **kwargs)
+        stored = None if self._state.adding else getattr(self, "_stored", None)
+        old_course_id = stored[0] if stored else None
+        if stored is None and not self._state.adding:
+            old_course_id = Section.objects.filter(pk=self.pk).values_list("course_id", flat=True).first()
+        with transaction.atomic():
+            if stored != (self.course_id, self.order):
+                lock_parent(Course, self.course_id)
+                siblings = Section.objects.filter(course_id=self.course_id)
+                if not self._state.adding:
+                    siblings = siblings.exclude(pk=self.pk)
+                same_course = stored is not None and stored[0] == self.course_id
+                self.order = place(siblings, self.order or None, pk=self.pk if same_course else None)
+            # Read by the post_save handler to refresh the old course too.
+            self._moved_from = old_course_id if old_course_id not in (None, self.course_id) else None
+            super().save(*args, **kwargs)
+            if old_course_id != self.course_id:
+                add_course_sections(self.course_id, 1)
+                if old_course_id is not None:
+                    add_course_sections(old_course_id, -1)
+                    self.move_chapters(old_course_id)
+        self._stored = (self.course_id, self.order)
+
+    def move_chapters(self, old_course_id):
+        """
+        The section changed course: its chapters leave the old course's
+        progress bitmaps, chapter count and hours, and take fresh positions
+        in the new course.
+        """
+        from .progress import release_positions  # progress imports this module
+
+        chapters = list(self.chapters.only("position", "video_duration"))
+        if not chapters:
+            return
+        hours = sum(chapter.video_duration for chapter in chapters)
+        release_positions(old_course_id, [chapter.position for chapter in chapters])
+        Course.objects.filter(pk=old_course_id).update(total_hours=F("total_hours") - hours)
+        first = claim_chapter_positions(self.course_id, len(chapters))
+        for position, chapter in enumerate(chapters, start=first):
+            chapter.position = position
+        Chapter.objects.bulk_update(chapters, ["position"], batch_size=1000)
+        Course.objects.filter(pk=self.course_id).update(total_hours=F("total_hours") + hours)
 
 
 class Chapter(models.Model):
@@ -53,34 +153,87 @@ class Chapter(models.Model):
     title = models.CharField(max_length=255)
     video_url = models.URLField()
     video_duration = models.FloatField()  
+    # Sparse sort key, see courses.ordering. Left empty, the chapter goes last.
     order = models.PositiveIntegerField()
+    # Stable slot of the chapter within its course; indexes progress bitmaps.
+    position = models.PositiveIntegerField(editable=False)
 
     class Meta:
         ordering = ["order"]
         unique_together = ("section", "order")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored = tuple(
+            instance.__dict__.get(f) for f in ("section_id", "video_duration", "position", "order")
+        )
+        return instance
+
     def save(self, *args, **kwargs):
-        # Only auto-set order if not provided
-        if not self.pk and not self.order:
-            max_order = Chapter.objects.filter(section=self.section).aggregate(
-                Max('order')
-            )['order__max']
-            self.order = (max_order or 0) + 1
+        adding = self._state.adding
+        stored = None if adding else getattr(self, "_stored", None)
+        if not adding and (stored is None or None in stored):
+            stored = Chapter.objects.filter(pk=self.pk).values_list(
+                "section_id", "video_duration", "position", "order"
+            ).first()
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if stored is None or (stored[0], stored[3]) != (self.section_id, self.order):
+                # Locking the section also keeps concurrent appends from
+                # picking the same key.
+                lock_parent(Section, self.section_id)
+                siblings = Chapter.objects.filter(section_id=self.section_id)
+                if not adding:
+                    siblings = siblings.exclude(pk=self.pk)
+                same_section = stored is not None and stored[0] == self.section_id
+                self.order = place(siblings, self.order or None, pk=self.pk if same_section else None)
 
-        # Update course total hours
-        course = self.section.course
-        total = Chapter.objects.filter(
-            section__course=course
-        ).aggregate(models.Sum("video_duration"))["video_duration__sum"] or 0
+            old_course_id = None
+            if not adding and stored and stored[0] != self.section_id:
+                old_course_id = Section.objects.filter(pk=stored[0]).values_list("course_id", flat=True).first()
+            if adding or old_course_id not in (None, self.section.course_id):
+                self.position = claim_chapter_positions(self.section)
 
-        course.total_hours = total
-        course.save()
+            super().save(*args, **kwargs)
+
+            if old_course_id not in (None, self.section.course_id):
+                # Moved to another course: its old slot there is released.
+                from .progress import release_positions
+                release_positions(old_course_id, [stored[2]])
+
+            # Update course total hours by the change in duration instead of
+            # re-aggregating every chapter of the course.
+            old_section_id, old_duration = stored[:2] if stored else (None, 0)
+            if old_section_id == self.section_id:
+                add_course_hours(self.section, self.video_duration - old_duration)
+            else:
+                if old_section_id is not None:
+                    add_course_hours(old_section_id, -old_duration)
+                add_course_hours(self.section, self.video_duration)
+
+        self._stored = (self.section_id, self.video_duration, self.position, self.order)
 
     def __str__(self):
         return self.title
 
+
+def add_course_hours(section, hours):
+    """Shift total_hours of the course owning `section` (instance or id) by `hours`."""
+    if not hours:
+        return
+    if isinstance(section, Section):
+        Course.objects.filter(pk=section.course_id).update(total_hours=F("total_hours") + hours)
+        if Section.course.is_cached(section):
+            section.course.total_hours += hours
+    else:
+        Course.objects.filter(sections=section).update(total_hours=F("total_hours") + hours)
+
+
+def add_course_sections(course_id, count):
+    Course.objects.filter(pk=course_id).update(section_count=F("section_count") + count)
+
+
 class Enrollment(models.Model):
     STATUS_CHOICES = [
         ("active", "Active"),
@@ -90,6 +243,9 @@ class Enrollment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="enrollments")
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="enrollments")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    # Bit N set = chapter at position N completed; see courses.progress.
+    progress = models.BinaryField(default=b"", editable=False)
+    completed_count = models.PositiveIntegerField(default=0)
     enrolled_on = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -97,3 +253,61 @@ class Enrollment(models.Model):
 
     def __str__(self):
         return f"{self.user} → {self.course}"
+
+
+class PlaybackPosition(models.Model):
+    """Last watch position in a chapter, written in batches by courses.heartbeats."""
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name="playback_positions")
+    chapter = models.ForeignKey(Chapter, on_delete=models.CASCADE, related_name="+")
+    seconds = models.FloatField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("enrollment", "chapter")
+
+    def __str__(self):
+        return f"{self.enrollment} @ {self.chapter_id}: {self.seconds}s"
+
+
+
+class CourseCounterShard(models.Model):
+    """Enrollments of a sharded course not yet folded into its count, see courses.counters."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    shard = models.PositiveSmallIntegerField()
+    # Can go negative: a learner may leave through another shard than they joined.
+    enrollments = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("course", "shard")
+
+    def __str__(self):
+        return f"{self.course_id}/{self.shard}: {self.enrollments:+d}"
+
+
+class CourseSearchDocument(models.Model):
+    """Flattened searchable text of a course, kept in sync by courses.search."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    title = models.CharField(max_length=255)
+    # Description, requirements, section and chapter titles.
+    body = models.TextField()
+    is_published = models.BooleanField(default=False)
+
+    def __str__(self):
+        return self.title
+
+
+def claim_chapter_positions(section, count=1):
+    """
+    Reserve `count` new chapter positions in the course owning `section`
+    (instance or id) and count them as live chapters. Returns the first
+    position. Must run inside a transaction.
+    """
+    course_id = section.course_id if isinstance(section, Section) else section
+    first = Course.objects.select_for_update().filter(pk=course_id).values_list("chapter_slots", flat=True).get()
+    Course.objects.filter(pk=course_id).update(
+        chapter_slots=F("chapter_slots") + count, chapter_count=F("chapter_count") + count
+    )
+    if isinstance(section, Section) and Section.course.is_cached(section):
+        section.course.chapter_slots = first + count
+        section.course.chapter_count += count
+    return first
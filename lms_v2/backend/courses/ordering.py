@@ -0,0 +1,124 @@
+import bisect
+
+from django.db import transaction
+from django.db.models import F, Max
+
+# Sections and chapters are sorted by sparse `order` keys this far apart, so
+# an item can be put between two others by giving it a key in the gap:
+# one row written, however long the list.
+ORDER_GAP = 1024
+
+
+def place(siblings, order=None, pk=None):
+    """
+    The key for an item joining `siblings` (a queryset of the other items of
+    its course or section, locked by the caller). No `order` appends; a
+    free key is used as is; a taken one puts the item just before the item
+    holding it. When the gap there is used up the siblings are rebalanced
+    - the only time other rows are written. `pk` is the item's own key when
+    it already belongs to the same parent, so it takes part in that.
+    """
+    if order is None:
+        last = siblings.aggregate(last=Max("order"))["last"]
+        return (last or 0) + ORDER_GAP
+    if not siblings.filter(order=order).exists():
+        return order
+    before = siblings.filter(order__lt=order).aggregate(before=Max("order"))["before"] or 0
+    if order - before > 1:
+        return (before + order) // 2
+    # No key left between the two: spread the keys out again and put the
+    # item halfway between the same neighbours.
+    holder = siblings.filter(order=order).values_list("pk", flat=True).get()
+    ids = list(siblings.order_by("order", "pk").values_list("pk", flat=True))
+    if pk is None:
+        return rebalance(siblings, ids)[holder] - ORDER_GAP // 2
+    ids.insert(ids.index(holder), pk)
+    return rebalance(siblings.model.objects.filter(pk__in=ids), ids)[pk]
+
+
+def rebalance(siblings, ids=None):
+    """
+    Rewrite the keys of `siblings` to ORDER_GAP, 2 * ORDER_GAP, ... in their
+    current order, or in the order of `ids` (every sibling's primary key).
+    Returns {pk: key}.
+    """
+    if ids is None:
+        ids = list(siblings.order_by("order", "pk").values_list("pk", flat=True))
+    keys = {pk: ORDER_GAP * i for i, pk in enumerate(ids, start=1)}
+    if not keys:
+        return keys
+    with transaction.atomic():
+        # Unique (parent, order) is checked row by row, so every key first
+        # moves above both the old and the new range, then to its place.
+        top = max(siblings.aggregate(top=Max("order"))["top"] or 0, ORDER_GAP * len(keys))
+        siblings.update(order=F("order") + top + 1)
+        model = siblings.model
+        rows = [model(pk=pk, order=key) for pk, key in keys.items()]
+        model.objects.bulk_update(rows, ["order"], batch_size=500)
+    return keys
+
+
+def reorder(siblings, ids):
+    """
+    Put `siblings` in the order of `ids`, which must list each of them once.
+    The longest run of items already in that order keeps its keys; the rest
+    get keys in the gaps between them, so moving one item writes one row.
+    Rebalances if a gap is too small. Returns {pk: key}, or None when `ids`
+    doesn't match the siblings. Lock the parent first.
+    """
+    current = dict(siblings.values_list("pk", "order"))
+    if len(ids) != len(current) or set(ids) != set(current):
+        return None
+    kept = _increasing(ids, current)
+    keys, pending, low = {}, [], 0
+    for pk in ids + [None]:
+        if pk is not None and pk not in kept:
+            pending.append(pk)
+            continue
+        high = None if pk is None else current[pk]
+        if pending:
+            count = len(pending)
+            if high is None:
+                new = [low + ORDER_GAP * k for k in range(1, count + 1)]
+            elif high - low > count:
+                new = [low + (high - low) * k // (count + 1) for k in range(1, count + 1)]
+            else:
+                return rebalance(siblings, ids)
+            keys.update(zip(pending, new))
+            pending = []
+        if pk is not None:
+            keys[pk] = low = current[pk]
+
+    moved = {pk: key for pk, key in keys.items() if key != current[pk]}
+    if moved:
+        # As in rebalance(): out of the way first, then into place.
+        top = max(max(current.values()), max(moved.values()))
+        with transaction.atomic():
+            siblings.filter(pk__in=moved).update(order=F("order") + top + 1)
+            model = siblings.model
+            model.objects.bulk_update([model(pk=pk, order=key) for pk, key in moved.items()], ["order"], batch_size=500)
+    return keys
+
+
+def _increasing(ids, current):
+    """The pks of a longest run of `ids` whose current keys already increase."""
+    tails, tail_ids, previous = [], [], {}
+    for pk in ids:
+        key = current[pk]
+        i = bisect.bisect_left(tails, key)
+        previous[pk] = tail_ids[i - 1] if i else None
+        if i == len(tails):
+            tails.append(key)
+            tail_ids.append(pk)
+        else:
+            tails[i], tail_ids[i] = key, pk
+    kept, pk = set(), tail_ids[-1] if tail_ids else None
+    while pk is not None:
+        kept.add(pk)
+        pk = previous[pk]
+    return kept
+
+
+def lock_parent(model, pk):
+    """Serialize changes to the order of one course's sections or one section's chapters."""
+    model.objects.select_for_update().filter(pk=pk).values_list("pk", flat=True).first()
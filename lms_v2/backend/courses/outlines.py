@@ -0,0 +1,151 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .access import CourseAccess
+from .models import Course
+from .serializers import CourseSerializer
+from .thumbnails import absolute_thumbnail_set
+
+# Bump when the serialized outline shape changes so old entries are ignored.
+OUTLINE_SCHEMA = 4
+
+
+def outline_cache():
+    return caches[settings.COURSE_OUTLINE_CACHE]
+
+
+def _version_key(course_id):
+    return f"course-outline-version:{course_id}"
+
+
+CATALOG_VERSION_KEY = "course-catalog-version"
+
+
+def _access_version_key(user_id):
+    return f"course-access-version:{user_id}"
+
+
+def _current_version(key):
+    cache = outline_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def _acurrent_version(key):
+    cache = outline_cache()
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(*keys):
+    # Bumped right away and again after commit, so a reader that cached the
+    # pre-commit state in between is invalidated too.
+    def bump():
+        outline_cache().set_many(dict.fromkeys(keys, time.time_ns()), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_version(course_id):
+    """Current content version of a course (a nanosecond timestamp)."""
+    return _current_version(_version_key(course_id))
+
+
+def catalog_version():
+    """Changes whenever any course's content changes."""
+    return _current_version(CATALOG_VERSION_KEY)
+
+
+def access_version(user_id):
+    """Changes whenever the user's enrollments change."""
+    return _current_version(_access_version_key(user_id))
+
+
+async def aget_version(course_id):
+    return await _acurrent_version(_version_key(course_id))
+
+
+async def acatalog_version():
+    return await _acurrent_version(CATALOG_VERSION_KEY)
+
+
+async def aaccess_version(user_id):
+    return await _acurrent_version(_access_version_key(user_id))
+
+
+def bump_version(*course_ids):
+    """Invalidate the cached outlines of courses and the catalog version."""
+    _bump(*(_version_key(course_id) for course_id in course_ids), CATALOG_VERSION_KEY)
+
+
+def bump_access_version(*user_ids):
+    _bump(*(_access_version_key(user_id) for user_id in user_ids))
+
+
+def get_outline(course_id):
+    """
+    Return the cached public outline of a course as
+    ``{"creator_id": ..., "data": ...}``, or None if the course does not exist.
+    ``data`` is the full CourseSerializer output including every video_url;
+    use render_outline() to apply per-user redaction.
+    """
+    cache = outline_cache()
+    key = f"course-outline:{OUTLINE_SCHEMA}:{course_id}:{get_version(course_id)}"
+    outline = cache.get(key)
+    if outline is None:
+        course = Course.objects.with_tree().filter(pk=course_id).first()
+        if course is None:
+            return None
+        outline = {"creator_id": course.creator_id, "data": CourseSerializer(course).data}
+        cache.set(key, outline, timeout=settings.COURSE_OUTLINE_TIMEOUT)
+    return outline
+
+
+async def aget_outline(course_id):
+    """get_outline() for async views."""
+    cache = outline_cache()
+    key = f"course-outline:{OUTLINE_SCHEMA}:{course_id}:{await aget_version(course_id)}"
+    outline = await cache.aget(key)
+    if outline is None:
+        course = await Course.objects.with_tree().filter(pk=course_id).afirst()
+        if course is None:
+            return None
+        outline = {"creator_id": course.creator_id, "data": CourseSerializer(course).data}
+        await cache.aset(key, outline, timeout=settings.COURSE_OUTLINE_TIMEOUT)
+    return outline
+
+
+def render_outline(outline, request):
+    """
+    Apply the per-request overlay (redaction, absolute URLs) to a cached
+    outline. Async views load the request's enrollments first (see
+    CourseAccess.aload).
+    """
+    data = dict(outline["data"])
+    if data.get("thumbnail"):
+        data["thumbnail"] = request.build_absolute_uri(data["thumbnail"])
+    data["thumbnail_variants"] = absolute_thumbnail_set(data["thumbnail_variants"], request.build_absolute_uri)
+
+    access = CourseAccess.for_request(request)
+    if not access.can_view(data["id"], outline["creator_id"]):
+        data["sections"] = [
+            {
+                **section,
+                "chapters": [
+                    {k: v for k, v in chapter.items() if k != "video_url"}
+                    for chapter in section["chapters"]
+                ],
+            }
+            for section in data["sections"]
+        ]
+    return data
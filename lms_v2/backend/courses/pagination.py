@@ -0,0 +1,64 @@
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CatalogCursorPagination(CursorPagination):
+    # Keyset pagination: each page is an index range scan on
+    # (created_at, id), so deep pages cost the same as the first one.
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        paginate_queryset() for async views. DRF's own cursor logic runs in
+        a worker thread, so nothing here depends on its internals.
+        """
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+
+class SearchPagination(BasePagination):
+    """
+    Page-number pagination for ranked search results. Counting every match
+    is as expensive as the search itself, so one extra result is fetched
+    to tell whether there is a next page instead, and pages past
+    `max_page` are refused to keep offsets cheap.
+    """
+    page_size = 20
+    max_page_size = 100
+    max_page = 50
+
+    def paginate_search(self, search, request):
+        """`search(limit, offset)` returns ranked IDs; returns this page's."""
+        self.request = request
+        self.page = self._int("page", 1, self.max_page)
+        self.size = self._int("page_size", self.page_size, self.max_page_size)
+        ids = search(self.size + 1, (self.page - 1) * self.size)
+        self.has_next = len(ids) > self.size
+        return ids[:self.size]
+
+    def get_paginated_response(self, data):
+        url = self.request.build_absolute_uri()
+        next_url = replace_query_param(url, "page", self.page + 1) if self.has_next else None
+        previous_url = None
+        if self.page > 2:
+            previous_url = replace_query_param(url, "page", self.page - 1)
+        elif self.page == 2:
+            previous_url = remove_query_param(url, "page")
+        return Response({"next": next_url, "previous": previous_url, "results": data})
+
+    def _int(self, name, default, maximum):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({name: "Must be a number."})
+        if not 1 <= value <= maximum:
+            raise ValidationError({name: f"Must be between 1 and {maximum}."})
+        return value
@@ -0,0 +1,160 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Chapter, Course, Enrollment
+
+logger = logging.getLogger("courses.progress")
+
+
+# An enrollment's progress is a little-endian bitmap: bit N of the integer
+# stored in Enrollment.progress is set once the chapter at position N is
+# completed. A course with 300 chapters needs at most 38 bytes per
+# enrollment, and completed_count caches the number of set bits so the
+# percentage needs no join or decoding.
+
+def decode(bitmap):
+    return int.from_bytes(bytes(bitmap or b""), "little")
+
+
+def encode(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def completed_positions(bitmap):
+    bits = decode(bitmap)
+    return [n for n in range(bits.bit_length()) if bits >> n & 1]
+
+
+def percent_complete(completed_count, chapter_count):
+    if not chapter_count:
+        return 0
+    return min(100, round(100 * completed_count / chapter_count))
+
+
+def status_for(completed_count, chapter_count):
+    return "completed" if chapter_count and completed_count >= chapter_count else "active"
+
+
+def _apply(enrollment, bits, chapter_count):
+    enrollment.progress = encode(bits)
+    enrollment.completed_count = bits.bit_count()
+    enrollment.status = status_for(enrollment.completed_count, chapter_count)
+
+
+def record_progress(user, course, position, done=True):
+    """
+    Mark the chapter at `position` of `course` completed (or not) for
+    `user`. The enrollment row is locked while its bitmap is rewritten, so
+    concurrent updates from several tabs don't lose bits. Returns the
+    enrollment, or None when the user isn't enrolled.
+    """
+    with transaction.atomic():
+        enrollment = Enrollment.objects.select_for_update().filter(user=user, course=course).first()
+        if enrollment is None:
+            return None
+        bits = decode(enrollment.progress)
+        updated = bits | 1 << position if done else bits & ~(1 << position)
+        if updated != bits:
+            _apply(enrollment, updated, course.chapter_count)
+            enrollment.save(update_fields=["progress", "completed_count", "status"])
+    return enrollment
+
+
+def release_positions(course_id, positions):
+    """
+    Chapters at `positions` left the course: uncount them now, and clear
+    their bits from the enrollments once the transaction commits, in the
+    background (see clear_released_positions), so a content edit doesn't
+    rewrite every learner's row while it holds its locks. Until then a
+    learner's completed_count may still include them.
+    """
+    if not positions:
+        return
+    Course.objects.filter(pk=course_id).update(chapter_count=F("chapter_count") - len(positions))
+    transaction.on_commit(lambda: _submit(course_id))
+
+
+def clear_released_positions(course_id, batch_size=1000):
+    """
+    Clear the bits of positions no chapter of the course holds any more
+    from its enrollments, one short transaction per batch. Learners who had
+    finished everything else become completed. Safe to run again, e.g.
+    from `reconcile_course_counters --progress` after a worker died.
+    Returns the number of enrollments rewritten.
+    """
+    from .outlines import bump_access_version  # outlines imports the serializers, which import us
+
+    # Slots first: a chapter committed in between then reads as live.
+    slots = Course.objects.filter(pk=course_id).values_list("chapter_slots", flat=True).first()
+    if slots is None:
+        return 0
+    live = set(Chapter.objects.filter(section__course_id=course_id).values_list("position", flat=True))
+    mask = sum(1 << position for position in range(slots) if position not in live)
+    if not mask:
+        return 0
+
+    rewritten = 0
+    enrollments = Enrollment.objects.filter(course_id=course_id, completed_count__gt=0)
+    pks = list(enrollments.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(pks), batch_size):
+        with transaction.atomic():
+            chapter_count = Course.objects.values_list("chapter_count", flat=True).get(pk=course_id)
+            changed = []
+            # Locked so progress recorded meanwhile isn't overwritten.
+            batch = (
+                Enrollment.objects.select_for_update().filter(pk__in=pks[start:start + batch_size])
+                .only("user_id", "progress", "completed_count", "status")
+            )
+            for enrollment in batch:
+                bits = decode(enrollment.progress)
+                if bits & mask:
+                    _apply(enrollment, bits & ~mask, chapter_count)
+                    changed.append(enrollment)
+            if changed:
+                Enrollment.objects.bulk_update(changed, ["progress", "completed_count", "status"])
+                bump_access_version(*(enrollment.user_id for enrollment in changed))
+                rewritten += len(changed)
+
+    with transaction.atomic():
+        chapter_count = Course.objects.values_list("chapter_count", flat=True).get(pk=course_id)
+        if chapter_count:
+            finished = Enrollment.objects.filter(
+                course_id=course_id, status="active", completed_count__gte=chapter_count
+            )
+            user_ids = list(finished.values_list("user_id", flat=True))
+            if user_ids:
+                finished.update(status="completed")
+                bump_access_version(*user_ids)
+    return rewritten
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _submit(course_id):
+    global _executor
+    if not settings.PROGRESS_WORKERS:
+        _run(course_id)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.PROGRESS_WORKERS, thread_name_prefix="progress")
+    _executor.submit(_run, course_id)
+
+
+def _run(course_id):
+    try:
+        clear_released_positions(course_id)
+    except Course.DoesNotExist:
+        pass  # Deleted meanwhile, with its enrollments.
+    except Exception:
+        logger.exception("Clearing released progress positions of course %s failed", course_id)
+    finally:
+        if settings.PROGRESS_WORKERS:
+            connection.close()
@@ -0,0 +1,157 @@
+import re
+import threading
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Prefetch, Q
+
+from .models import Course, CourseSearchDocument, Section, Chapter
+
+# Longer queries are cut to this many terms.
+MAX_TERMS = 8
+# Title matches count this much more than matches in the rest of the course.
+TITLE_WEIGHT = 5.0
+
+FTS_TABLE = "courses_coursesearchdocument_fts"
+
+
+def build_document(course):
+    """The search document of a course with its sections and chapters loaded."""
+    parts = [course.description, course.requirements]
+    for section in course.sections.all():
+        parts.append(section.title)
+        parts.extend(chapter.title for chapter in section.chapters.all())
+    return CourseSearchDocument(
+        course_id=course.pk,
+        title=course.title,
+        body="\n".join(part for part in parts if part),
+        is_published=course.is_published,
+    )
+
+
+def index_courses(course_ids):
+    """(Re)build the search documents of these courses; deleted ones are dropped."""
+    course_ids = set(course_ids)
+    courses = list(
+        Course.objects.filter(pk__in=course_ids).only(
+            "title", "description", "requirements", "is_published"
+        ).prefetch_related(
+            Prefetch("sections", queryset=Section.objects.only("course_id", "title", "order")),
+            Prefetch("sections__chapters", queryset=Chapter.objects.only("section_id", "title", "order")),
+        )
+    )
+    missing = course_ids - {course.pk for course in courses}
+    if missing:
+        CourseSearchDocument.objects.filter(pk__in=missing).delete()
+    if courses:
+        unique_fields = ["course"] if connection.features.supports_update_conflicts_with_target else None
+        CourseSearchDocument.objects.bulk_create(
+            [build_document(course) for course in courses],
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=["title", "body", "is_published"],
+        )
+
+
+_pending = threading.local()
+
+
+def schedule_reindex(course_id):
+    """
+    Reindex a course once the current transaction commits. Several changes
+    to the same course in one transaction are indexed once.
+    """
+    ids = getattr(_pending, "ids", None)
+    if ids is None:
+        ids = _pending.ids = set()
+    ids.add(course_id)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    ids = getattr(_pending, "ids", None)
+    if ids:
+        _pending.ids = set()
+        index_courses(ids)
+
+
+def terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def search_course_ids(query, limit, offset=0, published_only=False):
+    """
+    IDs of the courses matching `query`, best match first. Uses FTS5 on
+    SQLite and FULLTEXT indexes on MySQL; other databases fall back to a
+    substring scan ordered by recency.
+    """
+    words = terms(query)
+    if not words:
+        return []
+    if connection.vendor == "sqlite":
+        return _search_sqlite(words, limit, offset, published_only)
+    if connection.vendor == "mysql":
+        return _search_mysql(" ".join(words), limit, offset, published_only)
+    return _search_fallback(words, limit, offset, published_only)
+
+
+def _search_sqlite(words, limit, offset, published_only):
+    # Every term must match, the last one as a prefix so results appear
+    # while typing. If that finds nothing, any term may match.
+    quoted = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    every = " ".join(quoted)
+    ids = _match_sqlite(every, limit, offset, published_only)
+    if not ids and len(words) > 1 and (not offset or not _match_sqlite(every, 1, 0, published_only)):
+        ids = _match_sqlite(" OR ".join(quoted), limit, offset, published_only)
+    return ids
+
+
+def _match_sqlite(match, limit, offset, published_only):
+    published = "AND d.is_published" if published_only else ""
+    sql = f"""
+        SELECT f.rowid FROM {FTS_TABLE} f
+        JOIN courses_coursesearchdocument d ON d.course_id = f.rowid
+        WHERE {FTS_TABLE} MATCH %s {published}
+        ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0), f.rowid DESC
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_mysql(text, limit, offset, published_only):
+    published = "AND is_published" if published_only else ""
+    sql = f"""
+        SELECT course_id FROM courses_coursesearchdocument
+        WHERE MATCH(title, body) AGAINST (%s IN NATURAL LANGUAGE MODE) {published}
+        ORDER BY MATCH(title) AGAINST (%s IN NATURAL LANGUAGE MODE) * {TITLE_WEIGHT}
+               + MATCH(title, body) AGAINST (%s IN NATURAL LANGUAGE MODE) DESC,
+                 course_id DESC
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [text, text, text, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(words, limit, offset, published_only):
+    matches = reduce(or_, (Q(title__icontains=w) | Q(body__icontains=w) for w in words))
+    documents = CourseSearchDocument.objects.filter(matches)
+    if published_only:
+        documents = documents.filter(is_published=True)
+    return list(documents.order_by("-course_id").values_list("course_id", flat=True)[offset:offset + limit])
+
+
+def rebuild_index(batch_size=500):
+    """Reindex every course and drop documents of deleted ones. Returns the count."""
+    ids = list(Course.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), batch_size):
+        index_courses(ids[start:start + batch_size])
+    CourseSearchDocument.objects.exclude(course_id__in=Course.objects.values("pk")).delete()
+    if connection.vendor == "sqlite":
+        # Regenerate the FTS5 index from the document table in case they drifted.
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return len(ids)
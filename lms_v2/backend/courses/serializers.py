@@ -1,43 +1,66 @@
 from rest_framework import serializers
+from monitoring.serializers import InstrumentedSerializerMixin
 from .models import Course, Section, Chapter, Enrollment
-from .permissions import CanViewCourseContent
+from .access import CourseAccess
+from .progress import completed_positions, percent_complete
+from .thumbnails import thumbnail_set
 
 
-class ChapterSerializer(serializers.ModelSerializer):
+def get_course_access(context):
+    # Nested serializers share the root's context, so the resolver is
+    # created once and reused for every section and chapter in the tree.
+    access = context.get("course_access")
+    if access is None and context.get("request"):
+        access = context["course_access"] = CourseAccess.for_request(context["request"])
+    return access
+
+
+class ThumbnailVariantsField(serializers.Field):
+    """Read-only card image and srcsets built from Course.thumbnail_variants."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        return thumbnail_set(value, request.build_absolute_uri if request else None)
+
+
+class ChapterSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Chapter
-        fields = ["id", "section", "title", "video_url", "video_duration", "order"]
+        fields = ["id", "section", "title", "video_url", "video_duration", "order", "position"]
+        # A taken order puts the chapter before the one holding it (see
+        # courses.ordering) rather than failing the unique check; none, last.
+        extra_kwargs = {"order": {"required": False}}
+        validators = []
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        request = self.context.get("request")
-
-        if request:
-            user = request.user
-            course = instance.section.course
+        access = get_course_access(self.context)
 
-            if not (
-                user.is_authenticated and (
-                    course.creator == user or user.is_superuser or Enrollment.objects.filter(user=user, course=course).exists()
-                )
-            ):
-                data.pop("video_url", None)
+        if access and not access.can_view_content(instance.section.course):
+            data.pop("video_url", None)
         return data
 
 
 
 
-class SectionSerializer(serializers.ModelSerializer):
+class SectionSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     chapters = ChapterSerializer(many=True, read_only=True)
 
     class Meta:
         model = Section
         fields = ["id", "course", "title", "order", "chapters"]
+        extra_kwargs = {"order": {"required": False}}
+        validators = []
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     sections = SectionSerializer(many=True, read_only=True)
     creator = serializers.StringRelatedField(read_only=True)
+    thumbnail_variants = ThumbnailVariantsField()
 
     class Meta:
         model = Course
@@ -47,25 +70,79 @@ class CourseSerializer(serializers.ModelSerializer):
             "title",
             "description",
             "thumbnail",
+            "thumbnail_variants",
             "requirements",
             "total_hours",
+            "enrollment_count",
+            "section_count",
+            "chapter_count",
             "sections",
             "created_at",
         ]
-        read_only_fields = ["creator", "total_hours", "created_at"]
+        read_only_fields = ["creator", "total_hours", "enrollment_count", "section_count", "chapter_count", "created_at"]
+
+
+class CourseSummarySerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    creator = serializers.StringRelatedField(read_only=True)
+    thumbnail_variants = ThumbnailVariantsField()
+
+    class Meta:
+        model = Course
+        fields = [
+            "id",
+            "creator",
+            "title",
+            "thumbnail",
+            "thumbnail_variants",
+            "total_hours",
+            "enrollment_count",
+            "section_count",
+            "chapter_count",
+            "is_published",
+            "created_at",
+        ]
+
 
+class OutlineChapterSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    video_url = serializers.URLField()
+    video_duration = serializers.FloatField(min_value=0)
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+
+class OutlineSectionSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    chapters = OutlineChapterSerializer(many=True)
+
+
+class CourseOutlineSerializer(serializers.Serializer):
+    sections = OutlineSectionSerializer(many=True)
+    replace = serializers.BooleanField(default=False)
+
+
+class CohortEnrollmentSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False, default=list)
+
+    def validate(self, attrs):
+        if not attrs["users"] and not attrs["emails"]:
+            raise serializers.ValidationError("Provide users or emails to enroll.")
+        return attrs
+
+
+class EnrollmentSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = ["id", "user", "course", "status", "enrolled_on"]
         read_only_fields = ["user", "status", "enrolled_on"]
 
-class MyEnrollmentSerializer(serializers.ModelSerializer):
+class MyEnrollmentSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(source="course.id")
     title = serializers.CharField(source="course.title")
     thumbnail = serializers.ImageField(source="course.thumbnail", read_only=True)
+    thumbnail_variants = ThumbnailVariantsField(source="course.thumbnail_variants")
     total_hours = serializers.FloatField(source="course.total_hours")
+    chapter_count = serializers.IntegerField(source="course.chapter_count")
+    percent_complete = serializers.SerializerMethodField()
 
     class Meta:
         model = Enrollment
@@ -73,7 +150,54 @@ class MyEnrollmentSerializer(serializers.ModelSerializer):
             "id",
             "title",
             "thumbnail",
+            "thumbnail_variants",
             "total_hours",
             "status",
             "enrolled_on",
+            "completed_count",
+            "chapter_count",
+            "percent_complete",
         ]
+
+    def get_percent_complete(self, obj):
+        return percent_complete(obj.completed_count, obj.course.chapter_count)
+
+
+class ReorderSerializer(serializers.Serializer):
+    # Every section of the course (or chapter of the section), in the new order.
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_ids(self, ids):
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Each item may appear only once.")
+        return ids
+
+
+class HeartbeatSerializer(serializers.Serializer):
+    chapter = serializers.IntegerField()
+    seconds = serializers.FloatField(min_value=0)
+
+
+class ProgressSerializer(serializers.ModelSerializer):
+    course = serializers.IntegerField(source="course_id")
+    completed = serializers.SerializerMethodField()
+    chapter_count = serializers.IntegerField(source="course.chapter_count")
+    percent_complete = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Enrollment
+        fields = ["course", "status", "completed", "completed_count", "chapter_count", "percent_complete"]
+
+    def get_completed(self, obj):
+        return completed_positions(obj.progress)
+
+    def get_percent_complete(self, obj):
+        return percent_complete(obj.completed_count, obj.course.chapter_count)
+
+
+class CourseProgressSerializer(ProgressSerializer):
+    # {chapter id: seconds}, set on the enrollment by the view.
+    resume_at = serializers.DictField(child=serializers.FloatField(), read_only=True)
+
+    class Meta(ProgressSerializer.Meta):
+        fields = ProgressSerializer.Meta.fields + ["resume_at"]
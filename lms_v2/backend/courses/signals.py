@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocomplete
+from .counters import add_enrollments, fold_enrollment_shards, forget_enrollment_shards
+from .models import Course, Section, Chapter, Enrollment, add_course_hours, add_course_sections
+from .outlines import bump_access_version, bump_version
+from .progress import release_positions
+from .search import schedule_reindex
+from .thumbnails import schedule_release, schedule_variants
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+@receiver(pre_delete, sender=Section)
+def remember_section_chapters(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Course:
+        chapters = list(instance.chapters.values_list("video_duration", "position"))
+        instance._chapter_hours = sum(duration for duration, _ in chapters)
+        instance._chapter_positions = [position for _, position in chapters]
+
+
+@receiver(post_delete, sender=Section)
+def release_section_chapters(sender, instance, **kwargs):
+    # Set only when the section is deleted on its own; when the whole course
+    # goes away there is nothing left to update.
+    add_course_hours(instance, -getattr(instance, "_chapter_hours", 0))
+    release_positions(instance.course_id, getattr(instance, "_chapter_positions", []))
+
+
+@receiver(post_delete, sender=Section)
+def uncount_section(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Course:
+        add_course_sections(instance.course_id, -1)
+
+
+@receiver(post_delete, sender=Chapter)
+def release_chapter(sender, instance, origin=None, **kwargs):
+    # Cascades from a section or course are accounted for once, above.
+    if _origin_model(origin) in (Section, Course):
+        return
+    add_course_hours(instance.section_id, -instance.video_duration)
+    course_id = Section.objects.filter(pk=instance.section_id).values_list("course_id", flat=True).first()
+    if course_id is not None:
+        release_positions(course_id, [instance.position])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_outline(sender, instance, **kwargs):
+    bump_version(instance.pk)
+    schedule_reindex(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def update_autocomplete(sender, instance, **kwargs):
+    autocomplete.course_changed(instance.pk)
+
+
+# Suggestions show the creator's user_name.
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_creator_autocomplete(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or "user_name" in update_fields):
+        autocomplete.creator_changed(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+def update_enrollment_shards(sender, instance, created, **kwargs):
+    stored = getattr(instance, "_stored_shards", None)
+    if not created and stored != instance.enrollment_shards:
+        forget_enrollment_shards(instance.pk)
+        # Without this, unenrolling after sharding is switched off would
+        # take the course count below what the shards are still holding.
+        fold_enrollment_shards([instance.pk])
+    instance._stored_shards = instance.enrollment_shards
+
+
+@receiver(post_save, sender=Course)
+def render_thumbnail_variants(sender, instance, **kwargs):
+    if (instance.thumbnail.name or "") != instance.thumbnail_variants.get("source", ""):
+        schedule_variants(instance.pk)
+    stored = getattr(instance, "_stored_thumbnail", None)
+    if stored and stored != instance.thumbnail.name:
+        schedule_release(stored, instance.thumbnail_variants)
+    instance._stored_thumbnail = instance.thumbnail.name
+
+
+@receiver(post_delete, sender=Course)
+def release_course_thumbnail(sender, instance, **kwargs):
+    schedule_release(instance.thumbnail.name, instance.thumbnail_variants)
+
+
+@receiver(post_delete, sender=Course)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.course_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+def invalidate_section_outline(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Course:
+        bump_version(instance.course_id)
+        schedule_reindex(instance.course_id)
+        moved_from = getattr(instance, "_moved_from", None)
+        if moved_from is not None:
+            bump_version(moved_from)
+            schedule_reindex(moved_from)
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def invalidate_chapter_outline(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) in (Section, Course):
+        return
+    if Chapter.section.is_cached(instance):
+        course_id = instance.section.course_id
+    else:
+        course_id = Section.objects.filter(pk=instance.section_id).values_list("course_id", flat=True).first()
+    if course_id is not None:
+        bump_version(course_id)
+        schedule_reindex(course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_user_access(sender, instance, **kwargs):
+    bump_access_version(instance.user_id)
+
+
+# enroll() and enroll_cohort() insert without signals and count themselves.
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    if created:
+        add_enrollments(instance.course_id, 1)
+        autocomplete.enrollments_changed(instance.course_id, 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Course:
+        add_enrollments(instance.course_id, -1)
+        autocomplete.enrollments_changed(instance.course_id, -1)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+CHUNK_SIZE = 256 * 1024
+HASHED_NAME = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File storage that names each file after the SHA-256 of its content, as
+    ``<upload dir>/<first two hex digits>/<digest><ext>``, so identical
+    uploads share one file. The digest is computed chunk by chunk; uploads
+    Django spooled to disk are never read into memory.
+
+    Files aren't reference counted here: whether a file is still used is
+    answered by the rows pointing at it (see courses.thumbnails).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        return super().save(self.hashed_name(name, content), content, max_length=max_length)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], f"{digest}{ext}")
+
+    def get_available_name(self, name, max_length=None):
+        # A file with this name already holds the same bytes.
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            # Mark the blob as just used, so a cleanup racing with the
+            # course that's about to reference it leaves it alone.
+            os.utime(self.path(name))
+            return name
+        # Written under a unique name and renamed into place, so a
+        # concurrent upload of the same file never sees it half-written.
+        partial = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+    def is_hashed(self, name, directory):
+        return HASHED_NAME.match(posixpath.relpath(name, directory)) is not None
+
+
+_thumbnail_storage = ContentAddressedStorage()
+
+
+def thumbnail_storage():
+    return _thumbnail_storage
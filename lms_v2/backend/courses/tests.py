@@ -1,3 +1,1471 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from functools import partial
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from accounts.tokens import RoleRefreshToken
+from .async_views import AsyncCourseDetailView
+from .views import CourseCreateView
+from .autocomplete import AutocompleteIndex
+from .counters import enrollment_shards, fold_enrollment_shards
+from .enrollment import enroll_cohort
+from .heartbeats import HeartbeatBuffer
+from .importers import import_outline
+from .ordering import ORDER_GAP
+from .progress import clear_released_positions
+from .storage import thumbnail_storage
+from .thumbnails import variant_name
+from .models import (
+    Course, CourseCounterShard, CourseSearchDocument, Section, Chapter, Enrollment, PlaybackPosition,
+)
+
+
+def make_course(creator, title="Course", sections=2, chapters=3):
+    course = Course.objects.create(creator=creator, title=title, description="desc")
+    for s in range(1, sections + 1):
+        section = Section.objects.create(course=course, title=f"Section {s}", order=s)
+        for c in range(1, chapters + 1):
+            Chapter.objects.create(
+                section=section,
+                title=f"Chapter {s}.{c}",
+                video_url=f"https://example.com/{s}/{c}",
+                video_duration=0.5,
+                order=c,
+            )
+    return course
+
+
+class CourseTreeQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_catalog_query_count_is_constant(self):
+        make_course(self.creator, "First", sections=1, chapters=1)
+        baseline = self.count_queries("/api/courses/")
+
+        for i in range(5):
+            make_course(self.creator, f"Course {i}", sections=4, chapters=6)
+        self.assertEqual(self.count_queries("/api/courses/"), baseline)
+
+    def test_detail_query_count_is_constant(self):
+        small = make_course(self.creator, "Small", sections=1, chapters=1)
+        large = make_course(self.creator, "Large", sections=8, chapters=10)
+
+        self.assertEqual(
+            self.count_queries(f"/api/courses/{large.pk}/"),
+            self.count_queries(f"/api/courses/{small.pk}/"),
+        )
+
+
+class ChapterRedactionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.student = User.objects.create_user(
+            email="student@example.com", password="pw", user_name="student"
+        )
+        self.enrolled = make_course(self.creator, "Enrolled", sections=3, chapters=4)
+        self.other = make_course(self.creator, "Other", sections=3, chapters=4)
+        Enrollment.objects.create(user=self.student, course=self.enrolled)
+
+    def chapters(self, course_data):
+        return [c for s in course_data["sections"] for c in s["chapters"]]
+
+    def test_video_url_only_for_entitled_courses(self):
+        self.client.force_authenticate(self.student)
+        data = {c["title"]: c for c in self.client.get("/api/courses/").json()}
+
+        self.assertTrue(all("video_url" in c for c in self.chapters(data["Enrolled"])))
+        self.assertFalse(any("video_url" in c for c in self.chapters(data["Other"])))
+
+    def test_creator_sees_video_url(self):
+        self.client.force_authenticate(self.creator)
+        data = self.client.get(f"/api/courses/{self.other.pk}/").json()
+        self.assertTrue(all("video_url" in c for c in self.chapters(data)))
+
+    def test_anonymous_never_sees_video_url(self):
+        data = self.client.get(f"/api/courses/{self.enrolled.pk}/").json()
+        self.assertFalse(any("video_url" in c for c in self.chapters(data)))
+
+    def test_enrollment_lookup_runs_once_per_request(self):
+        self.client.force_authenticate(self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/courses/")
+        enrollment_queries = [
+            q for q in ctx.captured_queries if "courses_enrollment" in q["sql"]
+        ]
+        self.assertEqual(len(enrollment_queries), 1)
+
+    def test_cached_outline_is_redacted_per_user(self):
+        url = f"/api/courses/{self.enrolled.pk}/"
+        self.client.get(url)
+
+        self.client.force_authenticate(self.student)
+        with self.assertNumQueries(1):
+            data = self.client.get(url).json()
+        self.assertTrue(all("video_url" in c for c in self.chapters(data)))
+
+        self.client.force_authenticate(None)
+        data = self.client.get(url).json()
+        self.assertFalse(any("video_url" in c for c in self.chapters(data)))
+
+
+class OutlineCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.course = make_course(self.creator, sections=2, chapters=2)
+        self.url = f"/api/courses/{self.course.pk}/"
+
+    def test_repeat_hits_skip_the_database(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_missing_course_is_404(self):
+        self.assertEqual(self.client.get("/api/courses/999999/").status_code, 404)
+
+    def test_content_changes_invalidate(self):
+        self.client.get(self.url)
+
+        chapter = Chapter.objects.filter(section__course=self.course).first()
+        chapter.title = "Renamed"
+        chapter.save()
+        titles = [c["title"] for s in self.client.get(self.url).json()["sections"] for c in s["chapters"]]
+        self.assertIn("Renamed", titles)
+
+        self.course.sections.first().delete()
+        self.assertEqual(len(self.client.get(self.url).json()["sections"]), 1)
+
+        self.course.title = "New title"
+        self.course.save()
+        self.assertEqual(self.client.get(self.url).json()["title"], "New title")
+
+    def test_bulk_import_invalidates(self):
+        self.client.get(self.url)
+        import_outline(self.course, [{"title": "Bulk", "chapters": []}])
+        self.assertEqual(len(self.client.get(self.url).json()["sections"]), 3)
+
+
+class CourseCatalogTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.other = User.objects.create_user(
+            email="other@example.com", password="pw", user_name="other"
+        )
+        for i in range(5):
+            Course.objects.create(
+                creator=self.creator, title=f"Course {i}", description="d",
+                total_hours=i, is_published=i % 2 == 0,
+            )
+        Course.objects.create(creator=self.other, title="Foreign", description="d")
+
+    def test_cursor_pages_cover_catalog_once(self):
+        seen = []
+        url = "/api/courses/catalog/?page_size=2"
+        while url:
+            page = self.client.get(url).json()
+            self.assertTrue(all("sections" not in c for c in page["results"]))
+            seen += [c["id"] for c in page["results"]]
+            url = page["next"]
+        self.assertEqual(sorted(seen), sorted(Course.objects.values_list("id", flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_filters(self):
+        def titles(query):
+            return {c["title"] for c in self.client.get(f"/api/courses/catalog/?{query}").json()["results"]}
+
+        self.assertEqual(titles("published=true"), {"Course 0", "Course 2", "Course 4"})
+        self.assertEqual(titles(f"creator={self.other.pk}"), {"Foreign"})
+        self.assertEqual(titles("min_hours=2&max_hours=3"), {"Course 2", "Course 3"})
+
+    def test_invalid_number_filter(self):
+        self.assertEqual(self.client.get("/api/courses/catalog/?min_hours=abc").status_code, 400)
+
+
+class CourseHoursTests(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.course = make_course(self.creator, sections=2, chapters=3)
+
+    def hours(self, course=None):
+        return Course.objects.values_list("total_hours", flat=True).get(pk=(course or self.course).pk)
+
+    def test_create_update_delete_chapter(self):
+        self.assertAlmostEqual(self.hours(), 3.0)
+
+        chapter = Chapter.objects.filter(section__course=self.course).first()
+        chapter.video_duration = 2.0
+        chapter.save()
+        self.assertAlmostEqual(self.hours(), 4.5)
+
+        chapter.delete()
+        self.assertAlmostEqual(self.hours(), 2.5)
+
+    def test_move_chapter_between_courses(self):
+        other = make_course(self.creator, "Other", sections=1, chapters=1)
+        chapter = Chapter.objects.filter(section__course=self.course).first()
+        chapter.section = other.sections.get()
+        chapter.order = 99
+        chapter.save()
+
+        self.assertAlmostEqual(self.hours(), 2.5)
+        self.assertAlmostEqual(self.hours(other), 1.0)
+
+    def test_section_delete_subtracts_its_chapters(self):
+        self.course.sections.first().delete()
+        self.assertAlmostEqual(self.hours(), 1.5)
+
+    def test_reconcile_repairs_drift(self):
+        Course.objects.filter(pk=self.course.pk).update(total_hours=42)
+        call_command("reconcile_course_hours", stdout=StringIO())
+        self.assertAlmostEqual(self.hours(), 3.0)
+
+
+class CourseCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.course = make_course(self.creator, sections=2, chapters=3)
+        self.students = [
+            User.objects.create_user(email=f"s{i}@example.com", password="pw", user_name=f"s{i}")
+            for i in range(4)
+        ]
+
+    def counts(self, course=None):
+        return Course.objects.values_list("enrollment_count", "section_count", "chapter_count").get(
+            pk=(course or self.course).pk
+        )
+
+    def test_enroll_and_unenroll(self):
+        for student in self.students[:2]:
+            self.client.force_authenticate(student)
+            self.client.post("/api/courses/enroll/", {"course": self.course.pk})
+        self.client.post("/api/courses/enroll/", {"course": self.course.pk})
+        enroll_cohort(self.course, [s.pk for s in self.students])
+        self.assertEqual(self.counts()[0], 4)
+
+        Enrollment.objects.filter(user=self.students[0]).get().delete()
+        self.assertEqual(self.counts()[0], 3)
+
+    def test_content_create_delete_move_and_import(self):
+        self.assertEqual(self.counts(), (0, 2, 6))
+        other = make_course(self.creator, "Other", sections=1, chapters=1)
+        section = self.course.sections.first()
+        section.course = other
+        section.save()
+        self.assertEqual((self.counts()[1], self.counts(other)[1]), (1, 2))
+
+        other.sections.exclude(pk=section.pk).get().delete()
+        self.assertEqual(self.counts(other)[1], 1)
+        outline = [{"title": "A", "chapters": []}, {"title": "B", "chapters": []}]
+        import_outline(self.course, outline)
+        self.assertEqual(self.counts()[1], 3)
+        import_outline(self.course, outline, replace=True)
+        self.assertEqual(self.counts()[1], 2)
+
+    def test_saving_a_stale_copy_keeps_counts(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        section = Section.objects.create(course=self.course, title="More")
+        Chapter.objects.create(section=section, title="C", video_url="https://example.com/c", video_duration=2)
+        stale.title = "Renamed"
+        stale.save()
+        self.assertEqual(self.counts()[1:], (3, 7))
+        self.assertAlmostEqual(Course.objects.get(pk=self.course.pk).total_hours, 5.0)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, "Renamed")
+
+    def test_sharded_course_counts_on_shards_until_folded(self):
+        self.course.enrollment_shards = 3
+        self.course.save()
+        enroll_cohort(self.course, [s.pk for s in self.students])
+        Enrollment.objects.filter(user=self.students[0]).get().delete()
+        self.assertEqual(self.counts()[0], 0)
+        self.assertEqual(sum(CourseCounterShard.objects.values_list("enrollments", flat=True)), 3)
+        self.assertLessEqual(CourseCounterShard.objects.count(), 3)
+
+        self.assertEqual(fold_enrollment_shards(), [self.course.pk])
+        self.assertEqual(self.counts()[0], 3)
+        self.assertFalse(CourseCounterShard.objects.exclude(enrollments=0).exists())
+
+    def test_turning_sharding_off_folds_the_shards(self):
+        self.course.enrollment_shards = 4
+        self.course.save()
+        enroll_cohort(self.course, [self.students[0].pk])
+        course = Course.objects.get(pk=self.course.pk)
+        course.enrollment_shards = 0
+        course.save()
+        self.assertEqual(self.counts()[0], 1)
+
+        Enrollment.objects.get(user=self.students[0]).delete()
+        self.assertEqual(self.counts()[0], 0)
+        self.assertFalse(CourseCounterShard.objects.exclude(enrollments=0).exists())
+
+    def test_reconcile_repairs_drift_and_folds_shards(self):
+        enroll_cohort(self.course, [s.pk for s in self.students[:2]])
+        other = make_course(self.creator, "Other", sections=1, chapters=1)
+        Course.objects.filter(pk=self.course.pk).update(section_count=9, chapter_count=0)
+        CourseCounterShard.objects.create(course=other, shard=0, enrollments=0)
+        Enrollment.objects.create(user=self.students[0], course=other)
+        Course.objects.filter(pk=other.pk).update(enrollment_shards=2, enrollment_count=0)
+        CourseCounterShard.objects.filter(course=other).update(enrollments=1)
+
+        out = StringIO()
+        call_command("reconcile_course_counters", "--dry-run", stdout=out)
+        self.assertIn("would repair 1", out.getvalue())
+        self.assertEqual(self.counts()[1], 9)
+
+        out = StringIO()
+        call_command("reconcile_course_counters", batch_size=1, stdout=out)
+        self.assertIn("repaired 1", out.getvalue())
+        self.assertEqual((self.counts(), self.counts(other)), ((2, 2, 6), (1, 1, 1)))
+        self.assertFalse(CourseCounterShard.objects.exclude(enrollments=0).exists())
+
+    def test_counts_in_catalog_and_detail(self):
+        enroll_cohort(self.course, [s.pk for s in self.students[:2]])
+        card = self.client.get("/api/courses/catalog/").json()["results"][0]
+        detail = self.client.get(f"/api/courses/{self.course.pk}/").data
+        for data in (card, detail):
+            self.assertEqual(
+                (data["enrollment_count"], data["section_count"], data["chapter_count"]), (2, 2, 6)
+            )
+
+
+    @override_settings(COURSE_ENROLLMENT_COUNT_EPOCH=2)
+    def test_counted_enrollments_refresh_cached_pages(self):
+        urls = ["/api/courses/catalog/", f"/api/courses/{self.course.pk}/"]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+
+        self.client.force_authenticate(self.students[0])
+        self.client.post("/api/courses/enroll/", {"course": self.course.pk})
+        self.client.force_authenticate(None)
+        # One enrollment short of the epoch, the pages may lag by it.
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Enrollment.objects.create(user=self.students[1], course=self.course)
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["enrollment_count"], 2)
+
+    def test_folding_shards_refreshes_cached_pages(self):
+        self.course.enrollment_shards = 2
+        self.course.save()
+        enroll_cohort(self.course, [s.pk for s in self.students])
+        url = f"/api/courses/{self.course.pk}/"
+        etag = self.client.get(url)["ETag"]
+        fold_enrollment_shards()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data["enrollment_count"]), (200, 4))
+
+
+class OutlineImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.course = make_course(self.creator, sections=1, chapters=2)
+        self.outline = {
+            "sections": [
+                {
+                    "title": f"Imported {s}",
+                    "chapters": [
+                        {"title": f"C{c}", "video_url": "https://example.com/v", "video_duration": 0.25}
+                        for c in range(10)
+                    ],
+                }
+                for s in range(3)
+            ]
+        }
+
+    def test_import_appends_outline(self):
+        self.client.force_authenticate(self.creator)
+        response = self.client.post(f"/api/courses/{self.course.pk}/import/", self.outline, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["chapters"], 30)
+        self.assertEqual(
+            list(self.course.sections.values_list("order", flat=True)),
+            [1, 1 + ORDER_GAP, 1 + 2 * ORDER_GAP, 1 + 3 * ORDER_GAP],
+        )
+        self.course.refresh_from_db()
+        self.assertAlmostEqual(self.course.total_hours, 8.5)
+
+    def test_import_replace(self):
+        self.client.force_authenticate(self.creator)
+        self.client.post(
+            f"/api/courses/{self.course.pk}/import/", {**self.outline, "replace": True}, format="json"
+        )
+        self.assertEqual(self.course.sections.count(), 3)
+        self.course.refresh_from_db()
+        self.assertAlmostEqual(self.course.total_hours, 7.5)
+
+    def test_only_creator_can_import(self):
+        student = User.objects.create_user(email="s@example.com", password="pw", user_name="s")
+        self.client.force_authenticate(student)
+        response = self.client.post(f"/api/courses/{self.course.pk}/import/", self.outline, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_csv_upload(self):
+        self.client.force_authenticate(self.creator)
+        upload = SimpleUploadedFile(
+            "outline.csv",
+            b"section,title,video_url,video_duration\n"
+            b"Intro,Hello,https://example.com/a,0.5\n"
+            b"Intro,World,https://example.com/b,0.5\n"
+            b"Next,Again,https://example.com/c,1\n",
+        )
+        response = self.client.post(f"/api/courses/{self.course.pk}/import/", {"file": upload})
+        self.assertEqual(response.json(), {"sections": 2, "chapters": 3, "hours": 2.0})
+
+    def test_csv_missing_column_is_400(self):
+        self.client.force_authenticate(self.creator)
+        upload = SimpleUploadedFile("outline.csv", b"section,title\nIntro,Hello\n")
+        response = self.client.post(f"/api/courses/{self.course.pk}/import/", {"file": upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("video_url", response.json()["file"][0])
+
+    def test_csv_encoding(self):
+        self.client.force_authenticate(self.creator)
+        url = f"/api/courses/{self.course.pk}/import/"
+        upload = SimpleUploadedFile(
+            "outline.csv", "\ufeffsection,title,video_url,video_duration\nIntro,Hello,https://example.com/a,1\n".encode()
+        )
+        self.assertEqual(self.client.post(url, {"file": upload}).status_code, 201)
+
+        upload = SimpleUploadedFile(
+            "outline.csv", "section,title,video_url,video_duration\nIntro,Café,https://example.com/a,1\n".encode("latin-1")
+        )
+        response = self.client.post(url, {"file": upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["file"], ["CSV must be UTF-8 encoded."])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.student = User.objects.create_user(
+            email="student@example.com", password="pw", user_name="student"
+        )
+        self.course = make_course(self.creator, sections=1, chapters=2)
+
+    def revalidate(self, url):
+        etag = self.client.get(url)["ETag"]
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_detail_304_until_content_changes(self):
+        url = f"/api/courses/{self.course.pk}/"
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        Chapter.objects.filter(section__course=self.course).first().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_catalog_304_until_any_course_changes(self):
+        for url in ("/api/courses/", "/api/courses/catalog/"):
+            etag, response = self.revalidate(url)
+            self.assertEqual(response.status_code, 304)
+
+            make_course(self.creator, "Another", sections=1, chapters=1)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_enrolling_changes_detail_etag(self):
+        url = f"/api/courses/{self.course.pk}/"
+        self.client.force_authenticate(self.student)
+        etag = self.client.get(url)["ETag"]
+
+        Enrollment.objects.create(user=self.student, course=self.course)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("video_url", response.json()["sections"][0]["chapters"][0])
+
+    def test_player_304_for_creator(self):
+        self.client.force_authenticate(self.creator)
+        _, response = self.revalidate(f"/api/courses/{self.course.pk}/player/")
+        self.assertEqual(response.status_code, 304)
+
+
+class AccessPolicyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.student = User.objects.create_user(
+            email="student@example.com", password="pw", user_name="student"
+        )
+        self.course = make_course(self.creator, sections=2, chapters=3)
+        self.player = f"/api/courses/{self.course.pk}/player/"
+
+    def test_player_requires_enrollment(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.get(self.player)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["detail"], "You are not enrolled in course")
+
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.client.get(self.player)
+        # Course row + the student's enrollments; the outline is cached.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.player).status_code, 200)
+
+    def test_section_and_chapter_edits_limited_to_owner(self):
+        section = self.course.sections.first()
+        chapter = section.chapters.first()
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.patch(f"/api/courses/sections/{section.pk}/edit/", {"title": "x"}).status_code, 403)
+        self.assertEqual(self.client.patch(f"/api/courses/chapters/{chapter.pk}/edit/", {"title": "x"}).status_code, 403)
+        response = self.client.post("/api/courses/sections/create/", {"course": self.course.pk, "title": "x", "order": 9})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.client.patch(f"/api/courses/sections/{section.pk}/edit/", {"title": "x"}).status_code, 200)
+        self.assertEqual(self.client.patch(f"/api/courses/chapters/{chapter.pk}/edit/", {"title": "x"}).status_code, 200)
+
+    def test_enroll_rules(self):
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.client.post("/api/courses/enroll/", {"course": self.course.pk}).status_code, 403)
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.post("/api/courses/enroll/", {"course": self.course.pk}).status_code, 201)
+        # Enrolling again is idempotent.
+        self.assertEqual(self.client.post("/api/courses/enroll/", {"course": self.course.pk}).status_code, 200)
+        self.assertEqual(self.client.post("/api/courses/enroll/", {"course": "nope"}).status_code, 400)
+        self.assertEqual(self.client.post("/api/courses/enroll/", {"course": self.course.pk + 100}).status_code, 404)
+
+
+class EnrollmentWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.student = User.objects.create_user(
+            email="student@example.com", password="pw", user_name="student"
+        )
+        self.course = make_course(self.creator, sections=1, chapters=1)
+
+    def test_enroll_is_insert_and_count_and_idempotent(self):
+        self.client.force_authenticate(self.student)
+        enrollment_shards(self.course.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/courses/enroll/", {"course": self.course.pk})
+        statements = [q["sql"].split()[0] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(statements, ["INSERT", "UPDATE"])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["user"], self.student.pk)
+        self.assertEqual(response.data["status"], "active")
+        enrollment = Enrollment.objects.get()
+        self.assertEqual(response.data["id"], enrollment.pk)
+
+        again = self.client.post("/api/courses/enroll/", {"course": self.course.pk})
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data["id"], enrollment.pk)
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+    def test_enroll_invalidates_cached_access(self):
+        self.client.force_authenticate(self.student)
+        player = f"/api/courses/{self.course.pk}/player/"
+        self.assertEqual(self.client.get(player).status_code, 403)
+        first = self.client.get("/api/courses/my-enrollments/")
+        self.client.post("/api/courses/enroll/", {"course": self.course.pk})
+        self.assertEqual(self.client.get(player).status_code, 200)
+        self.assertNotEqual(self.client.get("/api/courses/my-enrollments/").data, first.data)
+
+    def test_cohort_api(self):
+        users = [
+            User.objects.create(email=f"hire{i}@example.com", user_name=f"hire{i}") for i in range(5)
+        ]
+        Enrollment.objects.create(user=users[0], course=self.course)
+        url = f"/api/courses/{self.course.pk}/enroll-cohort/"
+        payload = {
+            "users": [u.pk for u in users[:3]] + [self.creator.pk],
+            "emails": ["hire3@example.com", "hire4@example.com", "nobody@example.com"],
+        }
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.post(url, payload, format="json").status_code, 403)
+
+        self.client.force_authenticate(self.creator)
+        response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {"enrolled": 4, "skipped": 3})
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 5)
+        self.assertEqual(self.client.post(url, {}, format="json").status_code, 400)
+
+    def test_cohort_counts_rows_actually_inserted(self):
+        users = [User.objects.create(email=f"hire{i}@example.com", user_name=f"hire{i}") for i in range(3)]
+        from . import enrollment
+
+        def racing_insert(enrollments):
+            # users[0] enrolls on their own between the lookup and the insert.
+            Enrollment.objects.create(user=users[0], course=self.course)
+            return real_insert(enrollments)
+
+        real_insert = enrollment.insert_ignoring_conflicts
+        with mock.patch.object(enrollment, "insert_ignoring_conflicts", racing_insert):
+            result = enroll_cohort(self.course, [u.pk for u in users])
+        self.assertEqual(result, (2, 1))
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 3)
+
+    def test_cohort_command_batches(self):
+        for i in range(7):
+            User.objects.create(email=f"hire{i}@example.com", user_name=f"hire{i}")
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("\n".join(f"hire{i}@example.com" for i in range(7)) + "\n\n")
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command("enroll_cohort", self.course.pk, f.name, batch_size=3, stdout=out)
+        self.assertIn("Enrolled 7 users", out.getvalue())
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 7)
+
+
+@override_settings(PROGRESS_WORKERS=0)
+class ProgressTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.student = User.objects.create_user(
+            email="student@example.com", password="pw", user_name="student"
+        )
+        self.course = make_course(self.creator, sections=2, chapters=2)
+        self.enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.chapters = list(Chapter.objects.order_by("section__order", "order"))
+        self.client.force_authenticate(self.student)
+
+    def complete(self, chapter, method="post"):
+        return getattr(self.client, method)(f"/api/courses/chapters/{chapter.pk}/complete/")
+
+    def test_positions_are_course_wide(self):
+        self.assertEqual([c.position for c in self.chapters], [0, 1, 2, 3])
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.chapter_count, self.course.chapter_slots), (4, 4))
+
+    def test_completing_every_chapter_completes_enrollment(self):
+        for chapter in self.chapters[:3]:
+            response = self.complete(chapter)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["completed"], [0, 1, 2])
+        self.assertEqual(response.data["percent_complete"], 75)
+        self.assertEqual(response.data["status"], "active")
+
+        self.assertEqual(self.complete(self.chapters[3]).data["status"], "completed")
+        # Completing twice changes nothing.
+        self.assertEqual(self.complete(self.chapters[3]).data["completed_count"], 4)
+
+        response = self.complete(self.chapters[0], method="delete")
+        self.assertEqual((response.data["status"], response.data["completed"]), ("active", [1, 2, 3]))
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual(bytes(self.enrollment.progress), b"\x0e")
+
+    def test_my_enrollments_percent(self):
+        self.complete(self.chapters[0])
+        row = self.client.get("/api/courses/my-enrollments/").data[0]
+        self.assertEqual((row["completed_count"], row["chapter_count"], row["percent_complete"]), (1, 4, 25))
+        self.assertEqual(self.client.get(f"/api/courses/{self.course.pk}/progress/").data["completed"], [0])
+
+    def test_requires_enrollment(self):
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.complete(self.chapters[0]).status_code, 403)
+        self.assertEqual(self.client.get(f"/api/courses/{self.course.pk}/progress/").status_code, 403)
+
+    def test_deleted_chapters_release_their_bits(self):
+        for chapter in self.chapters[:3]:
+            self.complete(chapter)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapters[0].delete()
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.completed_count, self.enrollment.status), (2, "active"))
+
+        # The only unfinished chapter goes away: everything left is done.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapters[3].delete()
+        self.enrollment.refresh_from_db()
+        self.assertEqual((self.enrollment.completed_count, self.enrollment.status), (2, "completed"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.sections.last().delete()
+        self.enrollment.refresh_from_db()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.chapter_count, 1)
+        self.assertEqual(self.enrollment.completed_count, 1)
+
+    def test_releasing_leaves_enrollments_to_after_commit(self):
+        students = [
+            User.objects.create_user(email=f"s{i}@example.com", password="pw", user_name=f"s{i}")
+            for i in range(30)
+        ]
+        enrollments = Enrollment.objects.bulk_create(
+            Enrollment(user=student, course=self.course, progress=b"\x03", completed_count=2) for student in students
+        )
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            self.chapters[0].delete()
+        enrollment_table = Enrollment._meta.db_table
+        self.assertFalse([q for q in queries if enrollment_table in q["sql"] and "UPDATE" in q["sql"]])
+
+        # The bitmaps are rewritten after commit, a few rows per transaction.
+        with mock.patch("courses.progress.clear_released_positions", partial(clear_released_positions, batch_size=7)):
+            for callback in callbacks:
+                callback()
+        rows = Enrollment.objects.filter(pk__in=[e.pk for e in enrollments])
+        self.assertEqual({(bytes(p), n) for p, n in rows.values_list("progress", "completed_count")}, {(b"\x02", 1)})
+        self.assertEqual(clear_released_positions(self.course.pk), 0)
+
+        # A worker that died before finishing is caught up by the reconcile.
+        rows.filter(pk=enrollments[0].pk).update(progress=b"\x03", completed_count=2)
+        out = StringIO()
+        call_command("reconcile_course_counters", "--progress", stdout=out)
+        self.assertIn("Cleared released chapters from 1 enrollments", out.getvalue())
+
+    def test_positions_are_never_reused(self):
+        self.chapters[3].delete()
+        section = self.course.sections.first()
+        chapter = Chapter.objects.create(
+            section=section, title="New", video_url="https://example.com/new", video_duration=1, order=9
+        )
+        self.assertEqual(chapter.position, 4)
+        import_outline(self.course, [{"title": "More", "chapters": [
+            {"title": "x", "video_url": "https://example.com/x", "video_duration": 1.0},
+        ]}])
+        self.assertEqual(Chapter.objects.get(title="x").position, 5)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.chapter_count, self.course.chapter_slots), (5, 6))
+
+    def test_moving_chapter_to_another_course(self):
+        self.complete(self.chapters[0])
+        other = make_course(self.creator, "Other", sections=1, chapters=1)
+        chapter = self.chapters[0]
+        chapter.section, chapter.order = other.sections.get(), 2
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter.save()
+
+        self.assertEqual(chapter.position, 1)
+        self.course.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.course.chapter_count, other.chapter_count), (3, 2))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_count, 0)
+
+    def test_moving_section_to_another_course(self):
+        self.complete(self.chapters[0])
+        other = make_course(self.creator, "Other", sections=1, chapters=1)
+        self.client.get(f"/api/courses/{self.course.pk}/")
+        section = self.course.sections.first()
+        self.client.force_authenticate(self.creator)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/courses/sections/{section.pk}/edit/", {"course": other.pk})
+        self.assertEqual(response.status_code, 200)
+
+        positions = Chapter.objects.filter(section__course=other).values_list("position", flat=True)
+        self.assertEqual(sorted(positions), [0, 1, 2])
+        self.course.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.course.chapter_count, other.chapter_count), (2, 3))
+        self.assertAlmostEqual(self.course.total_hours, 1.0)
+        self.assertAlmostEqual(other.total_hours, 1.5)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_count, 0)
+        outline = self.client.get(f"/api/courses/{self.course.pk}/").data
+        self.assertEqual(len(outline["sections"]), 1)
+
+
+class HeartbeatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        self.student = User.objects.create_user(
+            email="student@example.com", password="pw", user_name="student"
+        )
+        self.course = make_course(self.creator, sections=1, chapters=3)
+        self.enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.chapters = list(Chapter.objects.order_by("order"))
+        self.buffer = HeartbeatBuffer(flush_interval=0)
+        patcher = mock.patch("courses.views.heartbeats", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_authenticate(self.student)
+        self.url = f"/api/courses/{self.course.pk}/heartbeat/"
+
+    def beat(self, chapter, seconds):
+        return self.client.post(self.url, {"chapter": chapter.pk, "seconds": seconds}, format="json")
+
+    def test_heartbeats_are_coalesced_and_upserted(self):
+        for seconds in (5, 10, 15):
+            self.assertEqual(self.beat(self.chapters[0], seconds).status_code, 202)
+        self.beat(self.chapters[1], 3)
+        self.assertEqual(len(self.buffer), 2)
+        self.assertFalse(PlaybackPosition.objects.exists())
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.beat(self.chapters[0], 20)
+        self.buffer.flush()
+        self.assertEqual(
+            dict(PlaybackPosition.objects.values_list("chapter_id", "seconds")),
+            {self.chapters[0].pk: 20, self.chapters[1].pk: 3},
+        )
+
+    def test_steady_state_does_no_queries(self):
+        self.beat(self.chapters[0], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.beat(self.chapters[0], 2).status_code, 202)
+
+    def test_rejects_outsiders_and_foreign_chapters(self):
+        other = make_course(self.creator, "Other", sections=1, chapters=1)
+        self.assertEqual(self.beat(other.sections.get().chapters.get(), 1).status_code, 400)
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.beat(self.chapters[0], 1).status_code, 403)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_bounded_buffer_flushes_inline(self):
+        buffer = HeartbeatBuffer(flush_interval=0, max_entries=2)
+        buffer.add(self.enrollment.pk, self.chapters[0].pk, 1)
+        buffer.add(self.enrollment.pk, self.chapters[1].pk, 1)
+        buffer.add(self.enrollment.pk, self.chapters[1].pk, 2)
+        self.assertFalse(PlaybackPosition.objects.exists())
+        buffer.add(self.enrollment.pk, self.chapters[2].pk, 1)
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(PlaybackPosition.objects.count(), 2)
+
+    def test_failed_inline_flush_keeps_positions(self):
+        buffer = HeartbeatBuffer(flush_interval=0, max_entries=1)
+        buffer.add(self.enrollment.pk, self.chapters[0].pk, 1)
+        with mock.patch("courses.heartbeats._upsert", side_effect=OSError("db down")):
+            with self.assertLogs("courses.heartbeats", "ERROR"):
+                buffer.add(self.enrollment.pk, self.chapters[1].pk, 2)
+        self.assertEqual(buffer.latest(self.enrollment.pk), {self.chapters[0].pk: 1, self.chapters[1].pk: 2})
+        self.assertEqual(buffer.flush(), 2)
+
+    def test_deleted_course_is_404(self):
+        self.beat(self.chapters[0], 1)
+        Course.objects.filter(pk=self.course.pk).delete()
+        # Another process may still hold the enrollment id in its cache.
+        with mock.patch("courses.views.cached_enrollment_id", return_value=self.enrollment.pk):
+            self.assertEqual(self.beat(self.chapters[0], 2).status_code, 404)
+
+    def test_flush_skips_deleted_chapters(self):
+        self.beat(self.chapters[0], 1)
+        self.beat(self.chapters[1], 1)
+        self.chapters[1].delete()
+        self.assertEqual(self.buffer.flush(), 1)
+
+    def test_progress_reports_resume_positions(self):
+        self.beat(self.chapters[0], 30)
+        self.buffer.flush()
+        self.beat(self.chapters[1], 12)
+        data = self.client.get(f"/api/courses/{self.course.pk}/progress/").json()
+        self.assertEqual(data["resume_at"], {str(self.chapters[0].pk): 30.0, str(self.chapters[1].pk): 12.0})
+
+
+@override_settings(PROGRESS_WORKERS=0)
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.creator = User.objects.create_user(
+            email="creator@example.com", password="pw", user_name="creator"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.django = Course.objects.create(
+                creator=self.creator, title="Django for beginners", description="Build web apps", is_published=True
+            )
+            self.python = Course.objects.create(
+                creator=self.creator, title="Python basics", description="Learn Django later", is_published=True
+            )
+            self.draft = Course.objects.create(creator=self.creator, title="Cooking", description="Pasta")
+            section = Section.objects.create(course=self.draft, title="Sauces", order=1)
+            Chapter.objects.create(
+                section=section, title="Tomato basics", video_url="https://example.com/t", video_duration=1, order=1
+            )
+
+    def search(self, query, **params):
+        response = self.client.get("/api/courses/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [course["id"] for course in response.json()["results"]]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search("django"), [self.django.pk, self.python.pk])
+
+    def test_indexes_outline_and_prefixes(self):
+        self.assertEqual(self.search("tomato"), [self.draft.pk])
+        self.assertEqual(self.search("sau"), [self.draft.pk])
+        self.assertEqual(self.search("tomato", published=1), [])
+        # All terms must match when possible, any of them otherwise.
+        self.assertEqual(self.search("django web"), [self.django.pk])
+        self.assertCountEqual(self.search("django pasta"), [self.django.pk, self.python.pk, self.draft.pk])
+        self.assertEqual(self.search("!!!"), [])
+
+    def test_signals_keep_index_current(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.draft.title = "Italian cooking"
+            self.draft.save()
+            Chapter.objects.filter(title="Tomato basics").get().delete()
+        self.assertEqual(self.search("italian"), [self.draft.pk])
+        self.assertEqual(self.search("tomato"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.python.delete()
+        self.assertEqual(self.search("django"), [self.django.pk])
+
+    def test_pagination(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                Course.objects.create(creator=self.creator, title=f"Rust {i}", description="Systems")
+        data = self.client.get("/api/courses/search/", {"q": "rust", "page_size": 2}).json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIsNone(data["previous"])
+        last = self.client.get(data["next"].replace("page=2", "page=3")).json()
+        self.assertEqual(len(last["results"]), 1)
+        self.assertIsNone(last["next"])
+        self.assertEqual(self.client.get("/api/courses/search/").status_code, 400)
+        self.assertEqual(self.client.get("/api/courses/search/", {"q": "rust", "page": 0}).status_code, 400)
+
+    def test_rebuild_command(self):
+        CourseSearchDocument.objects.all().delete()
+        self.assertEqual(self.search("django"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("django"), [self.django.pk, self.python.pk])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.index = AutocompleteIndex(k=2)
+        patcher = mock.patch("courses.autocomplete.index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.creator = User.objects.create_user(email="creator@example.com", password="pw", user_name="Ada Lovelace")
+        self.students = [
+            User.objects.create_user(email=f"s{i}@example.com", password="pw", user_name=f"s{i}") for i in range(3)
+        ]
+        self.django = Course.objects.create(creator=self.creator, title="Django basics", is_published=True)
+        self.docker = Course.objects.create(creator=self.creator, title="Docker deep dive", is_published=True)
+        self.data = Course.objects.create(creator=self.creator, title="Data science", is_published=True)
+        Course.objects.create(creator=self.creator, title="Draft course")
+        for student in self.students:
+            Enrollment.objects.create(user=student, course=self.data)
+        Enrollment.objects.create(user=self.students[0], course=self.docker)
+
+    def suggest(self, query, **params):
+        response = self.client.get("/api/courses/autocomplete/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(s["id"], s["enrollments"]) for s in response.json()["results"]]
+
+    def test_ranks_prefix_matches_by_enrollments(self):
+        self.assertEqual(self.suggest("d"), [(self.data.pk, 3), (self.docker.pk, 1)])
+        self.assertEqual(self.suggest("dj"), [(self.django.pk, 0)])
+        self.assertEqual(self.suggest("lovel", limit=1), [(self.data.pk, 3)])
+        self.assertEqual(self.suggest("d deep"), [(self.docker.pk, 1)])
+        self.assertEqual(self.suggest("draft"), [])
+        with self.assertNumQueries(0):
+            self.suggest("do")
+
+    def test_signals_update_index(self):
+        self.suggest("d")
+        with self.captureOnCommitCallbacks(execute=True):
+            # Leaving the full top list means it has to be recomputed.
+            self.data.delete()
+        self.assertEqual(self.suggest("d"), [(self.docker.pk, 1), (self.django.pk, 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(self.students[1])
+            self.client.post("/api/courses/enroll/", {"course": self.django.pk}, format="json")
+            self.client.post("/api/courses/enroll/", {"course": self.django.pk}, format="json")
+            self.client.force_authenticate(self.students[2])
+            self.client.post("/api/courses/enroll/", {"course": self.django.pk}, format="json")
+        self.assertEqual(self.suggest("d"), [(self.django.pk, 2), (self.docker.pk, 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.docker.title = "Kubernetes deep dive"
+            self.docker.save()
+            draft = Course.objects.get(title="Draft course")
+            draft.is_published = True
+            draft.save()
+        self.assertEqual(self.suggest("d"), [(self.django.pk, 2), (self.docker.pk, 1)])
+        self.assertEqual(self.suggest("k"), [(self.docker.pk, 1)])
+        self.assertEqual(self.suggest("dr"), [(draft.pk, 0)])
+        self.assertEqual(self.suggest("doc"), [])
+
+    def test_creator_rename_reaches_index(self):
+        self.suggest("d")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.creator.user_name = "Grace Hopper"
+            self.creator.save()
+        self.assertEqual(self.suggest("hopper"), [(self.data.pk, 3), (self.docker.pk, 1)])
+        self.assertEqual(self.suggest("lovelace"), [])
+
+    def test_rebuild_takes_counts_from_rows(self):
+        index = AutocompleteIndex()
+        index.begin_load()
+        # Both already show in the rows being read.
+        index.add_enrollments(self.data.pk, 1)
+        index.add(self.data.pk, "Data engineering", "Ada Lovelace", 4)
+        index.load([(self.data.pk, "Data science", "Ada Lovelace", 3)])
+        self.assertEqual(index.suggest("engineering"), [
+            {"id": self.data.pk, "title": "Data engineering", "creator": "Ada Lovelace", "enrollments": 3}
+        ])
+
+    def test_rejects_bad_limit(self):
+        response = self.client.get("/api/courses/autocomplete/", {"q": "d", "limit": "x"})
+        self.assertEqual(response.status_code, 400)
+
+
+def image_upload(name, size, mode="RGB"):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ThumbnailVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, THUMBNAIL_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.creator = User.objects.create_user(email="creator@example.com", password="pw", user_name="creator")
+
+    def test_upload_renders_variants_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(
+                creator=self.creator, title="Art", thumbnail=image_upload("art.png", (2000, 1000), "RGBA")
+            )
+        course.refresh_from_db()
+        variants = course.thumbnail_variants
+        self.assertEqual(variants["source"], course.thumbnail.name)
+        self.assertEqual(
+            sorted((i["format"], i["width"], i["height"]) for i in variants["images"]),
+            [("jpeg", 320, 160), ("jpeg", 640, 320), ("jpeg", 1280, 640),
+             ("webp", 320, 160), ("webp", 640, 320), ("webp", 1280, 640)],
+        )
+        for entry in variants["images"]:
+            with default_storage.open(entry["name"]) as f, Image.open(f) as image:
+                self.assertEqual(image.size, (entry["width"], entry["height"]))
+                self.assertEqual(image.format, entry["format"].upper())
+
+        data = APIClient().get(f"/api/courses/{course.pk}/").json()["thumbnail_variants"]
+        self.assertTrue(data["src"].startswith("http://testserver/media/"))
+        self.assertTrue(data["src"].endswith("-320.jpeg"))
+        self.assertEqual(data["srcset"]["image/webp"].count("http://testserver/media/"), 3)
+        self.assertIn(" 640w, ", data["srcset"]["image/jpeg"])
+
+    def test_variant_names_keep_the_source_extension(self):
+        names = {variant_name(f"course_thumbnails/ab/x.{ext}", 320, "webp") for ext in ("png", "jpg")}
+        self.assertEqual(names, {"course_thumbnails/variants/x-png-320.webp", "course_thumbnails/variants/x-jpg-320.webp"})
+
+    def test_small_images_are_not_upscaled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(
+                creator=self.creator, title="Icon", thumbnail=image_upload("icon.png", (200, 100))
+            )
+        course.refresh_from_db()
+        self.assertEqual({i["width"] for i in course.thumbnail_variants["images"]}, {200})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.thumbnail = None
+            course.save()
+        course.refresh_from_db()
+        self.assertEqual(course.thumbnail_variants, {})
+        self.assertIsNone(APIClient().get(f"/api/courses/{course.pk}/").json()["thumbnail_variants"])
+
+    def test_backfill_renders_shared_thumbnails_once(self):
+        source = default_storage.save("course_thumbnails/shared.png", image_upload("shared.png", (800, 600)))
+        courses = [Course.objects.create(creator=self.creator, title=f"C{i}") for i in range(3)]
+        Course.objects.filter(pk__in=[c.pk for c in courses[:2]]).update(thumbnail=source)
+
+        out = StringIO()
+        call_command("generate_thumbnails", stdout=out)
+        self.assertIn("Rendered 1 thumbnails for 2 courses", out.getvalue())
+        records = list(Course.objects.order_by("pk").values_list("thumbnail_variants", flat=True))
+        self.assertEqual(records[0], records[1])
+        self.assertEqual([i["width"] for i in records[0]["images"]], [320, 320, 640, 640])
+        self.assertEqual(records[2], {})
+
+        call_command("generate_thumbnails", stdout=out)
+        self.assertIn("Rendered 0 thumbnails for 0 courses", out.getvalue())
+
+
+class ThumbnailStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, THUMBNAIL_WORKERS=0, THUMBNAIL_RELEASE_GRACE=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.creator = User.objects.create_user(email="creator@example.com", password="pw", user_name="creator")
+
+    def create(self, name, size=(400, 300)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Course.objects.create(creator=self.creator, title=name, thumbnail=image_upload(name, size))
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.create("a.PNG"), self.create("b.png")
+        self.assertEqual(first.thumbnail.name, second.thumbnail.name)
+        self.assertRegex(first.thumbnail.name, r"^course_thumbnails/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        self.assertEqual(thumbnail_storage().listdir(os.path.dirname(first.thumbnail.name))[1], [
+            os.path.basename(first.thumbnail.name)
+        ])
+        self.assertNotEqual(self.create("c.png", (300, 300)).thumbnail.name, first.thumbnail.name)
+
+    def test_last_reference_deletes_the_file_and_variants(self):
+        first, second = self.create("a.png"), self.create("b.png")
+        second.refresh_from_db()
+        name, variants = second.thumbnail.name, [i["name"] for i in second.thumbnail_variants["images"]]
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(thumbnail_storage().exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = Course.objects.get(pk=second.pk)
+            second.thumbnail = image_upload("new.png", (500, 300))
+            second.save()
+        self.assertFalse(thumbnail_storage().exists(name))
+        self.assertFalse(any(default_storage.exists(v) for v in variants))
+
+        name = second.thumbnail.name
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(thumbnail_storage().exists(name))
+
+    def test_recently_used_files_are_kept(self):
+        course = self.create("a.png")
+        with override_settings(THUMBNAIL_RELEASE_GRACE=600), self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertTrue(thumbnail_storage().exists(course.thumbnail.name))
+
+    def test_clean_thumbnails_rehashes_and_sweeps(self):
+        legacy = default_storage.save("course_thumbnails/legacy.png", image_upload("legacy.png", (400, 300)))
+        courses = [Course.objects.create(creator=self.creator, title=f"C{i}") for i in range(2)]
+        Course.objects.filter(pk__in=[c.pk for c in courses]).update(thumbnail=legacy)
+        orphan = thumbnail_storage().save("course_thumbnails/orphan.png", image_upload("o.png", (50, 50)))
+
+        out = StringIO()
+        call_command("clean_thumbnails", stdout=out)
+        self.assertIn("Moved 2 courses to hashed thumbnails, rendered 1 thumbnails", out.getvalue())
+        names = set(Course.objects.values_list("thumbnail", flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(thumbnail_storage().is_hashed(names.pop(), "course_thumbnails"))
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertFalse(thumbnail_storage().exists(orphan))
+        self.assertEqual(Course.objects.filter(thumbnail_variants={}).count(), 0)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.creator = User.objects.create_user(email="creator@example.com", password="pw", user_name="creator")
+        self.student = User.objects.create_user(email="student@example.com", password="pw", user_name="student")
+        self.course = Course.objects.create(creator=self.creator, title="Course")
+        self.data = bytes(range(256)) * 4
+        self.thumbnail = default_storage.save("course_thumbnails/ab/cover.png", ContentFile(self.data))
+        self.asset = default_storage.save(f"course_assets/{self.course.pk}/notes.pdf", ContentFile(b"%PDF notes"))
+
+    def get(self, name, **headers):
+        return self.client.get(f"/media/{name}", headers=headers)
+
+    def test_serves_public_files_with_ranges_and_cache_headers(self):
+        response = self.get(self.thumbnail)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["Content-Length"], "1024")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        etag = response["ETag"]
+
+        response = self.get(self.thumbnail, Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(b"".join(response.streaming_content), self.data[10:20])
+
+        response = self.get(self.thumbnail, Range="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), self.data[-4:])
+        response = self.get(self.thumbnail, Range="bytes=1000-5000")
+        self.assertEqual(response["Content-Range"], "bytes 1000-1023/1024")
+        self.assertEqual(self.get(self.thumbnail, Range="bytes=2000-").status_code, 416)
+        # A stale If-Range gets the whole file.
+        self.assertEqual(self.get(self.thumbnail, Range="bytes=0-1", **{"If-Range": '"old"'}).status_code, 200)
+        self.assertEqual(self.get(self.thumbnail, Range="bytes=0-1", **{"If-Range": etag}).status_code, 206)
+
+        self.assertEqual(self.get(self.thumbnail, **{"If-None-Match": etag}).status_code, 304)
+
+    def test_refuses_paths_outside_served_prefixes(self):
+        self.assertEqual(self.get("course_thumbnails/ab/missing.png").status_code, 404)
+        self.assertEqual(self.get(f"course_thumbnails/../course_assets/{self.course.pk}/notes.pdf").status_code, 404)
+        default_storage.save("private.txt", ContentFile(b"secret"))
+        self.assertEqual(self.get("private.txt").status_code, 404)
+
+    def test_course_assets_follow_player_entitlements(self):
+        self.assertEqual(self.get(self.asset).status_code, 401)
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.get(self.asset).status_code, 403)
+        Enrollment.objects.create(user=self.student, course=self.course)
+        response = self.get(self.asset)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+        self.client.force_authenticate(self.creator)
+        self.assertEqual(self.get(self.asset).status_code, 200)
+
+    def test_public_files_ignore_bad_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer expired")
+        self.assertEqual(self.get(self.thumbnail).status_code, 200)
+        self.assertEqual(self.get(self.asset).status_code, 401)
+
+    def test_signed_asset_urls(self):
+        url = f"/api/courses/{self.course.pk}/asset-url/?path=notes.pdf"
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertEqual(self.client.get(f"{url[:-len('notes.pdf')]}../x").status_code, 400)
+        signed = self.client.get(url).json()["url"]
+
+        # Fetched by a <video> tag: no credentials.
+        browser = APIClient()
+        response = browser.get(signed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF notes")
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+        self.assertEqual(browser.get(signed.replace("signature=", "signature=x")).status_code, 401)
+        with mock.patch("courses.media.time.time", return_value=time.time() + 2 * 60 * 60):
+            self.assertEqual(browser.get(signed).status_code, 401)
+
+    def test_offloads_to_front_proxy(self):
+        with override_settings(MEDIA_ACCEL="x-accel-redirect"):
+            response = self.get(self.thumbnail)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.thumbnail}")
+        self.assertEqual(response.content, b"")
+        with override_settings(MEDIA_ACCEL="x-sendfile"):
+            response = self.get(self.thumbnail)
+        self.assertEqual(response["X-Sendfile"], default_storage.path(self.thumbnail))
+
+
+class OrderingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.creator = User.objects.create_user(email="creator@example.com", password="pw", user_name="creator")
+        self.course = Course.objects.create(creator=self.creator, title="Course", description="d")
+        self.sections = [Section.objects.create(course=self.course, title=f"S{i}") for i in range(4)]
+
+    def orders(self, queryset=None):
+        queryset = queryset if queryset is not None else self.course.sections.all()
+        return dict(queryset.values_list("pk", "order"))
+
+    def titles(self):
+        return list(self.course.sections.values_list("title", flat=True))
+
+    def test_new_items_go_last_with_gaps(self):
+        self.assertEqual([s.order for s in self.sections], [ORDER_GAP * i for i in range(1, 5)])
+        section = self.sections[0]
+        chapters = [
+            Chapter.objects.create(section=section, title=f"C{i}", video_url="https://example.com/v", video_duration=1)
+            for i in range(2)
+        ]
+        self.assertEqual([c.order for c in chapters], [ORDER_GAP, 2 * ORDER_GAP])
+
+    def test_taken_order_inserts_before_holder_writing_one_row(self):
+        before = self.orders()
+        with CaptureQueriesContext(connection) as ctx:
+            new = Section.objects.create(course=self.course, title="New", order=self.sections[2].order)
+        self.assertEqual(new.order, ORDER_GAP * 5 // 2)
+        self.assertEqual(self.titles(), ["S0", "S1", "New", "S2", "S3"])
+        self.assertEqual({pk: order for pk, order in self.orders().items() if pk != new.pk}, before)
+        self.assertEqual(sum(q["sql"].startswith('UPDATE "courses_section"') for q in ctx.captured_queries), 0)
+
+    def test_exhausted_gap_rebalances(self):
+        for _ in range(12):
+            Section.objects.create(course=self.course, title="New", order=self.sections[1].order)
+        titles = self.titles()
+        self.assertEqual(titles[0], "S0")
+        self.assertEqual(titles[-3:], ["S1", "S2", "S3"])
+        self.assertEqual(len(set(self.orders().values())), 16)
+
+    def test_moving_an_item_within_its_parent(self):
+        # Neighbouring keys leave no gap, so the move needs a rebalance.
+        Section.objects.filter(pk=self.sections[1].pk).update(order=ORDER_GAP + 1)
+        last = Section.objects.get(pk=self.sections[3].pk)
+        last.order = ORDER_GAP + 1
+        last.save()
+        self.assertEqual(self.titles(), ["S0", "S3", "S1", "S2"])
+
+        self.client.force_authenticate(self.creator)
+        response = self.client.patch(f"/api/courses/sections/{self.sections[0].pk}/edit/", {"order": last.order})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(), ["S0", "S3", "S1", "S2"])
+        response = self.client.post("/api/courses/sections/create/", {"course": self.course.pk, "title": "End"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.titles()[-1], "End")
+
+    def test_reorder_endpoint(self):
+        url = f"/api/courses/{self.course.pk}/sections/reorder/"
+        ids = [s.pk for s in self.sections]
+        self.assertEqual(self.client.post(url, {"ids": ids[::-1]}, format="json").status_code, 401)
+        self.client.force_authenticate(self.creator)
+
+        before = self.orders()
+        response = self.client.post(url, {"ids": [ids[3]] + ids[:3]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item["id"] for item in response.json()], [ids[3]] + ids[:3])
+        self.assertEqual(self.titles(), ["S3", "S0", "S1", "S2"])
+        changed = [pk for pk, order in self.orders().items() if before[pk] != order]
+        self.assertEqual(changed, [ids[3]])
+
+        self.client.post(url, {"ids": ids[::-1]}, format="json")
+        self.assertEqual(self.titles(), ["S3", "S2", "S1", "S0"])
+        self.assertEqual([s["title"] for s in self.client.get(f"/api/courses/{self.course.pk}/").json()["sections"]],
+                         ["S3", "S2", "S1", "S0"])
+
+        for bad in (ids[:3], ids + [ids[0]], ids[:3] + [999999]):
+            self.assertEqual(self.client.post(url, {"ids": bad}, format="json").status_code, 400)
+
+        stranger = User.objects.create_user(email="s@example.com", password="pw", user_name="s")
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.client.post(url, {"ids": ids}, format="json").status_code, 403)
+
+    def test_reorder_chapters(self):
+        section = self.sections[0]
+        chapters = [
+            Chapter.objects.create(section=section, title=f"C{i}", video_url="https://example.com/v", video_duration=1)
+            for i in range(5)
+        ]
+        # Keys with no room between them force a rebalance.
+        for i, chapter in enumerate(chapters):
+            Chapter.objects.filter(pk=chapter.pk).update(order=i + 1)
+        ids = [c.pk for c in chapters]
+        new = [ids[1], ids[0], ids[3], ids[2], ids[4]]
+        self.client.force_authenticate(self.creator)
+        response = self.client.post(f"/api/courses/sections/{section.pk}/chapters/reorder/", {"ids": new}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(section.chapters.values_list("pk", flat=True)), new)
+        self.assertEqual(list(section.chapters.values_list("order", flat=True)), [ORDER_GAP * i for i in range(1, 6)])
+
+
+@override_settings(ROOT_URLCONF="backend.asgi_urls")
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.creator = User.objects.create_user(email="creator@example.com", password="pw", user_name="creator")
+        self.student = User.objects.create_user(email="student@example.com", password="pw", user_name="student")
+        self.stranger = User.objects.create_user(email="stranger@example.com", password="pw", user_name="stranger")
+        self.course = make_course(self.creator, sections=1, chapters=2)
+        make_course(self.creator, "Second", sections=1, chapters=1)
+        Enrollment.objects.create(user=self.student, course=self.course)
+
+    def headers(self, user):
+        return {"Authorization": f"Bearer {RoleRefreshToken.for_user(user).access_token}"} if user else {}
+
+    def compare(self, url, user=None, **headers):
+        """The async view's response, after checking it matches the DRF view's."""
+        headers.update(self.headers(user))
+        with self.settings(ROOT_URLCONF="backend.urls"):
+            expected = APIClient().get(url, headers=headers)
+        response = async_to_sync(AsyncClient().get)(url, headers=headers)
+        self.assertTrue(response.resolver_match.func.view_class.__name__.startswith("Async"))
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        for header in ("ETag", "WWW-Authenticate"):
+            self.assertEqual(response.get(header), expected.get(header))
+        return response
+
+    def test_routed_to_async_views(self):
+        match = resolve(f"/api/courses/{self.course.pk}/", "backend.asgi_urls")
+        self.assertIs(match.func.view_class, AsyncCourseDetailView)
+        self.assertIs(resolve("/api/courses/create/", "backend.asgi_urls").func.view_class, CourseCreateView)
+
+    def test_async_routing_is_opt_in(self):
+        from django.core.handlers.asgi import ASGIHandler
+
+        from backend.asgi import application
+
+        self.assertIs(type(application), ASGIHandler)
+
+    def test_responses_match_sync_views(self):
+        detail = f"/api/courses/{self.course.pk}/"
+        player = f"{detail}player/"
+        self.assertNotIn("video_url", self.compare(detail).json()["sections"][0]["chapters"][0])
+        self.assertIn("video_url", self.compare(detail, self.student).json()["sections"][0]["chapters"][0])
+        self.compare(detail, self.stranger)
+        self.compare("/api/courses/999999/")
+
+        self.assertEqual(self.compare(player, self.student).status_code, 200)
+        self.compare(player, self.creator)
+        self.assertEqual(self.compare(player).status_code, 401)
+        self.assertEqual(self.compare(player, self.stranger).status_code, 403)
+        self.assertEqual(self.compare("/api/courses/999999/player/", self.student).status_code, 404)
+        self.assertEqual(self.compare(player, Authorization="Bearer junk").status_code, 401)
+
+        self.assertEqual(len(self.compare("/api/courses/my-enrollments/", self.student).json()), 1)
+        self.assertEqual(self.compare("/api/courses/my-enrollments/").status_code, 401)
+
+    def test_catalog_pages_match_sync_view(self):
+        page = self.compare("/api/courses/catalog/?page_size=1").json()
+        following = self.compare(page["next"]).json()
+        self.assertNotEqual(page["results"], following["results"])
+        self.compare(following["previous"])
+        self.compare(f"/api/courses/catalog/?creator={self.creator.pk}&min_hours=0&published=true")
+        self.assertEqual(self.compare("/api/courses/catalog/?max_hours=lots").status_code, 400)
+
+    def test_conditional_get(self):
+        url = f"/api/courses/{self.course.pk}/player/"
+        etag = self.compare(url, self.student)["ETag"]
+        self.assertEqual(self.compare(url, self.student, **{"If-None-Match": etag}).status_code, 304)
@@ -0,0 +1,323 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Course
+from .storage import thumbnail_storage
+
+logger = logging.getLogger("courses.thumbnails")
+
+THUMBNAILS_DIR = "course_thumbnails"
+VARIANTS_DIR = "course_thumbnails/variants"
+# Variant format -> (Pillow format, MIME type, save options).
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# EXIF orientations that swap width and height.
+_ROTATED = {5, 6, 7, 8}
+
+
+def variant_name(source, width, fmt):
+    # The same bytes uploaded as x.png and x.jpg get the same digest, so the
+    # source extension is part of the name: x.png -> x-png-320.webp.
+    stem = os.path.basename(source).replace(".", "-")
+    return f"{VARIANTS_DIR}/{stem}-{width}.{fmt}"
+
+
+def render_variants(source, force=False):
+    """
+    Render the fixed-width variants of a stored image and return the record
+    kept in Course.thumbnail_variants. Images are never upscaled; variants
+    that already exist (e.g. of a thumbnail shared by several courses) are
+    reused without decoding the image unless `force` is set.
+    """
+    with thumbnail_storage().open(source, "rb") as f:
+        image = Image.open(f)
+        width, height = image.size
+        rotated = image.getexif().get(0x0112) in _ROTATED
+        if rotated:
+            width, height = height, width
+        widths = [w for w in settings.THUMBNAIL_WIDTHS if w <= width] or [width]
+        images = [
+            {
+                "format": fmt,
+                "width": w,
+                "height": max(1, round(height * w / width)),
+                "name": variant_name(source, w, fmt),
+            }
+            for w in widths
+            for fmt in FORMATS
+        ]
+        missing = [entry for entry in images if force or not default_storage.exists(entry["name"])]
+        if missing:
+            # JPEGs can be decoded at a fraction of their size, which is much
+            # cheaper than decoding in full and scaling down.
+            target = (max(widths), max(widths) * height // width)
+            image.draft("RGB", target[::-1] if rotated else target)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            mode = "RGBA" if has_alpha else "RGB"
+            if image.mode != mode:
+                image = image.convert(mode)
+
+    # Largest first, each width scaled down from the previous one rather
+    # than from the full-size image.
+    for entry in sorted(missing, key=lambda entry: -entry["width"]):
+        size = (entry["width"], entry["height"])
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        pil_format, _, options = FORMATS[entry["format"]]
+        buffer = BytesIO()
+        _for_format(image, entry["format"]).save(buffer, pil_format, **options)
+        entry["name"] = default_storage.save(entry["name"], ContentFile(buffer.getvalue()))
+    return {"source": source, "width": width, "height": height, "images": images}
+
+
+def _for_format(image, fmt):
+    if fmt == "jpeg" and image.mode == "RGBA":
+        # JPEG has no alpha channel; flatten onto white.
+        flat = Image.new("RGB", image.size, "white")
+        flat.paste(image, mask=image.getchannel("A"))
+        return flat
+    return image
+
+
+def _has_thumbnail(source):
+    return Q(thumbnail=source) if source else Q(thumbnail="") | Q(thumbnail__isnull=True)
+
+
+def process_course(course_id):
+    """Bring a course's variants up to date with its thumbnail. Returns whether they changed."""
+    from .outlines import bump_version
+
+    course = Course.objects.filter(pk=course_id).values("thumbnail", "thumbnail_variants").first()
+    if course is None:
+        return False
+    source = course["thumbnail"] or ""
+    if course["thumbnail_variants"].get("source", "") == source:
+        return False
+    record = render_variants(source) if source else {}
+    # If the thumbnail changed meanwhile, that save scheduled its own run.
+    if not Course.objects.filter(_has_thumbnail(source), pk=course_id).update(thumbnail_variants=record):
+        return False
+    bump_version(course_id)
+    return True
+
+
+def backfill(force=False, workers=4, batch_size=1000):
+    """
+    Render the variants of every course whose variants are missing or stale
+    (all of them with `force`). Each distinct thumbnail is rendered once, in
+    a pool of `workers` threads, and its record is written to every course
+    using it. Returns (thumbnails rendered, courses updated, failures).
+    """
+    from .outlines import bump_version
+
+    by_source = {}
+    for pk, source, variants in Course.objects.values_list("pk", "thumbnail", "thumbnail_variants").iterator():
+        source = source or ""
+        if variants.get("source", "") != source or (force and source):
+            by_source.setdefault(source, []).append(pk)
+
+    def save(source, record):
+        ids = by_source[source]
+        count = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            count += Course.objects.filter(_has_thumbnail(source), pk__in=batch).update(thumbnail_variants=record)
+            bump_version(*batch)
+        return count
+
+    # Courses whose thumbnail was removed just lose their variants.
+    updated = save("", {}) if "" in by_source else 0
+    rendered = failures = 0
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="thumbnails") as pool:
+        futures = {pool.submit(render_variants, source, force): source for source in by_source if source}
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                record = future.result()
+            except Exception:
+                logger.exception("Rendering the variants of %s failed", source)
+                failures += 1
+                continue
+            rendered += 1
+            updated += save(source, record)
+    return rendered, updated, failures
+
+
+def release_thumbnail(source, record=None):
+    """
+    Delete a thumbnail and its variants if no course uses it any more.
+    Returns whether it was deleted.
+
+    The reference count is read from the courses table, so it can't drift.
+    A blob saved or reused within THUMBNAIL_RELEASE_GRACE seconds is kept:
+    an upload of the same image may be about to reference it. Those are
+    left for clean_thumbnails.
+    """
+    storage = thumbnail_storage()
+    if (
+        not source
+        or Course.objects.filter(thumbnail=source).exists()
+        or _recent(storage, source, settings.THUMBNAIL_RELEASE_GRACE)
+    ):
+        return False
+    storage.delete(source)
+    names = {variant_name(source, w, fmt) for w in settings.THUMBNAIL_WIDTHS for fmt in FORMATS}
+    if record and record.get("source") == source:
+        names.update(entry["name"] for entry in record["images"])
+    for name in names:
+        default_storage.delete(name)
+    return True
+
+
+def schedule_release(source, record=None):
+    transaction.on_commit(lambda: release_thumbnail(source, record))
+
+
+def rehash_thumbnails():
+    """
+    Move thumbnails saved before content addressing to hashed names, merging
+    duplicates. Their courses get new variants from backfill(). Returns the
+    number of courses moved.
+    """
+    storage = thumbnail_storage()
+    legacy = (
+        Course.objects.exclude(_has_thumbnail(""))
+        .values_list("thumbnail", flat=True)
+        .distinct()
+    )
+    moved = 0
+    for name in [name for name in legacy if not storage.is_hashed(name, THUMBNAILS_DIR)]:
+        if not storage.exists(name):
+            logger.warning("Thumbnail %s is missing; leaving its courses alone", name)
+            continue
+        with storage.open(name, "rb") as f:
+            hashed = storage.save(name, f)
+        moved += Course.objects.filter(thumbnail=name).update(thumbnail=hashed, thumbnail_variants={})
+        release_thumbnail(name)
+    return moved
+
+
+def sweep_thumbnails():
+    """
+    Delete hashed thumbnails and variants no course uses, past the grace
+    period. Returns the number of files deleted.
+    """
+    storage = thumbnail_storage()
+    grace = settings.THUMBNAIL_RELEASE_GRACE
+    used = {
+        name for name in Course.objects.exclude(_has_thumbnail("")).values_list("thumbnail", flat=True).distinct()
+    }
+    used_variants = {
+        entry["name"]
+        for record in Course.objects.exclude(thumbnail_variants={}).values_list("thumbnail_variants", flat=True)
+        for entry in record.get("images", [])
+    }
+    deleted = 0
+    directories, _ = storage.listdir(THUMBNAILS_DIR) if storage.exists(THUMBNAILS_DIR) else ([], [])
+    for directory in directories:
+        for filename in storage.listdir(f"{THUMBNAILS_DIR}/{directory}")[1]:
+            name = f"{THUMBNAILS_DIR}/{directory}/{filename}"
+            if storage.is_hashed(name, THUMBNAILS_DIR) and name not in used and not _recent(storage, name, grace):
+                storage.delete(name)
+                deleted += 1
+    if default_storage.exists(VARIANTS_DIR):
+        for filename in default_storage.listdir(VARIANTS_DIR)[1]:
+            name = f"{VARIANTS_DIR}/{filename}"
+            if name not in used_variants and not _recent(default_storage, name, grace):
+                default_storage.delete(name)
+                deleted += 1
+    return deleted
+
+
+def _recent(storage, name, seconds):
+    try:
+        return (timezone.now() - storage.get_modified_time(name)).total_seconds() < seconds
+    except FileNotFoundError:
+        return False
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def schedule_variants(course_id):
+    """Render the course's variants in the worker pool once the transaction commits."""
+    transaction.on_commit(lambda: _submit(course_id))
+
+
+def _submit(course_id):
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        _run(course_id)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.THUMBNAIL_WORKERS, thread_name_prefix="thumbnails")
+    _executor.submit(_run, course_id)
+
+
+def _run(course_id):
+    try:
+        process_course(course_id)
+    except Exception:
+        logger.exception("Rendering the thumbnail variants of course %s failed", course_id)
+    finally:
+        if settings.THUMBNAIL_WORKERS:
+            connection.close()
+
+
+def thumbnail_set(record, build_url=None):
+    """
+    What clients need to pick a variant: the card-sized JPEG as `src` plus a
+    srcset per MIME type, or None until the variants exist.
+    """
+    images = sorted(record.get("images") or [], key=lambda entry: entry["width"])
+    if not images:
+        return None
+
+    def url(name):
+        url = default_storage.url(name)
+        return build_url(url) if build_url else url
+
+    srcset = {}
+    for entry in images:
+        srcset.setdefault(FORMATS[entry["format"]][1], []).append(f"{url(entry['name'])} {entry['width']}w")
+    jpegs = [entry for entry in images if entry["format"] == "jpeg"]
+    card = next((entry for entry in jpegs if entry["width"] >= settings.THUMBNAIL_CARD_WIDTH), jpegs[-1])
+    return {
+        "src": url(card["name"]),
+        "width": card["width"],
+        "height": card["height"],
+        "srcset": {mime: ", ".join(candidates) for mime, candidates in srcset.items()},
+    }
+
+
+def absolute_thumbnail_set(value, build_url):
+    """Make the URLs of a thumbnail_set() built without a request absolute."""
+    if not value:
+        return value
+
+    def srcset(candidates):
+        pairs = (candidate.rsplit(" ", 1) for candidate in candidates.split(", "))
+        return ", ".join(f"{build_url(url)} {width}" for url, width in pairs)
+
+    return {
+        **value,
+        "src": build_url(value["src"]),
+        "srcset": {mime: srcset(candidates) for mime, candidates in value["srcset"].items()},
+    }
@@ -1,39 +1,76 @@
 from django.urls import path
 from .views import (
     CourseListView,
+    CourseCatalogView,
+    CourseSearchView,
+    CourseAutocompleteView,
     CourseDetailView,
     CourseCreateView,
     CourseUpdateView,
+    CourseImportView,
     EnrollView,
+    CourseCohortEnrollView,
     SectionCreateView,
     SectionUpdateView,
+    SectionReorderView,
     ChapterCreateView,
     ChapterUpdateView,
+    ChapterReorderView,
+    ChapterProgressView,
     CoursePlayerView,
+    CourseProgressView,
+    HeartbeatView,
     MyEnrollmentsView,
     MyCoursesView,
     CourseViewSet
 )
+from .media import CourseAssetURLView
+from .async_views import (
+    AsyncCourseCatalogView,
+    AsyncCourseDetailView,
+    AsyncCoursePlayerView,
+    AsyncMyEnrollmentsView,
+)
 
 urlpatterns = [
     path("", CourseListView.as_view()),
+    path("catalog/", CourseCatalogView.as_view()),
+    path("search/", CourseSearchView.as_view()),
+    path("autocomplete/", CourseAutocompleteView.as_view()),
     path("my-courses/", MyCoursesView.as_view()),
     path("<int:pk>/", CourseDetailView.as_view()),
     path("create/", CourseCreateView.as_view()),
     path("<int:pk>/edit/", CourseUpdateView.as_view()),
+    path("<int:pk>/import/", CourseImportView.as_view()),
 
     path("enroll/", EnrollView.as_view()),
+    path("<int:pk>/enroll-cohort/", CourseCohortEnrollView.as_view()),
 
 
     path("sections/create/", SectionCreateView.as_view()),
     path("sections/<int:pk>/edit/", SectionUpdateView.as_view()),
+    path("<int:pk>/sections/reorder/", SectionReorderView.as_view()),
 
 
     path("chapters/create/", ChapterCreateView.as_view()),
     path("chapters/<int:pk>/edit/", ChapterUpdateView.as_view()),
+    path("sections/<int:pk>/chapters/reorder/", ChapterReorderView.as_view()),
+    path("chapters/<int:pk>/complete/", ChapterProgressView.as_view()),
 
 
     path("<int:pk>/player/", CoursePlayerView.as_view()),
+    path("<int:pk>/progress/", CourseProgressView.as_view()),
+    path("<int:pk>/asset-url/", CourseAssetURLView.as_view()),
+    path("<int:pk>/heartbeat/", HeartbeatView.as_view()),
     path("my-enrollments/", MyEnrollmentsView.as_view()),
 
 ]
+
+# Native async views of the read endpoints; backend.asgi_urls puts them in
+# front of the routes above when serving with ASGI.
+async_urlpatterns = [
+    path("catalog/", AsyncCourseCatalogView.as_view()),
+    path("<int:pk>/", AsyncCourseDetailView.as_view()),
+    path("<int:pk>/player/", AsyncCoursePlayerView.as_view()),
+    path("my-enrollments/", AsyncMyEnrollmentsView.as_view()),
+]
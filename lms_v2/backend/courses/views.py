@@ -1,33 +1,138 @@
+import codecs
+
+from django.db import transaction
 from django.shortcuts import render
-from rest_framework import generics, permissions
-from .models import Course, Enrollment, Section, Chapter
-from .serializers import CourseSerializer, EnrollmentSerializer, SectionSerializer, ChapterSerializer, MyEnrollmentSerializer
-from .permissions import IsCreator, IsCourseCreator, CanViewCourseContent, CanEnroll
-from rest_framework.exceptions import PermissionDenied
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from .models import Course, Enrollment, Section, Chapter, PlaybackPosition
+from .serializers import CourseSerializer, CourseSummarySerializer, CourseOutlineSerializer, CohortEnrollmentSerializer, EnrollmentSerializer, ProgressSerializer, CourseProgressSerializer, HeartbeatSerializer, SectionSerializer, ChapterSerializer, MyEnrollmentSerializer, ReorderSerializer
+from .importers import import_outline, parse_outline_csv
+from .enrollment import cached_enrollment_id, enroll, enroll_cohort
+from .heartbeats import heartbeats
+from .progress import record_progress
+from accounts.permissions import IsCreatorRole
+from .permissions import IsCourseCreator, CanManageCourseContent, CanViewCourseContent
+from .access import CourseAccess
+from .pagination import CatalogCursorPagination, SearchPagination
+from .search import schedule_reindex, search_course_ids
+from .autocomplete import get_index
+from .outlines import bump_version, get_outline, render_outline
+from .ordering import lock_parent, reorder
+from .conditional import catalog_validators, course_validators
+from django.http import Http404
+from rest_framework.exceptions import PermissionDenied, ValidationError
 # Create your views here.
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 class CourseViewSet(ReadOnlyModelViewSet):
-    queryset = Course.objects.all()
+    queryset = Course.objects.with_tree()
     serializer_class = CourseSerializer
 # List all courses
 class CourseListView(generics.ListAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.with_tree()
     serializer_class = CourseSerializer
     permission_classes = [permissions.AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        validators = catalog_validators(request)
+        return validators.not_modified(request) or validators.apply(
+            super().list(request, *args, **kwargs)
+        )
+
+
+# Paginated catalog with summary cards (no nested sections/chapters)
+def catalog_queryset(params):
+    """The catalog filtered by the query parameters; shared with the async view."""
+    queryset = Course.objects.select_related("creator")
+
+    if params.get("published", "").lower() in ("1", "true", "yes"):
+        queryset = queryset.filter(is_published=True)
+    filters = [
+        ("creator", "creator_id", int),
+        ("min_hours", "total_hours__gte", float),
+        ("max_hours", "total_hours__lte", float),
+    ]
+    for name, lookup, cast in filters:
+        if params.get(name):
+            try:
+                queryset = queryset.filter(**{lookup: cast(params[name])})
+            except ValueError:
+                raise ValidationError({name: "Must be a number."})
+    return queryset
+
+
+class CourseCatalogView(generics.ListAPIView):
+    serializer_class = CourseSummarySerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = CatalogCursorPagination
+
+    def get_queryset(self):
+        return catalog_queryset(self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        # Summary cards carry no per-user fields, so one ETag fits everyone.
+        validators = catalog_validators(request, per_user=False)
+        return validators.not_modified(request) or validators.apply(
+            super().list(request, *args, **kwargs)
+        )
+
+
+# Full-text search over titles, descriptions and outlines, best match first
+class CourseSearchView(generics.ListAPIView):
+    serializer_class = CourseSummarySerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = SearchPagination
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This parameter is required."})
+        published_only = request.query_params.get("published", "").lower() in ("1", "true", "yes")
+
+        ids = self.paginator.paginate_search(
+            lambda limit, offset: search_course_ids(query, limit, offset, published_only), request
+        )
+        courses = Course.objects.select_related("creator").in_bulk(ids)
+        ranked = [courses[pk] for pk in ids if pk in courses]
+        return self.get_paginated_response(self.get_serializer(ranked, many=True).data)
+
+
+class CourseAutocompleteView(generics.GenericAPIView):
+    # Served from the in-process index: no database queries once it's built.
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 8))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        if limit < 1:
+            raise ValidationError({"limit": "Must be at least 1."})
+        suggestions = get_index().suggest(request.query_params.get("q", ""), limit)
+        return Response({"results": suggestions})
+
 
 # Course detail (Udemy-style structure)
 class CourseDetailView(generics.RetrieveAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.with_tree()
     serializer_class = CourseSerializer
     permission_classes = [permissions.AllowAny]
 
+    def retrieve(self, request, *args, **kwargs):
+        # Served from the cached outline; only redaction is done per request.
+        outline = get_outline(kwargs["pk"])
+        if outline is None:
+            raise Http404
+        validators = course_validators(request, kwargs["pk"], outline["creator_id"])
+        return validators.not_modified(request) or validators.apply(
+            Response(render_outline(outline, request))
+        )
+
 
 # Create course (CREATOR only)
 class CourseCreateView(generics.CreateAPIView):
     serializer_class = CourseSerializer
-    permission_classes = [permissions.IsAuthenticated, IsCreator]
+    permission_classes = [permissions.IsAuthenticated, IsCreatorRole]
 
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
@@ -35,18 +140,80 @@ class CourseCreateView(generics.CreateAPIView):
 
 # Update course (only creator)
 class CourseUpdateView(generics.UpdateAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.with_tree()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated, IsCourseCreator]
 
 
+# Import a whole outline (sections + chapters) in one transaction
+class CourseImportView(generics.GenericAPIView):
+    queryset = Course.objects.all()
+    serializer_class = CourseOutlineSerializer
+    permission_classes = [permissions.IsAuthenticated, IsCourseCreator]
+
+    def post(self, request, *args, **kwargs):
+        course = self.get_object()
+        data = request.data
+        upload = request.FILES.get("file")
+        if upload is not None:
+            # utf-8-sig drops the byte-order mark spreadsheet exports start with.
+            try:
+                data = parse_outline_csv(codecs.iterdecode(upload, "utf-8-sig"))
+            except UnicodeDecodeError:
+                raise ValidationError({"file": ["CSV must be UTF-8 encoded."]})
+            data["replace"] = request.data.get("replace", False)
+
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        result = import_outline(
+            course,
+            serializer.validated_data["sections"],
+            replace=serializer.validated_data["replace"],
+        )
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
 # Enroll in course (STUDENT or CREATOR)
 class EnrollView(generics.CreateAPIView):
     serializer_class = EnrollmentSerializer
-    permission_classes = [permissions.IsAuthenticated, CanEnroll]
+    permission_classes = [permissions.IsAuthenticated]
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    def create(self, request, *args, **kwargs):
+        try:
+            course_id = int(request.data.get("course"))
+        except (TypeError, ValueError):
+            raise ValidationError({"course": "A valid course id is required."})
+
+        # One idempotent INSERT on the common path; the database settles races.
+        enrollment = enroll(request.user, course_id)
+        if enrollment is not None:
+            return Response(self.get_serializer(enrollment).data, status=status.HTTP_201_CREATED)
+
+        existing = Enrollment.objects.filter(user=request.user, course_id=course_id).first()
+        if existing is not None:
+            return Response(self.get_serializer(existing).data, status=status.HTTP_200_OK)
+        if CourseAccess.for_request(request).course(course_id) is None:
+            raise Http404
+        raise PermissionDenied("You can't enroll in your own course")
+
+
+# Bulk-enroll a cohort of users (course owner or superuser)
+class CourseCohortEnrollView(generics.GenericAPIView):
+    queryset = Course.objects.all()
+    serializer_class = CohortEnrollmentSerializer
+    permission_classes = [permissions.IsAuthenticated, CanManageCourseContent]
+
+    def post(self, request, *args, **kwargs):
+        course = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        enrolled, skipped = enroll_cohort(course, serializer.validated_data["users"])
+        by_email = enroll_cohort(course, serializer.validated_data["emails"], field="email")
+        return Response(
+            {"enrolled": enrolled + by_email[0], "skipped": skipped + by_email[1]},
+            status=status.HTTP_201_CREATED,
+        )
 
 class SectionCreateView(generics.CreateAPIView):
     serializer_class = SectionSerializer
@@ -54,19 +221,20 @@ class SectionCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         course = serializer.validated_data["course"]
-        if course.creator != self.request.user:
-            raise permissions.PermissionDenied("Not your course")
+        if not CourseAccess.for_request(self.request).can_manage(course):
+            raise PermissionDenied("Not your course")
         serializer.save()
 
 class SectionUpdateView(generics.UpdateAPIView):
-    queryset = Section.objects.all()
+    queryset = Section.objects.select_related("course")
     serializer_class = SectionSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, CanManageCourseContent]
 
     def perform_update(self, serializer):
-        section = self.get_object()
-        if section.course.creator != self.request.user:
-            raise permissions.PermissionDenied("Not your course")
+        # Moving a section to another course needs rights on that one too.
+        course = serializer.validated_data.get("course", serializer.instance.course)
+        if not CourseAccess.for_request(self.request).can_manage(course):
+            raise PermissionDenied("Not your course")
         serializer.save()
 
 class ChapterCreateView(generics.CreateAPIView):
@@ -75,54 +243,154 @@ class ChapterCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         section = serializer.validated_data["section"]
-        if section.course.creator != self.request.user:
-            raise permissions.PermissionDenied("Not your course")
+        if not CourseAccess.for_request(self.request).can_manage(section):
+            raise PermissionDenied("Not your course")
         serializer.save()
 
 class ChapterUpdateView(generics.UpdateAPIView):
-    queryset = Chapter.objects.all()
+    queryset = Chapter.objects.select_related("section__course")
     serializer_class = ChapterSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, CanManageCourseContent]
 
     def perform_update(self, serializer):
-        chapter = self.get_object()
-        if chapter.section.course.creator != self.request.user:
-            raise permissions.PermissionDenied("Not your course")
+        section = serializer.validated_data.get("section", serializer.instance.section)
+        if not CourseAccess.for_request(self.request).can_manage(section):
+            raise PermissionDenied("Not your course")
         serializer.save()
 
+
+# Apply a new order to all of a course's sections or a section's chapters
+class ReorderView(generics.GenericAPIView):
+    serializer_class = ReorderSerializer
+    permission_classes = [permissions.IsAuthenticated, CanManageCourseContent]
+    # Subclasses name the parent, the model of its items and their FK to it.
+    parent_model = None
+    item_model = None
+    parent_field = None
+
+    def post(self, request, *args, **kwargs):
+        parent = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            lock_parent(self.parent_model, parent.pk)
+            items = self.item_model.objects.filter(**{self.parent_field: parent})
+            keys = reorder(items, serializer.validated_data["ids"])
+            if keys is None:
+                raise ValidationError({"ids": "Must list every item exactly once."})
+        # Written in bulk, without signals.
+        course_id = parent.pk if isinstance(parent, Course) else parent.course_id
+        bump_version(course_id)
+        schedule_reindex(course_id)
+        return Response([{"id": pk, "order": key} for pk, key in keys.items()])
+
+
+class SectionReorderView(ReorderView):
+    queryset = Course.objects.all()
+    parent_model = Course
+    item_model = Section
+    parent_field = "course"
+
+
+class ChapterReorderView(ReorderView):
+    queryset = Section.objects.select_related("course")
+    parent_model = Section
+    item_model = Chapter
+    parent_field = "section"
+
+
+# Mark a chapter completed (POST) or not (DELETE) for the enrolled user
+class ChapterProgressView(generics.GenericAPIView):
+    queryset = Chapter.objects.select_related("section__course")
+    serializer_class = ProgressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        return self.record(request, done=True)
+
+    def delete(self, request, *args, **kwargs):
+        return self.record(request, done=False)
+
+    def record(self, request, done):
+        chapter = self.get_object()
+        enrollment = record_progress(request.user, chapter.section.course, chapter.position, done)
+        if enrollment is None:
+            raise PermissionDenied("You are not enrolled in course")
+        return Response(self.get_serializer(enrollment).data)
+
+
+# The user's progress in one course, with where to resume each chapter
+class CourseProgressView(generics.RetrieveAPIView):
+    serializer_class = CourseProgressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        enrollment = Enrollment.objects.select_related("course").filter(
+            user=self.request.user, course_id=self.kwargs["pk"]
+        ).first()
+        if enrollment is None:
+            raise PermissionDenied("You are not enrolled in course")
+        enrollment.resume_at = dict(
+            PlaybackPosition.objects.filter(enrollment=enrollment).values_list("chapter_id", "seconds")
+        )
+        # Heartbeats this process hasn't flushed yet are newer.
+        enrollment.resume_at.update(heartbeats.latest(enrollment.pk))
+        return enrollment
+
+
+# Player heartbeat: buffered in memory and upserted in batches
+class HeartbeatView(generics.GenericAPIView):
+    serializer_class = HeartbeatSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        chapter_id = serializer.validated_data["chapter"]
+
+        # Both checks are answered from the cache in the steady state.
+        enrollment_id = cached_enrollment_id(request.user.pk, pk)
+        if enrollment_id is None:
+            raise PermissionDenied("You are not enrolled in course")
+        outline = get_outline(pk)
+        if outline is None:
+            # Deleted while the enrollment id was still cached.
+            raise Http404
+        chapter_ids = {
+            chapter["id"] for section in outline["data"]["sections"] for chapter in section["chapters"]
+        }
+        if chapter_id not in chapter_ids:
+            raise ValidationError({"chapter": "Not a chapter of this course."})
+
+        heartbeats.add(enrollment_id, chapter_id, serializer.validated_data["seconds"])
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
 class CoursePlayerView(generics.RetrieveAPIView):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    # CanViewCourseContent answers from the request's CourseAccess, which the
+    # outline overlay below reuses: the course row and one enrollment query.
     permission_classes = [permissions.IsAuthenticated, CanViewCourseContent]
 
-    def get_object(self):
-        course = super().get_object()
-        user = self.request.user
-
-        if course.creator == user or user.is_superuser:
-            return course
-        
-        enrolled = Enrollment.objects.filter(
-            user=user,
-            course = course
-        ).exists()
-
-        if not enrolled:
-            raise PermissionDenied("You are not enrolled in course")
-        
-        return course
+    def retrieve(self, request, *args, **kwargs):
+        course = self.get_object()
+        validators = course_validators(request, course.pk, course.creator_id)
+        return validators.not_modified(request) or validators.apply(
+            Response(render_outline(get_outline(course.pk), request))
+        )
     
 class MyEnrollmentsView(generics.ListAPIView):
     serializer_class = MyEnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Enrollment.objects.filter(user=self.request.user)
+        return Enrollment.objects.filter(user=self.request.user).select_related("course")
 
 # Get creator's own courses
 class MyCoursesView(generics.ListAPIView):
     serializer_class = CourseSerializer
-    permission_classes = [permissions.IsAuthenticated, IsCreator]
+    permission_classes = [permissions.IsAuthenticated, IsCreatorRole]
 
     def get_queryset(self):
-        return Course.objects.filter(creator=self.request.user)
+        return Course.objects.with_tree().filter(creator=self.request.user)
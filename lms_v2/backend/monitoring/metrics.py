@@ -0,0 +1,80 @@
+import bisect
+import threading
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return ",".join(f'{k}="{v}"' for k, v in escaped)
+
+
+class Registry:
+    """Thread-safe in-process store of counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = defaultdict(float)
+            self._help = {}
+
+    def observe(self, name, help_text, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help[name] = ("histogram", help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, help_text, labels, amount=1):
+        with self._lock:
+            self._help[name] = ("counter", help_text)
+            self._counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            series = defaultdict(list)
+            for (name, labels), histogram in self._histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    le = _labels(labels + (("le", bound),))
+                    series[name].append(f"{name}_bucket{{{le}}} {cumulative}")
+                series[name].append(f"{name}_sum{{{_labels(labels)}}} {histogram.sum}")
+                series[name].append(f"{name}_count{{{_labels(labels)}}} {histogram.count}")
+            for (name, labels), value in self._counters.items():
+                series[name].append(f"{name}{{{_labels(labels)}}} {value}")
+
+            lines = []
+            for name in sorted(series):
+                kind, help_text = self._help[name]
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += series[name]
+            return "\n".join(lines) + "\n"
+
+
+registry = Registry()
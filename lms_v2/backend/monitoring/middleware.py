@@ -0,0 +1,141 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .metrics import QUERY_COUNT_BUCKETS, registry
+
+logger = logging.getLogger("monitoring")
+
+# Stats of the request currently being handled, or None when not sampled.
+current_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a connection execute_wrapper for the request.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+
+class InstrumentationMiddleware:
+    """
+    Records per-view latency, DB query count and time, and serializer time,
+    and flags requests that run the same SQL statement repeatedly (N+1).
+    Only a METRICS_SAMPLE_RATE fraction of requests is measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, stats)
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        # The async ORM runs a request's queries in one worker thread, whose
+        # connections are the ones to wrap.
+        stack = ExitStack()
+        try:
+            await sync_to_async(self.wrap_connections)(stack, stats)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_stats.reset(token)
+
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def sampled(self, request):
+        return request.path != "/metrics/" and random.random() < settings.METRICS_SAMPLE_RATE
+
+    def wrap_connections(self, stack, stats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.route if match else "unmatched"
+        labels = {"view": view, "method": request.method}
+
+        registry.observe(
+            "lms_request_duration_seconds", "Request latency by view.",
+            {**labels, "status": response.status_code}, elapsed,
+        )
+        registry.observe(
+            "lms_db_queries", "Database queries per request.",
+            labels, stats.queries, QUERY_COUNT_BUCKETS,
+        )
+        registry.observe("lms_db_duration_seconds", "Database time per request.", labels, stats.db_time)
+        if stats.serializer_time:
+            registry.observe(
+                "lms_serializer_duration_seconds", "Serializer time per request.",
+                labels, stats.serializer_time,
+            )
+
+        sql, repeats = stats.statements.most_common(1)[0] if stats.statements else ("", 0)
+        duplicated = repeats >= settings.METRICS_DUPLICATE_QUERY_THRESHOLD
+        if duplicated:
+            registry.inc(
+                "lms_duplicate_query_requests_total",
+                "Requests that repeated one SQL statement at least the threshold number of times.",
+                labels,
+            )
+            logger.warning("Possible N+1 in %s %s: %d x %s", request.method, view, repeats, sql)
+
+        if settings.METRICS_LOG_REQUESTS:
+            logger.info(json.dumps({
+                "view": view,
+                "method": request.method,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 3),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 3),
+                "serializer_ms": round(stats.serializer_time * 1000, 3),
+                "duplicate_queries": duplicated,
+            }))
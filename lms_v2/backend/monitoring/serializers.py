@@ -0,0 +1,24 @@
+import time
+
+from .middleware import current_stats
+
+
+class InstrumentedSerializerMixin:
+    """
+    Adds the time spent in the outermost to_representation() call to the
+    sampled request's serializer time. Nested serializers are not counted
+    twice.
+    """
+
+    def to_representation(self, instance):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializing = False
@@ -0,0 +1,69 @@
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import include, path
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from courses.models import Course
+from .metrics import registry
+
+
+def repeat_queries(request):
+    for _ in range(3):
+        User.objects.filter(pk=1).exists()
+    return HttpResponse()
+
+
+async def repeat_queries_async(request):
+    for _ in range(3):
+        await User.objects.filter(pk=1).aexists()
+    return HttpResponse()
+
+
+urlpatterns = [
+    path("repeat/", repeat_queries),
+    path("repeat-async/", repeat_queries_async),
+    path("metrics/", include("monitoring.urls")),
+]
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        creator = User.objects.create_user(email="c@example.com", password="pw", user_name="c")
+        Course.objects.create(creator=creator, title="Course", description="d")
+
+    def test_metrics_exported_per_view(self):
+        self.client.get("/api/courses/")
+        text = self.client.get("/metrics/").content.decode()
+
+        self.assertIn('lms_request_duration_seconds_count{method="GET",status="200",view="api/courses/"} 1', text)
+        self.assertIn('lms_db_queries_count{method="GET",view="api/courses/"} 1', text)
+        self.assertIn("lms_serializer_duration_seconds_sum", text)
+        self.assertIn("# TYPE lms_db_duration_seconds histogram", text)
+
+    @override_settings(ROOT_URLCONF="monitoring.tests", METRICS_DUPLICATE_QUERY_THRESHOLD=3)
+    def test_duplicate_queries_flagged(self):
+        with self.assertLogs("monitoring", "WARNING"):
+            self.client.get("/repeat/")
+        text = self.client.get("/metrics/").content.decode()
+        self.assertIn('lms_duplicate_query_requests_total{method="GET",view="repeat/"} 1', text)
+
+    @override_settings(ROOT_URLCONF="monitoring.tests")
+    def test_async_views_measured(self):
+        async_to_sync(AsyncClient().get)("/repeat-async/")
+        text = self.client.get("/metrics/").content.decode()
+        self.assertIn('lms_db_queries_sum{method="GET",view="repeat-async/"} 3', text)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get("/api/courses/")
+        self.assertNotIn("lms_request_duration_seconds", self.client.get("/metrics/").content.decode())
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+        response = self.client.get("/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
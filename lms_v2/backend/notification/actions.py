@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template import Context, Engine, TemplateSyntaxError
+
+from .models import NotificationAction
+
+# Emails are plain text, so nothing is HTML-escaped.
+_engine = Engine(autoescape=False)
+
+logger = logging.getLogger("notification.actions")
+
+VERSION_KEY = "notification-actions-version"
+
+_lock = threading.Lock()
+_loaded = None  # (version, loaded at, {action_id: CompiledAction})
+
+
+def compile_template(source):
+    return _engine.from_string(source) if source else None
+
+
+class CompiledAction:
+    """A NotificationAction with its email subject and body parsed once."""
+
+    __slots__ = ("message", "subject", "body")
+
+    def __init__(self, action):
+        self.message = action.message
+        self.subject = compile_template(action.email_subject)
+        self.body = compile_template(action.email_body)
+
+    @property
+    def sends_email(self):
+        return self.subject is not None and self.body is not None
+
+    def render_email(self, user):
+        """(subject, body) for this user."""
+        context = Context({"user_name": user.user_name, "email": user.email})
+        return " ".join(self.subject.render(context).split()), self.body.render(context)
+
+
+def _cache():
+    return caches[settings.NOTIFICATION_ACTIONS_CACHE]
+
+
+def _current_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _is_current(loaded, version):
+    return (
+        loaded is not None
+        and loaded[0] == version
+        and time.monotonic() - loaded[1] < settings.NOTIFICATION_ACTIONS_MAX_AGE
+    )
+
+
+def _compile_all():
+    actions = {}
+    for action in NotificationAction.objects.all():
+        try:
+            actions[action.pk] = CompiledAction(action)
+        except TemplateSyntaxError:
+            # Rows written around clean() mustn't break every other action.
+            logger.exception("Notification action %s has an invalid template; skipping it", action.pk)
+    return actions
+
+
+def get_action(action_id):
+    """
+    The compiled action with this ID, or None.
+
+    All actions are loaded and compiled together the first time one is
+    needed and reused until an action changes or NOTIFICATION_ACTIONS_MAX_AGE
+    passes, so the hot path reads only the version stamp from the cache.
+    """
+    global _loaded
+    version = _current_version()
+    loaded = _loaded
+    if not _is_current(loaded, version):
+        with _lock:
+            loaded = _loaded
+            if not _is_current(loaded, version):
+                loaded = _loaded = (version, time.monotonic(), _compile_all())
+    return loaded[2].get(action_id)
+
+
+def invalidate_actions():
+    """
+    Make this process reload the actions on its next call, and the others
+    too when NOTIFICATION_ACTIONS_CACHE is shared between them (otherwise
+    they catch up within NOTIFICATION_ACTIONS_MAX_AGE).
+    """
+    global _loaded
+    _loaded = None
+
+    # Bumped again after commit so a reload that read the old rows in
+    # between is discarded too.
+    def bump():
+        _cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
@@ -1,3 +1,7 @@
 from django.contrib import admin
-
+from .models import NotificationAction, OutboxEmail
 # Register your models here.
+
+
+admin.site.register(NotificationAction)
+admin.site.register(OutboxEmail)
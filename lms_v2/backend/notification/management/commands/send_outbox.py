@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notification.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails in batches, one mail connection per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--backoff', type=int, default=60, help='Seconds before the first retry; doubles each attempt')
+        parser.add_argument(
+            '--lease', type=int, default=300,
+            help='Seconds a claimed batch is reserved before another worker may retry it',
+        )
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the outbox is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(
+                options['batch_size'], options['max_attempts'], options['backoff'], options['lease']
+            )
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed permanently {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
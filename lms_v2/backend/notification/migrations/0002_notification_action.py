@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+def create_table_if_missing(apps, schema_editor):
+    # notification_actions predates this model and was created by hand in
+    # existing deployments; only create it where it doesn't exist yet.
+    model = apps.get_model('notification', 'NotificationAction')
+    if model._meta.db_table not in schema_editor.connection.introspection.table_names():
+        schema_editor.create_model(model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='NotificationAction',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('message', models.CharField(max_length=255)),
+                        ('email_subject', models.CharField(blank=True, default='', max_length=255)),
+                        ('email_body', models.TextField(blank=True, default='')),
+                    ],
+                    options={
+                        'db_table': 'notification_actions',
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_table_if_missing, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,61 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.template import TemplateSyntaxError
+from django.utils import timezone
 
-# Create your models here.
+
+class OutboxEmail(models.Model):
+    """An email queued by a request and delivered later by `send_outbox`."""
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.recipient} ({self.status})"
+
+
+class NotificationAction(models.Model):
+    """
+    A user-facing action (signup, enroll, ...) with its response message and
+    optional email. The subject and body are Django templates rendered per
+    user with `user_name` and `email`.
+    """
+
+    message = models.CharField(max_length=255)
+    email_subject = models.CharField(max_length=255, blank=True, default="")
+    email_body = models.TextField(blank=True, default="")
+
+    class Meta:
+        db_table = "notification_actions"
+
+    def clean(self):
+        from .actions import compile_template
+
+        for field in ("email_subject", "email_body"):
+            try:
+                compile_template(getattr(self, field))
+            except TemplateSyntaxError as exc:
+                raise ValidationError({field: str(exc)})
+
+    def __str__(self):
+        return self.message
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+def enqueue_email(subject, body, recipient, from_email=None):
+    """Queue an email for the outbox worker instead of sending it inline."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        recipient=recipient,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def drain_outbox(batch_size=100, max_attempts=5, backoff=60, lease=300):
+    """
+    Send one batch of due emails over a single mail connection.
+
+    The batch is claimed in one short transaction, locking rows with SKIP
+    LOCKED so several workers can drain in parallel, and marked "sending"
+    for `lease` seconds. The mail server is talked to with no transaction
+    open; the results are saved in a second one. A claim whose worker dies
+    expires and is retried, so a message may be sent twice but is never
+    lost. A failed message is retried after `backoff` * 2**(attempts-1)
+    seconds and marked failed after `max_attempts`. Returns (sent, failed).
+    """
+    now = timezone.now()
+    batch = _claim(batch_size, now, lease)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        # Mail server unreachable: the whole batch is retried later.
+        for email in batch:
+            failed += _record_failure(email, exc, now, max_attempts, backoff)
+    else:
+        try:
+            for email in batch:
+                message = EmailMessage(
+                    email.subject, email.body, email.from_email, [email.recipient],
+                    connection=connection,
+                )
+                try:
+                    connection.send_messages([message])
+                except Exception as exc:
+                    failed += _record_failure(email, exc, now, max_attempts, backoff)
+                else:
+                    email.status, email.sent_at = "sent", timezone.now()
+                    email.attempts += 1
+                    sent += 1
+        finally:
+            connection.close()
+
+    OutboxEmail.objects.bulk_update(
+        batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return sent, failed
+
+
+def _claim(batch_size, now, lease):
+    """Lease up to `batch_size` due emails, including expired claims."""
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=("pending", "sending"), next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")[:batch_size]
+        )
+        leased_until = now + timedelta(seconds=lease)
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+            status="sending", next_attempt_at=leased_until
+        )
+    for email in batch:
+        email.status, email.next_attempt_at = "sending", leased_until
+    return batch
+
+
+def _record_failure(email, exc, now, max_attempts, backoff):
+    email.attempts += 1
+    email.last_error = repr(exc)
+    if email.attempts >= max_attempts:
+        email.status = "failed"
+        return 1
+    email.status = "pending"
+    email.next_attempt_at = now + timedelta(seconds=backoff * 2 ** (email.attempts - 1))
+    return 0
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .actions import invalidate_actions
+from .models import NotificationAction
+
+
+@receiver(post_save, sender=NotificationAction)
+@receiver(post_delete, sender=NotificationAction)
+def reload_actions(sender, **kwargs):
+    invalidate_actions()
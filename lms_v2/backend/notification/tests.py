@@ -1,3 +1,169 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .actions import get_action
+from .models import NotificationAction, OutboxEmail
+from .outbox import drain_outbox, enqueue_email
+
+
+class FlakyBackend(EmailBackend):
+    """Rejects every message addressed to a "bounce" recipient."""
+
+    def send_messages(self, messages):
+        if any("bounce" in address for m in messages for address in m.to):
+            raise OSError("mailbox unavailable")
+        return super().send_messages(messages)
+
+
+class StatusRecordingBackend(EmailBackend):
+    """Remembers the stored status of each message's row while it's sent."""
+
+    seen = []
+
+    def send_messages(self, messages):
+        for message in messages:
+            StatusRecordingBackend.seen.append(
+                OutboxEmail.objects.filter(recipient=message.to[0]).values_list("status", flat=True).get()
+            )
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def test_enqueue_does_not_send(self):
+        email = enqueue_email("Welcome", "Hello", "a@example.com")
+        self.assertEqual(email.status, "pending")
+        self.assertEqual(email.from_email, "noreply@nextgenlms.com")
+        self.assertEqual(mail.outbox, [])
+
+    def test_drain_sends_batch(self):
+        for i in range(3):
+            enqueue_email("Welcome", "Hello", f"user{i}@example.com")
+
+        self.assertEqual(drain_outbox(batch_size=2), (2, 0))
+        self.assertEqual(drain_outbox(batch_size=2), (1, 0))
+        self.assertEqual(drain_outbox(), (0, 0))
+
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f"user{i}@example.com" for i in range(3)])
+        self.assertFalse(OutboxEmail.objects.exclude(status="sent").exists())
+        self.assertFalse(OutboxEmail.objects.filter(sent_at=None).exists())
+
+    @override_settings(EMAIL_BACKEND="notification.tests.FlakyBackend")
+    def test_failure_backs_off_then_gives_up(self):
+        ok = enqueue_email("Welcome", "Hello", "ok@example.com")
+        bad = enqueue_email("Welcome", "Hello", "bounce@example.com")
+
+        self.assertEqual(drain_outbox(max_attempts=2, backoff=60), (1, 0))
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ("pending", 1))
+        self.assertIn("mailbox unavailable", bad.last_error)
+        self.assertGreater(bad.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Not due yet, so nothing is retried.
+        self.assertEqual(drain_outbox(max_attempts=2), (0, 0))
+
+        OutboxEmail.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox(max_attempts=2), (0, 1))
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ("failed", 2))
+        ok.refresh_from_db()
+        self.assertEqual(ok.status, "sent")
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND="notification.tests.StatusRecordingBackend")
+    def test_batch_is_leased_while_sending(self):
+        StatusRecordingBackend.seen = []
+        email = enqueue_email("Welcome", "Hello", "a@example.com")
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual(StatusRecordingBackend.seen, ["sending"])
+        email.refresh_from_db()
+        self.assertEqual(email.status, "sent")
+
+    def test_expired_lease_is_retried(self):
+        email = enqueue_email("Welcome", "Hello", "a@example.com")
+        # Claimed by a worker that died before recording anything.
+        OutboxEmail.objects.filter(pk=email.pk).update(
+            status="sending", next_attempt_at=timezone.now() + timedelta(seconds=300)
+        )
+        self.assertEqual(drain_outbox(), (0, 0))
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_outbox_command(self):
+        enqueue_email("Welcome", "Hello", "a@example.com")
+        call_command("send_outbox", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class ActionTemplateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="ada@example.com", user_name="Ada")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.enroll = NotificationAction.objects.create(
+            message="Enrolled!",
+            email_subject="Welcome aboard, {{ user_name }}",
+            email_body="Hi {{ user_name }}, you signed up as {{ email }}.",
+        )
+        self.info = NotificationAction.objects.create(message="Saved")
+
+    def post(self, action_id):
+        return self.client.post(f"/api/notification/action/{action_id}/")
+
+    def test_renders_per_user_email(self):
+        response = self.post(self.enroll.pk)
+        self.assertEqual(response.data, {"message": "Enrolled!"})
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.subject, "Welcome aboard, Ada")
+        self.assertEqual(email.body, "Hi Ada, you signed up as ada@example.com.")
+        self.assertEqual(email.recipient, "ada@example.com")
+
+    def test_hot_path_reads_no_templates(self):
+        self.post(self.info.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.post(self.info.pk).status_code, 200)
+        # Only the outbox insert.
+        with self.assertNumQueries(1):
+            self.post(self.enroll.pk)
+
+    def test_unknown_action(self):
+        self.assertEqual(self.post(self.info.pk + 100).status_code, 400)
+
+    def test_change_invalidates_cache(self):
+        self.assertEqual(get_action(self.info.pk).message, "Saved")
+        self.info.message = "Updated"
+        self.info.save()
+        self.assertEqual(get_action(self.info.pk).message, "Updated")
+        self.info.delete()
+        self.assertIsNone(get_action(self.info.pk))
+
+    def test_invalid_row_skips_only_that_action(self):
+        broken = NotificationAction.objects.create(message="Broken", email_subject="Hi", email_body="{% if %}")
+        with self.assertLogs("notification.actions", "ERROR"):
+            self.assertEqual(get_action(self.info.pk).message, "Saved")
+        self.assertIsNone(get_action(broken.pk))
+
+    def test_reloads_once_max_age_passes(self):
+        self.assertEqual(get_action(self.info.pk).message, "Saved")
+        # Changed by another process whose version bump this one can't see.
+        NotificationAction.objects.filter(pk=self.info.pk).update(message="Elsewhere")
+        self.assertEqual(get_action(self.info.pk).message, "Saved")
+        with override_settings(NOTIFICATION_ACTIONS_MAX_AGE=0):
+            self.assertEqual(get_action(self.info.pk).message, "Elsewhere")
+
+    def test_invalid_template_rejected(self):
+        action = NotificationAction(message="Oops", email_subject="Hi", email_body="{% if %}")
+        with self.assertRaises(ValidationError):
+            action.full_clean()